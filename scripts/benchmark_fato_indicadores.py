@@ -0,0 +1,128 @@
+"""Benchmark the annual family pivot of build_fato_indicadores_anuais.
+
+Compares the previous implementation (one filter + groupby per family, then
+`pd.concat(axis=1)`) with `pivot_familias` (integer-coded keys, one bincount
+pass) on the full qualidade_comercial table, checks that both produce the
+same frame, and repeats the comparison with synthetic extra families.
+
+Scaling note: the per-family version scans `enriched` once per family, so
+its cost grows as O(families x rows). The single pass factorizes the keys
+once and its per-family cost is O(groups) (one column of the bincount
+matrix), so new ANEEL families add almost nothing to the scan.
+
+Usage:
+    python scripts/benchmark_fato_indicadores.py
+    python scripts/benchmark_fato_indicadores.py --extra-families 4 8 16 --repeats 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.analysis.build_analysis_tables import (
+    FAMILIA_AGREGACOES,
+    FAMILIAS_VALIDAS,
+    build_dim_indicador_servico,
+    load_domain_indicators,
+    load_qualidade_comercial,
+    pivot_familias,
+)
+
+KEYS = ["ano", "sigagente", "codigo_base", "classe_local"]
+
+
+def pivot_por_familia(enriched: pd.DataFrame, agregacoes: dict[str, tuple[str, str]]) -> pd.DataFrame:
+    """Previous implementation: one filtered groupby per family."""
+    parts = []
+    for familia, (column, agg) in agregacoes.items():
+        grouped = enriched[enriched["familia_indicador"] == familia].groupby(KEYS, dropna=False)["valor"]
+        parts.append((grouped.mean() if agg == "mean" else grouped.sum()).rename(column))
+    fact = pd.concat(parts, axis=1).reset_index()
+    for familia, (column, _) in agregacoes.items():
+        fact[f"has_{familia.lower()}"] = fact[column].notna()
+    for column, _ in agregacoes.values():
+        fact[column] = fact[column].fillna(0.0)
+    return fact
+
+
+def best_time(func, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def build_enriched() -> pd.DataFrame:
+    qualidade = load_qualidade_comercial()
+    dim_indicador = build_dim_indicador_servico(qualidade, load_domain_indicators())
+    enriched = qualidade.merge(
+        dim_indicador[["sigindicador", "familia_indicador", "codigo_base", "classe_local"]],
+        on="sigindicador",
+        how="left",
+    )
+    enriched = enriched[enriched["familia_indicador"].isin(FAMILIAS_VALIDAS)].copy()
+    return enriched.dropna(subset=["ano", "sigagente", "codigo_base"])
+
+
+def with_extra_families(enriched: pd.DataFrame, extra: int) -> tuple[pd.DataFrame, dict[str, tuple[str, str]]]:
+    """Copy the QS rows under `extra` synthetic family codes (X0, X1, ...)."""
+    agregacoes = dict(FAMILIA_AGREGACOES)
+    base = enriched[enriched["familia_indicador"] == "QS"]
+    copies = [enriched]
+    for idx in range(extra):
+        familia = f"X{idx}"
+        agregacoes[familia] = (f"extra_{idx}", "sum")
+        copies.append(base.assign(familia_indicador=familia))
+    return pd.concat(copies, ignore_index=True), agregacoes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the annual family pivot")
+    parser.add_argument("--repeats", type=int, default=3, help="repetitions per measurement (best is kept)")
+    parser.add_argument(
+        "--extra-families",
+        type=int,
+        nargs="*",
+        default=[4, 12],
+        help="synthetic families added on top of QS/QV/PM/CR for the scaling run",
+    )
+    args = parser.parse_args()
+
+    enriched = build_enriched()
+    print(f"enriched: {len(enriched):,} rows, anos {enriched['ano'].min()}-{enriched['ano'].max()}")
+
+    rows = []
+    for extra in [0, *args.extra_families]:
+        frame, agregacoes = with_extra_families(enriched, extra) if extra else (enriched, FAMILIA_AGREGACOES)
+        expected = pivot_por_familia(frame, agregacoes)
+        result = pivot_familias(frame, KEYS, agregacoes)
+        pd.testing.assert_frame_equal(expected, result, check_exact=False, rtol=1e-9)
+
+        por_familia_s = best_time(lambda: pivot_por_familia(frame, agregacoes), args.repeats)
+        unica_s = best_time(lambda: pivot_familias(frame, KEYS, agregacoes), args.repeats)
+        rows.append(
+            {
+                "familias": len(agregacoes),
+                "linhas": len(frame),
+                "grupos": len(result),
+                "por_familia_s": por_familia_s,
+                "passagem_unica_s": unica_s,
+                "ganho_x": por_familia_s / unica_s if unica_s else float("nan"),
+            }
+        )
+
+    print(pd.DataFrame(rows).to_string(index=False, float_format="%.4f"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Benchmark Parquet write profiles for processed and analysis artifacts.
+
+Rewrites each artifact with a matrix of codecs, row-group sizes and sort
+orders, then measures file size, write time and the read time of the access
+patterns the pipeline actually uses (column subsets and filters).
+
+Usage:
+    python scripts/benchmark_parquet_profiles.py
+    python scripts/benchmark_parquet_profiles.py --tables fato_servicos_municipio_mes --repeats 5
+    python scripts/benchmark_parquet_profiles.py --output reports/benchmark_parquet_profiles.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.etl.parquet_profiles import write_parquet
+
+PROCESSED_DIR = ROOT / "data" / "processed"
+ANALYSIS_DIR = PROCESSED_DIR / "analysis"
+
+CODECS: list[tuple[str, int | None]] = [
+    ("snappy", None),
+    ("zstd", 1),
+    ("zstd", 3),
+    ("zstd", 9),
+    ("lz4", None),
+]
+ROW_GROUP_SIZES: list[int | None] = [None, 64_000, 256_000]
+SORT_ORDERS: dict[str, tuple[str, ...]] = {
+    "none": (),
+    "ano_mes_agente": ("ano", "mes", "sigagente"),
+    "agente_ano_mes": ("sigagente", "ano", "mes"),
+}
+
+# Downstream reads per artifact: (pattern name, columns, pyarrow filters).
+# Column lists mirror the loaders in src/analysis.
+READ_PATTERNS: dict[str, list[tuple[str, list[str] | None, list | None]]] = {
+    "qualidade_comercial": [
+        ("load_qualidade_comercial", ["sigagente", "sigindicador", "anoindice", "numperiodoindice", "vlrindiceenviado"], None),
+    ],
+    "indger_dados_comerciais": [
+        ("build_dim_distribuidora_porte", ["datreferenciainformada", "sigagente", "nomagente", "qtducativa"], None),
+    ],
+    "indger_servicos_comerciais": [
+        (
+            "build_fato_servicos_municipio_mes",
+            [
+                "datreferenciainformada",
+                "sigagente",
+                "nomagente",
+                "codmunicipioibge",
+                "codtiposervico",
+                "dsctiposervico",
+                "dscprazo",
+                "qtdservrealizado",
+                "qtdservrealizdescprazo",
+                "vlrpagocompensacao",
+            ],
+            None,
+        ),
+    ],
+    "fato_servicos_municipio_mes": [
+        (
+            "neoenergia_servicos",
+            ["ano", "mes", "id_agente", "id_tipo_servico", "qtd_serv_realizado", "qtd_fora_prazo", "compensacao_rs"],
+            None,
+        ),
+        ("ano_recente", None, [("ano", ">=", 2025)]),
+    ],
+    "fato_transgressao_mensal_distribuidora": [
+        (
+            "neoenergia_monthly_dist",
+            [
+                "ano",
+                "mes",
+                "sigagente",
+                "nomagente",
+                "uc_ativa_mes",
+                "qtd_serv_realizado",
+                "qtd_fora_prazo",
+                "compensacao_rs",
+                "taxa_fora_prazo",
+            ],
+            None,
+        ),
+    ],
+    "fato_transgressao_mensal_porte": [
+        (
+            "neoenergia_monthly_porte",
+            ["ano", "sigagente", "classe_local_servico", "qtd_serv_realizado", "qtd_fora_prazo", "compensacao_rs", "uc_ativa_mes"],
+            None,
+        ),
+        ("build_report_full", None, None),
+    ],
+    "fato_indicadores_anuais": [
+        ("neoenergia_long_run", ["ano", "sigagente", "qtd_serv", "qtd_fora_prazo", "compensacao_rs"], None),
+        ("build_report_full", None, None),
+    ],
+}
+
+
+def find_artifacts(names: list[str] | None) -> dict[str, Path]:
+    paths = sorted(PROCESSED_DIR.glob("*.parquet")) + sorted(ANALYSIS_DIR.glob("*.parquet"))
+    artifacts = {path.stem: path for path in paths}
+    if names:
+        artifacts = {name: path for name, path in artifacts.items() if name in names}
+    return artifacts
+
+
+def best_time(func, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def benchmark_artifact(name: str, path: Path, workdir: Path, repeats: int) -> list[dict[str, object]]:
+    frame = pd.read_parquet(path)
+    patterns = READ_PATTERNS.get(name, [("full", None, None)])
+    rows: list[dict[str, object]] = []
+
+    for (codec, level), row_group_size, (sort_name, sort_by) in itertools.product(
+        CODECS, ROW_GROUP_SIZES, SORT_ORDERS.items()
+    ):
+        sort_cols = tuple(col for col in sort_by if col in frame.columns)
+        if sort_by and not sort_cols:
+            continue
+
+        profile = {
+            "compression": codec,
+            "compression_level": level,
+            "row_group_size": row_group_size,
+            "sort_by": sort_cols,
+        }
+        out = workdir / f"{name}.parquet"
+        write_s = best_time(lambda: write_parquet(frame, out, profile), repeats)
+
+        row: dict[str, object] = {
+            "artefato": name,
+            "linhas": len(frame),
+            "codec": codec,
+            "nivel": level,
+            "row_group_size": row_group_size or "default",
+            "ordenacao": sort_name,
+            "tamanho_mb": out.stat().st_size / 1024 / 1024,
+            "escrita_s": write_s,
+        }
+        for pattern_name, columns, filters in patterns:
+            cols = [col for col in columns if col in frame.columns] if columns else None
+            row[f"leitura_{pattern_name}_s"] = best_time(
+                lambda: pd.read_parquet(out, columns=cols, filters=filters), repeats
+            )
+        rows.append(row)
+
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark Parquet write profiles")
+    parser.add_argument("--tables", nargs="*", help="artifact names (default: all parquet files found)")
+    parser.add_argument("--repeats", type=int, default=3, help="repetitions per measurement (best is kept)")
+    parser.add_argument("--output", type=Path, default=None, help="optional CSV with the full matrix")
+    args = parser.parse_args()
+
+    artifacts = find_artifacts(args.tables)
+    if not artifacts:
+        raise SystemExit("No parquet artifacts found. Run `make transform` / `make analysis` first.")
+
+    results: list[dict[str, object]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, path in artifacts.items():
+            print(f"Benchmarking {name} ...", flush=True)
+            results.extend(benchmark_artifact(name, path, Path(tmp), args.repeats))
+
+    table = pd.DataFrame(results)
+    read_cols = [col for col in table.columns if col.startswith("leitura_")]
+    table["leitura_total_s"] = table[read_cols].sum(axis=1, min_count=1)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        table.to_csv(args.output, index=False)
+        print(f"Full matrix written to: {args.output}")
+
+    summary_cols = ["codec", "nivel", "row_group_size", "ordenacao", "tamanho_mb", "escrita_s", "leitura_total_s"]
+    with pd.option_context("display.width", 200, "display.max_columns", 20):
+        for name, group in table.groupby("artefato", sort=False):
+            print(f"\n== {name} ({int(group['linhas'].iloc[0]):,} rows) — 5 smallest files")
+            print(group.nsmallest(5, "tamanho_mb")[summary_cols].to_string(index=False, float_format="%.4f"))
+            print(f"-- 5 fastest downstream reads")
+            print(group.nsmallest(5, "leitura_total_s")[summary_cols].to_string(index=False, float_format="%.4f"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Measure the keyed (star schema) service fact against its string view.
+
+Compares in-memory size, Parquet size and groupby time of the
+`fato_servicos_municipio_mes` stored with integer surrogate keys against the
+human-readable view rebuilt by `join_dimensions` (the pre-star layout).
+
+Usage:
+    python scripts/benchmark_star_schema.py
+    python scripts/benchmark_star_schema.py --repeats 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.analysis.star_schema import (
+    DIMENSOES,
+    FATO_SERVICOS_CHAVES,
+    FATO_SERVICOS_MEDIDAS,
+    join_dimensions,
+    load_dimension,
+)
+
+ANALYSIS_DIR = ROOT / "data" / "processed" / "analysis"
+
+# Same grouping in both layouts: (string columns, keyed columns).
+GROUPINGS: dict[str, tuple[list[str], list[str]]] = {
+    "chave_completa": (
+        ["ano", "mes", "sigagente", "nomagente", "codmunicipioibge", "codtiposervico", "dsctiposervico", "dscprazo"],
+        FATO_SERVICOS_CHAVES,
+    ),
+    "distribuidora_mes": (["ano", "mes", "sigagente", "nomagente"], ["ano", "mes", "id_agente"]),
+    "servico_ano": (["ano", "codtiposervico", "dsctiposervico"], ["ano", "id_tipo_servico"]),
+}
+
+
+def best_time(func, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def parquet_mb(frame: pd.DataFrame) -> float:
+    buffer = io.BytesIO()
+    frame.to_parquet(buffer, index=False)
+    return buffer.tell() / 1024 / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark keyed vs string service fact")
+    parser.add_argument("--repeats", type=int, default=3, help="repetitions per measurement (best is kept)")
+    args = parser.parse_args()
+
+    path = ANALYSIS_DIR / "fato_servicos_municipio_mes.parquet"
+    if not path.exists():
+        raise SystemExit("No fato_servicos_municipio_mes.parquet. Run `make analysis` first.")
+
+    keyed = pd.read_parquet(path)
+    dims = {name: load_dimension(name) for name in DIMENSOES}
+    view = join_dimensions(keyed, dims)
+    dims_mb = sum(dim.memory_usage(deep=True).sum() for dim in dims.values()) / 1024 / 1024
+
+    print(f"fato_servicos_municipio_mes: {len(keyed):,} rows")
+    print(
+        pd.DataFrame(
+            [
+                {
+                    "layout": "texto (view)",
+                    "memoria_mb": view.memory_usage(deep=True).sum() / 1024 / 1024,
+                    "parquet_mb": parquet_mb(view),
+                },
+                {
+                    "layout": "chaves + dimensoes",
+                    "memoria_mb": keyed.memory_usage(deep=True).sum() / 1024 / 1024 + dims_mb,
+                    "parquet_mb": parquet_mb(keyed) + sum(parquet_mb(dim) for dim in dims.values()),
+                },
+            ]
+        ).to_string(index=False, float_format="%.3f")
+    )
+
+    rows = []
+    for name, (text_keys, int_keys) in GROUPINGS.items():
+        texto_s = best_time(
+            lambda: view.groupby(text_keys, dropna=False)[FATO_SERVICOS_MEDIDAS].sum(), args.repeats
+        )
+        chaves_s = best_time(lambda: keyed.groupby(int_keys)[FATO_SERVICOS_MEDIDAS].sum(), args.repeats)
+        rows.append(
+            {
+                "agrupamento": name,
+                "texto_s": texto_s,
+                "chaves_s": chaves_s,
+                "ganho_x": texto_s / chaves_s if chaves_s else float("nan"),
+            }
+        )
+    print()
+    print(pd.DataFrame(rows).to_string(index=False, float_format="%.4f"))
+
+
+if __name__ == "__main__":
+    main()
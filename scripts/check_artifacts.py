@@ -12,9 +12,37 @@ CORE_REQUIRED = [
     "data/processed/analysis/fato_uc_ativa_mensal_distribuidora.parquet",
     "data/processed/analysis/fato_indicadores_anuais.parquet",
     "data/processed/analysis/fato_servicos_municipio_mes.parquet",
+    "data/processed/analysis/dim_agente.parquet",
+    "data/processed/analysis/dim_municipio.parquet",
+    "data/processed/analysis/dim_tipo_servico.parquet",
+    "data/processed/analysis/dim_prazo.parquet",
+    "data/processed/analysis/cubo_servicos.parquet",
+    "data/processed/analysis/tensor_distribuidora_mes/valores.npy",
+    "data/processed/analysis/tensor_distribuidora_mes/agentes.csv",
+    "data/processed/analysis/tensor_distribuidora_mes/meses.csv",
+    "data/processed/analysis/tensor_distribuidora_mes/metricas.csv",
     "data/processed/analysis/fato_transgressao_mensal_porte.parquet",
     "data/processed/analysis/fato_transgressao_mensal_distribuidora.parquet",
+    "data/processed/analysis/servicos_exclusao_codigos.parquet",
+    "data/processed/analysis/servicos_mix_codigos.parquet",
+    "data/processed/analysis/features_distribuidora_ano/valores.npy",
+    "data/processed/analysis/features_distribuidora_ano/linhas.csv",
+    "data/processed/analysis/features_distribuidora_ano/features.csv",
+    "data/processed/analysis/clusters_distribuidora.parquet",
+    "data/processed/analysis/clusters_silhueta.parquet",
+    "data/processed/analysis/benchmark_pares_mensal.parquet",
+    "data/processed/analysis/cobertura_mensal.parquet",
+    "data/processed/analysis/reconciliacao_fontes.parquet",
+    "data/processed/analysis/alertas_comparabilidade.parquet",
+    "data/processed/analysis/painel_comparavel.parquet",
+    "data/processed/analysis/fato_anomalias_mensal.parquet",
+    "data/processed/analysis/fato_previsao_mensal.parquet",
     "data/processed/analysis/kpi_regulatorio_anual.parquet",
+    "data/processed/analysis/kpi_bootstrap_ic.parquet",
+    "data/processed/analysis/base_cenarios.parquet",
+    "data/processed/analysis/cenarios_regulatorios.parquet",
+    "data/processed/analysis/painel_estudo_evento.parquet",
+    "data/processed/analysis/painel_efeitos_mes.parquet",
     "reports/relatorio_aneel.md",
 ]
 
@@ -0,0 +1,68 @@
+"""Check the porte groups and the bootstrap SEs of kpi_bootstrap_ic.
+
+The check fails when `sem_porte` holds more than MAX_SHARE_SEM_PORTE of the
+distributors (porte not reaching the annual names) or a bucket has fewer than
+MIN_DISTRIBUIDORAS_BUCKET distributors. The buckets are resampled
+independently (stratified bootstrap), so for the additive KPIs sqrt(sum of
+bucket SE^2) should be close to the national SE; it also fails when that
+ratio leaves [1/tolerance, tolerance], which is what a non-stratified
+per-bucket draw produces.
+
+Usage:
+    python scripts/check_bootstrap_ic.py
+    python scripts/check_bootstrap_ic.py --tolerance 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.analysis.bootstrap import QUADRATURA_TOLERANCIA, group_size_check, quadrature_check
+
+IC_PATH = ROOT / "data" / "processed" / "analysis" / "kpi_bootstrap_ic.parquet"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the bootstrap SEs of kpi_bootstrap_ic")
+    parser.add_argument("--path", type=Path, default=IC_PATH)
+    parser.add_argument("--tolerance", type=float, default=QUADRATURA_TOLERANCIA)
+    args = parser.parse_args()
+
+    if not args.path.exists():
+        print(f"Bootstrap check failed:\n - missing: {args.path}")
+        raise SystemExit(1)
+
+    ic = pd.read_parquet(args.path)
+    grupos = group_size_check(ic)
+    check = quadrature_check(ic)
+    print(grupos.to_string(index=False))
+    print(check.to_string(index=False))
+
+    errors = [
+        f"{row.grupo}: n_distribuidoras={row.n_distribuidoras} ({row.share_nacional:.0%} do nacional)"
+        for row in grupos[grupos["alerta_grupo"]].itertuples(index=False)
+    ]
+    razao = check["razao_quadratura"]
+    fora = check[(razao > args.tolerance) | (razao < 1.0 / args.tolerance)]
+    errors += [
+        f"{row.kpi} {row.periodo_regulatorio}: razao_quadratura={row.razao_quadratura:.2f}"
+        for row in fora.itertuples(index=False)
+    ]
+    if errors:
+        print("Bootstrap check failed:")
+        for error in errors:
+            print(f" - {error}")
+        raise SystemExit(1)
+
+    print(f"Bootstrap IC OK (tolerance={args.tolerance}).")
+
+
+if __name__ == "__main__":
+    main()
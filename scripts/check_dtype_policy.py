@@ -0,0 +1,107 @@
+"""Check that the compact dtype policy preserves analysis values.
+
+For every analysis table (Parquet, plus the Neoenergia CSVs) widens the
+columns back to the pre-policy layout (object strings, int64, float64),
+applies `apply_dtype_policy` with float32 ratios enabled, compares each
+column (exact for integers, strings and flags; relative tolerance for
+float32 ratios) and prints the per-table memory before and after.
+
+Usage:
+    python scripts/check_dtype_policy.py
+    python scripts/check_dtype_policy.py --rtol 1e-6
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.analysis.dtypes import apply_dtype_policy, memory_mb
+
+ANALYSIS_DIR = ROOT / "data" / "processed" / "analysis"
+NEO_DIR = ANALYSIS_DIR / "neoenergia"
+
+
+def widen(frame: pd.DataFrame) -> pd.DataFrame:
+    """Pre-policy layout: categories as object, 64-bit ints and floats."""
+    out = frame.copy()
+    for name in out.columns:
+        dtype = out[name].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            out[name] = out[name].astype(object)
+        elif pd.api.types.is_bool_dtype(dtype):
+            continue
+        elif pd.api.types.is_integer_dtype(dtype):
+            out[name] = out[name].astype("int64" if isinstance(dtype, np.dtype) else "Int64")
+        elif pd.api.types.is_float_dtype(dtype):
+            out[name] = out[name].astype("float64" if isinstance(dtype, np.dtype) else "Float64")
+    return out
+
+
+def compare_column(name: str, before: pd.Series, after: pd.Series, rtol: float) -> str | None:
+    if before.isna().to_numpy().tolist() != after.isna().to_numpy().tolist():
+        return f"{name}: null positions changed"
+    present = before.notna().to_numpy()
+    if pd.api.types.is_numeric_dtype(after) and not pd.api.types.is_bool_dtype(after):
+        left = before.to_numpy(dtype="float64", na_value=np.nan)[present]
+        right = after.to_numpy(dtype="float64", na_value=np.nan)[present]
+        if not np.allclose(left, right, rtol=rtol, atol=0.0):
+            return f"{name}: values differ beyond rtol={rtol} ({before.dtype} -> {after.dtype})"
+        return None
+    left = before[present].astype(str).str.lower().tolist()
+    right = after[present].astype(str).str.lower().tolist()
+    if left != right:
+        return f"{name}: values differ ({before.dtype} -> {after.dtype})"
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check compact dtype policy on analysis tables")
+    parser.add_argument("--rtol", type=float, default=1e-6, help="relative tolerance for float32 ratios")
+    args = parser.parse_args()
+
+    paths = sorted(ANALYSIS_DIR.glob("*.parquet")) + sorted(NEO_DIR.glob("*.csv"))
+    if not paths:
+        raise SystemExit("No analysis tables found. Run `make analysis` first.")
+
+    errors: list[str] = []
+    rows = []
+    for path in paths:
+        before = widen(pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path))
+        after = apply_dtype_policy(before, float32_ratios=True)
+        for name in before.columns:
+            problem = compare_column(name, before[name], after[name], args.rtol)
+            if problem:
+                errors.append(f"{path.name}: {problem}")
+        rows.append(
+            {
+                "tabela": path.name,
+                "linhas": len(before),
+                "antes_mb": memory_mb(before),
+                "depois_mb": memory_mb(after),
+                "colunas_alteradas": sum(before[c].dtype != after[c].dtype for c in before.columns),
+            }
+        )
+
+    report = pd.DataFrame(rows)
+    report["reducao_pct"] = np.where(report["antes_mb"] > 0, 1 - report["depois_mb"] / report["antes_mb"], 0.0) * 100
+    print(report.to_string(index=False, float_format="%.3f"))
+    print(f"Total: {report['antes_mb'].sum():.3f} MB -> {report['depois_mb'].sum():.3f} MB")
+
+    if errors:
+        print("Dtype policy check failed:")
+        for err in errors:
+            print(f" - {err}")
+        raise SystemExit(1)
+    print("Dtype policy OK.")
+
+
+if __name__ == "__main__":
+    main()
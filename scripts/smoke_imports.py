@@ -6,6 +6,28 @@ MODULES = [
     "src.etl.extract_aneel",
     "src.etl.transform_aneel",
     "src.etl.schema_contracts",
+    "src.etl.parquet_profiles",
+    "src.etl.instrumentation",
+    "src.etl.catalog",
+    "src.analysis.dtypes",
+    "src.analysis.metrics",
+    "src.analysis.star_schema",
+    "src.analysis.rollup_cube",
+    "src.analysis.sketches",
+    "src.analysis.tensor_store",
+    "src.analysis.anomalies",
+    "src.analysis.forecast",
+    "src.analysis.agentes",
+    "src.analysis.data_quality",
+    "src.analysis.trends",
+    "src.analysis.porte",
+    "src.analysis.peer_benchmark",
+    "src.analysis.bootstrap",
+    "src.analysis.panel",
+    "src.analysis.scenarios",
+    "src.analysis.service_codes",
+    "src.analysis.feature_store",
+    "src.analysis.clustering",
     "src.analysis.build_analysis_tables",
     "src.analysis.build_report",
     "src.analysis.neoenergia_diagnostico",
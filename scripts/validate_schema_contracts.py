@@ -9,7 +9,14 @@ from pathlib import Path
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
 
-from src.etl.schema_contracts import validate_processed_contracts, validate_raw_contracts
+from src.etl.catalog import CATALOG_PATH, refresh_catalog
+from src.etl.schema_contracts import (
+    validate_catalog_contracts,
+    validate_processed_contracts,
+    validate_raw_contracts,
+    validate_value_domains,
+    value_domain_errors,
+)
 
 RAW_DIR = ROOT / "data" / "raw"
 PROCESSED_DIR = ROOT / "data" / "processed"
@@ -27,6 +34,22 @@ def main() -> None:
         action="store_true",
         help="validate only processed files",
     )
+    parser.add_argument(
+        "--catalog",
+        action="store_true",
+        help="also check row counts, nulls and year ranges from catalog.json (refreshed if stale)",
+    )
+    parser.add_argument(
+        "--domains",
+        action="store_true",
+        help="also scan values against VALUE_DOMAIN_RULES (streamed, batched)",
+    )
+    parser.add_argument(
+        "--max-samples",
+        type=int,
+        default=5,
+        help="violating rows kept per rule and file with --domains",
+    )
     args = parser.parse_args()
 
     if args.raw_only and args.processed_only:
@@ -40,6 +63,23 @@ def main() -> None:
     if not args.raw_only:
         errors.extend(validate_processed_contracts(PROCESSED_DIR))
 
+    if args.catalog and not args.raw_only:
+        errors.extend(validate_catalog_contracts(refresh_catalog()))
+
+    if args.domains:
+        results = validate_value_domains(
+            raw_dir=None if args.processed_only else RAW_DIR,
+            processed_dir=None if args.raw_only else PROCESSED_DIR,
+            max_samples=args.max_samples,
+        )
+        for result in results:
+            if result["violations"] or result["skipped"]:
+                detail = result["skipped"] or f"{result['violations']:,}/{result['checked']:,} rows"
+                print(f"[{result['severity']}] {result['rule']} @ {result['path']}: {detail}")
+                for sample in result["samples"]:
+                    print(f"    {sample}")
+        errors.extend(value_domain_errors(results))
+
     if errors:
         print("Schema contract validation failed:")
         for err in errors:
@@ -52,6 +92,12 @@ def main() -> None:
     elif args.processed_only:
         scope = "processed"
 
+    if args.catalog and not args.raw_only:
+        scope += f", catalog {CATALOG_PATH.name}"
+
+    if args.domains:
+        scope += ", value domains"
+
     print(f"Schema contracts OK ({scope}).")
 
 
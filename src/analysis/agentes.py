@@ -0,0 +1,86 @@
+"""Canonical distributor key shared by the annual and monthly sources.
+
+The annual fact (qualidade comercial) and the monthly INDGER tables name the
+same distributor differently: short ANEEL codes and pre-rename names in the
+annual source ("COELBA", "CEEE-D", "EMT"), current names in INDGER
+("Neoenergia Coelba", "CEEE Equatorial", "Energisa MT"). `agent_key` folds
+accents, case and punctuation and then maps every alias of AGENTE_ALIASES to
+the folded canonical (INDGER) name, so both sources join on one key.
+
+AGENTE_ALIASES starts from NEO_ALIASES (the Neoenergia diagnostic's groups)
+and adds the renamed distributors; only one-to-one renames are listed, not
+mergers of distinct concessions.
+"""
+
+from __future__ import annotations
+
+import pandas as pd
+
+NEO_ALIASES: dict[str, list[str]] = {
+    "Neoenergia Coelba": ["Neoenergia Coelba", "COELBA"],
+    "Neoenergia Pernambuco": ["Neoenergia Pernambuco", "Neoenergia PE", "CELPE"],
+    "Neoenergia Cosern": ["Neoenergia Cosern", "COSERN"],
+    "Neoenergia Elektro": ["Neoenergia Elektro", "ELEKTRO"],
+    "Neoenergia Brasilia": ["Neoenergia Brasilia", "Neoenergia Brasília"],
+}
+
+# Canonical (INDGER) name -> names used by either source.
+AGENTE_ALIASES: dict[str, list[str]] = {
+    **NEO_ALIASES,
+    "Amazonas Energia": ["AME"],
+    "CEA Equatorial": ["CEA"],
+    "CEEE Equatorial": ["CEEE-D"],
+    "Celesc-Dis": ["CELESC"],
+    "Cersad": ["CERSAD DISTRIBUI"],
+    "Certaja Energia": ["CERTAJA"],
+    "CPFL Piratininga": ["CPFL-PIRATINING"],
+    "CPFL Santa Cruz": ["CPFL JAGUARI"],
+    "Enel GO": ["EQUATORIAL GO"],
+    "Enel SP": ["ELETROPAULO"],
+    "Energisa AC": ["EAC"],
+    "Energisa Minas Rio": ["EMR"],
+    "Energisa MS": ["EMS"],
+    "Energisa MT": ["EMT"],
+    "Energisa PB": ["EPB"],
+    "Energisa RO": ["ERO"],
+    "Energisa SE": ["ESE"],
+    "Energisa Sul-Sudeste": ["ESS"],
+    "Energisa TO": ["ETO"],
+    "Forcel": ["PACTO ENERGIA PR"],
+    "João Cesa": ["EFLJC"],
+    "Light": ["LIGHT SESA"],
+    "Nova Palma": ["UHENPAL"],
+    "RGE": ["RGE SUL"],
+    "Roraima Energia": ["BOA VISTA"],
+    "Santa Maria": ["ELFSM"],
+}
+
+
+def fold_agent(names: pd.Series) -> pd.Series:
+    """Accent-, case- and punctuation-free form of each name."""
+    return (
+        names.astype("string")
+        .str.normalize("NFKD")
+        .str.encode("ascii", errors="ignore")
+        .str.decode("ascii")
+        .str.upper()
+        .str.replace(r"[^A-Z0-9]+", "", regex=True)
+    )
+
+
+def _alias_keys(aliases: dict[str, list[str]]) -> dict[str, str]:
+    pairs = [(alias, canonical) for canonical, names in aliases.items() for alias in [canonical, *names]]
+    folded = fold_agent(pd.Series([p[0] for p in pairs]))
+    canonical = fold_agent(pd.Series([p[1] for p in pairs]))
+    return dict(zip(folded, canonical))
+
+
+ALIAS_KEYS = _alias_keys(AGENTE_ALIASES)
+
+
+def agent_key(sigagente: pd.Series) -> pd.Series:
+    """Canonical agent key: folded name, aliases mapped to their canonical name (normalizes distinct values only)."""
+    distinct = pd.Series(sigagente.dropna().unique(), dtype="string")
+    folded = fold_agent(distinct)
+    canonical = folded.map(lambda key: ALIAS_KEYS.get(key, key))
+    return sigagente.map(dict(zip(distinct, canonical))).astype("string")
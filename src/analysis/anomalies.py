@@ -0,0 +1,200 @@
+"""National monthly anomaly detector over `taxa_fora_prazo`.
+
+Every series (distributor x service class, plus the distributor total under
+`classe_local_servico == "total"`) is laid out on one dense series x month
+matrix with contiguous months, and all statistics are computed with NumPy
+window views over that matrix, without per-series loops:
+
+    variacao abrupta   change vs the previous observed month >= 50% (the old
+                       Neoenergia spike rule, `taxa_var_abs`/`taxa_var_pct`)
+    z robusto          (x - rolling median) / (1.4826 * rolling MAD), over the
+                       previous JANELA_MOVEL months
+    sazonal            x vs the median of the same month in previous years,
+                       scaled by the same rolling MAD
+    mudanca de nivel   median of the next JANELA_NIVEL months minus the median
+                       of the previous ones; flagged on the first month of a run
+
+`fato_anomalias_mensal` keeps only the series-months with at least one alert.
+`score_series` runs the same scores on any frame of series-months, keyed by
+any columns (the Neoenergia diagnostic keys by `neo_distribuidora`).
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.analysis.metrics import add_metrics
+from src.analysis.tensor_store import month_index
+from src.etl.instrumentation import instrumented
+
+CLASSE_TOTAL = "total"
+ANOMALIA_MEDIDAS = ["qtd_serv_realizado", "qtd_fora_prazo", "compensacao_rs"]
+
+JANELA_MOVEL = 12
+MIN_MESES_JANELA = 6
+LAGS_SAZONAIS = (12, 24, 36)
+MIN_ANOS_SAZONAIS = 2
+JANELA_NIVEL = 6
+MIN_MESES_NIVEL = 4
+MAD_ESCALA = 1.4826
+
+LIMITE_VARIACAO = 0.5
+LIMITE_Z = 3.5
+LIMITE_NIVEL = 3.0
+
+ALERTAS = ["alerta_variacao_abrupta", "alerta_z_robusto", "alerta_sazonal", "alerta_mudanca_nivel"]
+
+
+def _series_frame(
+    fato_transgressao_mensal_porte: pd.DataFrame,
+    fato_transgressao_mensal_distribuidora: pd.DataFrame,
+) -> pd.DataFrame:
+    """One row per (sigagente, classe, ano, mes) with the additive measures."""
+    classes = fato_transgressao_mensal_porte.groupby(
+        ["sigagente", "classe_local_servico", "ano", "mes"], as_index=False, observed=True
+    )[ANOMALIA_MEDIDAS].sum()
+    # Totals come from the distributor table so they cover the same rows.
+    totais = fato_transgressao_mensal_distribuidora.groupby(["sigagente", "ano", "mes"], as_index=False)[
+        ANOMALIA_MEDIDAS
+    ].sum()
+    totais.insert(1, "classe_local_servico", CLASSE_TOTAL)
+    frame = pd.concat(
+        [classes.astype({"classe_local_servico": "string"}), totais],
+        ignore_index=True,
+    )
+    return add_metrics(frame, ["taxa_fora_prazo"])
+
+
+def _nanmedian(windows: np.ndarray, min_count: int) -> np.ndarray:
+    """Median over the last axis ignoring NaN; NaN with fewer than `min_count` values.
+
+    np.sort puts NaN last, so the median is read at the valid-count midpoint
+    (much faster than np.nanmedian on many short windows).
+    """
+    ordered = np.sort(windows, axis=-1)
+    count = (~np.isnan(windows)).sum(axis=-1)
+    lower = np.take_along_axis(ordered, np.maximum((count - 1) // 2, 0)[..., None], axis=-1)[..., 0]
+    upper = np.take_along_axis(ordered, (count // 2)[..., None], axis=-1)[..., 0]
+    median = (lower + upper) / 2
+    median[count < max(min_count, 1)] = np.nan
+    return median
+
+
+def _trailing(matrix: np.ndarray, width: int) -> np.ndarray:
+    """(series, months, width) windows over the `width` months before each month."""
+    padded = np.pad(matrix, ((0, 0), (width, 0)), constant_values=np.nan)
+    return sliding_window_view(padded, width, axis=1)[:, : matrix.shape[1]]
+
+
+def _leading(matrix: np.ndarray, width: int) -> np.ndarray:
+    """(series, months, width) windows starting at each month."""
+    padded = np.pad(matrix, ((0, 0), (0, width - 1)), constant_values=np.nan)
+    return sliding_window_view(padded, width, axis=1)
+
+
+def _previous_observed(matrix: np.ndarray, present: np.ndarray) -> np.ndarray:
+    """Value at the previous month that has a row (NaN when there is none)."""
+    n_months = matrix.shape[1]
+    last = np.where(present, np.arange(n_months), -1)
+    last = np.maximum.accumulate(last, axis=1)
+    previous = np.full_like(last, -1)
+    previous[:, 1:] = last[:, :-1]
+    values = np.take_along_axis(matrix, np.maximum(previous, 0), axis=1)
+    return np.where(previous >= 0, values, np.nan)
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return numerator / denominator
+
+
+def score_matrix(matrix: np.ndarray, present: np.ndarray) -> dict[str, np.ndarray]:
+    """All scores and alerts for a (series, months) matrix of `taxa_fora_prazo`."""
+    anterior = _previous_observed(matrix, present)
+    taxa_var_abs = matrix - anterior
+    # Same semantics as Series.pct_change: x / 0 is inf, 0 / 0 is NaN.
+    taxa_var_pct = _divide(matrix, anterior) - 1
+
+    janela = _trailing(matrix, JANELA_MOVEL)
+    mediana_movel = _nanmedian(janela, MIN_MESES_JANELA)
+    mad_movel = _nanmedian(np.abs(janela - mediana_movel[..., None]), MIN_MESES_JANELA)
+    escala = np.where(mad_movel > 0, MAD_ESCALA * mad_movel, np.nan)
+    z_robusto = _divide(matrix - mediana_movel, escala)
+
+    n_months = matrix.shape[1]
+    lags = np.full((*matrix.shape, len(LAGS_SAZONAIS)), np.nan)
+    for k, lag in enumerate(LAGS_SAZONAIS):
+        if lag < n_months:
+            lags[:, lag:, k] = matrix[:, :-lag]
+    base_sazonal = _nanmedian(lags, MIN_ANOS_SAZONAIS)
+    desvio_sazonal = matrix - base_sazonal
+    z_sazonal = _divide(desvio_sazonal, escala)
+
+    antes = _nanmedian(_trailing(matrix, JANELA_NIVEL), MIN_MESES_NIVEL)
+    depois = _nanmedian(_leading(matrix, JANELA_NIVEL), MIN_MESES_NIVEL)
+    mudanca_nivel = depois - antes
+    z_mudanca_nivel = _divide(mudanca_nivel, escala)
+
+    with np.errstate(invalid="ignore"):
+        nivel = np.abs(z_mudanca_nivel) >= LIMITE_NIVEL
+        inicio_nivel = nivel.copy()
+        inicio_nivel[:, 1:] &= ~nivel[:, :-1]
+        return {
+            "taxa_var_abs": taxa_var_abs,
+            "taxa_var_pct": taxa_var_pct,
+            "mediana_movel": mediana_movel,
+            "mad_movel": mad_movel,
+            "z_robusto": z_robusto,
+            "base_sazonal": base_sazonal,
+            "desvio_sazonal": desvio_sazonal,
+            "z_sazonal": z_sazonal,
+            "mudanca_nivel": mudanca_nivel,
+            "z_mudanca_nivel": z_mudanca_nivel,
+            "alerta_variacao_abrupta": np.abs(taxa_var_pct) >= LIMITE_VARIACAO,
+            "alerta_z_robusto": np.abs(z_robusto) >= LIMITE_Z,
+            "alerta_sazonal": np.abs(z_sazonal) >= LIMITE_Z,
+            "alerta_mudanca_nivel": inicio_nivel,
+        }
+
+
+def score_series(frame: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    """`frame` (one row per series-month, series keyed by `keys`) plus every score and alert column."""
+    out = frame.reset_index(drop=True)
+    serie, _ = pd.factorize(pd.MultiIndex.from_frame(out[keys]))
+    periodo = month_index(out["ano"], out["mes"])
+    first = int(periodo.min()) if len(periodo) else 0
+    n_months = int(periodo.max()) - first + 1 if len(periodo) else 0
+    mes_pos = periodo - first
+
+    matrix = np.full((serie.max() + 1 if len(serie) else 0, n_months), np.nan)
+    present = np.zeros(matrix.shape, dtype=bool)
+    matrix[serie, mes_pos] = out["taxa_fora_prazo"].to_numpy(dtype="float64", na_value=np.nan)
+    present[serie, mes_pos] = True
+
+    for name, values in score_matrix(matrix, present).items():
+        out[name] = values[serie, mes_pos]
+    return out
+
+
+@instrumented()
+def build_fato_anomalias_mensal(
+    fato_transgressao_mensal_porte: pd.DataFrame,
+    fato_transgressao_mensal_distribuidora: pd.DataFrame,
+) -> pd.DataFrame:
+    """Flagged series-months for every distributor and service class."""
+    frame = score_series(
+        _series_frame(fato_transgressao_mensal_porte, fato_transgressao_mensal_distribuidora),
+        ["sigagente", "classe_local_servico"],
+    )
+
+    nomes = (
+        fato_transgressao_mensal_distribuidora[["sigagente", "nomagente"]]
+        .drop_duplicates("sigagente")
+        .set_index("sigagente")["nomagente"]
+    )
+    frame["nomagente"] = frame["sigagente"].map(nomes)
+    columns = ["ano", "mes", "sigagente", "nomagente", "classe_local_servico", *ANOMALIA_MEDIDAS, "taxa_fora_prazo"]
+    anomalias = frame.loc[frame[ALERTAS].any(axis=1), [*columns, *frame.columns.difference(columns, sort=False)]]
+    return anomalias.sort_values(["ano", "mes", "sigagente", "classe_local_servico"]).reset_index(drop=True)
@@ -0,0 +1,220 @@
+"""Cluster bootstrap confidence intervals for the pre/post REN 1000 KPIs.
+
+The KPIs of `kpi_regulatorio_anual` (qtd_serv, qtd_fora_prazo,
+compensacao_rs and the pooled taxa_fora_prazo) are re-estimated per period
+(pre_2022, pos_2022) and as the pos - pre delta, nationally and per
+`bucket_porte`. Each replicate resamples distributors with replacement
+inside each group (the n_g distributors of a bucket are drawn from that
+bucket, so the per-porte intervals do not carry the binomial noise of how
+many of its distributors an all-distributor draw happens to pick; only
+`nacional` draws from every distributor) and, independently, the years
+inside each period (the annual series has no months, and the year draw is
+shared by every group), so one replicate's totals are
+
+    T[g, b, p, k] = sum_d sum_(y in p) w_dist[g, b, d] * w_ano[b, y] * S[d, y, k]
+
+with S the distributor x year x measure sums and w_dist zero outside the
+group. The weight matrices are drawn as index matrices and turned into
+counts with bincount; the sums are one einsum per chunk of replicates, so
+memory is bounded by BOOTSTRAP_CHUNK. Chunks get child seeds of one
+SeedSequence, so results are identical serially or on a process pool
+(`max_workers`).
+
+Since the buckets are resampled independently, the bucket standard errors
+of the additive KPIs add up roughly in quadrature to the national one
+(exactly only without the shared year draw and the between-bucket spread
+the national draw also carries, which keeps the ratio below 1 on real porte
+buckets, around 0.6-0.9); `quadrature_check` reports that ratio and
+`scripts/check_bootstrap_ic.py` bounds it.
+
+Distributors are clustered by `agentes.agent_key`, so the annual names
+("COELBA", "EMT") meet the INDGER names of `dim_distribuidora_porte`. A
+distributor's porte group is its bucket in its most recent year there (the
+bucket only exists for the INDGER years); distributors without one fall in
+`sem_porte`. Each row carries its group's `n_distribuidoras`, and
+`group_size_check` flags a `sem_porte` holding more than MAX_SHARE_SEM_PORTE
+of the distributors or a bucket with fewer than MIN_DISTRIBUIDORAS_BUCKET.
+"""
+
+from __future__ import annotations
+
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.agentes import agent_key
+from src.analysis.scenarios import PERIODO_POS, PERIODOS, periodo_regulatorio
+from src.etl.instrumentation import instrumented
+
+BOOTSTRAP_REPLICAS = 2000
+BOOTSTRAP_CHUNK = 250
+BOOTSTRAP_SEED = 20221000
+BOOTSTRAP_NIVEL = 0.95
+QUADRATURA_TOLERANCIA = 2.0
+MAX_SHARE_SEM_PORTE = 0.5
+MIN_DISTRIBUIDORAS_BUCKET = 2
+
+KPI_MEDIDAS = ["qtd_serv", "qtd_fora_prazo", "compensacao_rs"]
+KPIS = [*KPI_MEDIDAS, "taxa_fora_prazo"]
+PERIODO_DELTA = "delta"
+SEM_PORTE = "sem_porte"
+
+
+def _kpis(totals: np.ndarray) -> np.ndarray:
+    """(..., periods, measures) totals -> (..., periods + delta, KPIS)."""
+    serv = totals[..., KPI_MEDIDAS.index("qtd_serv")]
+    fora = totals[..., KPI_MEDIDAS.index("qtd_fora_prazo")]
+    taxa = np.full(serv.shape, np.nan)
+    np.divide(fora, serv, out=taxa, where=serv > 0)
+    values = np.concatenate([totals, taxa[..., None]], axis=-1)
+    delta = values[..., 1:2, :] - values[..., 0:1, :]
+    return np.concatenate([values, delta], axis=-2)
+
+
+def _counts(rng: np.random.Generator, n_items: int, n_replicas: int) -> np.ndarray:
+    """(n_replicas, n_items) times each item is drawn when n_items are drawn with replacement."""
+    draws = rng.integers(0, n_items, size=(n_replicas, n_items))
+    rows = np.arange(n_replicas)[:, None]
+    counts = np.bincount((rows * n_items + draws).ravel(), minlength=n_replicas * n_items)
+    return counts.reshape(n_replicas, n_items)
+
+
+def _replicate_chunk(
+    sums: np.ndarray,
+    membros: np.ndarray,
+    year_period: np.ndarray,
+    n_replicas: int,
+    seed: np.random.SeedSequence,
+) -> np.ndarray:
+    """(groups, n_replicas, periods + delta, KPIS) for one chunk of replicates."""
+    rng = np.random.default_rng(seed)
+    n_groups, n_dist = membros.shape
+
+    # Stratified draw: every group resamples its own members.
+    w_dist = np.zeros((n_groups, n_replicas, n_dist))
+    for g in range(n_groups):
+        dist = np.flatnonzero(membros[g])
+        if len(dist):
+            w_dist[g][:, dist] = _counts(rng, len(dist), n_replicas)
+
+    w_ano = np.zeros((n_replicas, sums.shape[1]))
+    for periodo in range(len(PERIODOS)):
+        anos = np.flatnonzero(year_period == periodo)
+        if len(anos):
+            w_ano[:, anos] = _counts(rng, len(anos), n_replicas)
+
+    indicator = np.eye(len(PERIODOS))[year_period]
+    totals = np.einsum("gbd,dyk,by,yp->gbpk", w_dist, sums, w_ano, indicator, optimize=True)
+    return _kpis(totals)
+
+
+def cluster_sums(
+    fato_indicadores: pd.DataFrame,
+    dim_porte: pd.DataFrame,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, list[str]]:
+    """(distributors, years, measures) sums, (groups, distributors) membership, year -> period index, group labels."""
+    base = fato_indicadores[fato_indicadores["ano_comparavel_principal"].astype(bool)]
+    base = base.dropna(subset=["sigagente", "ano"])
+    dist_pos, agentes = pd.factorize(agent_key(base["sigagente"]), sort=True)
+    ano_pos, anos = pd.factorize(base["ano"].astype("int64"), sort=True)
+    year_period = (periodo_regulatorio(anos) == PERIODO_POS).astype("int64")
+
+    latest = dim_porte.dropna(subset=["sigagente", "bucket_porte"]).sort_values("ano")
+    latest = latest.assign(chave=agent_key(latest["sigagente"])).drop_duplicates("chave", keep="last")
+    bucket = pd.Series(agentes).map(latest.set_index("chave")["bucket_porte"].astype("string"))
+    bucket = bucket.fillna(SEM_PORTE).to_numpy(dtype=object)
+    labels = sorted(set(bucket))
+    grupos = ["nacional", *labels]
+    membros = np.stack([np.ones(len(agentes), dtype=bool), *(bucket == label for label in labels)])
+
+    values = base[KPI_MEDIDAS].to_numpy(dtype="float64", na_value=0.0)
+    sums = np.zeros((len(agentes), len(anos), len(KPI_MEDIDAS)))
+    np.add.at(sums, (dist_pos, ano_pos), values)
+    return sums, membros, year_period, grupos
+
+
+@instrumented()
+def build_kpi_bootstrap_ic(
+    fato_indicadores: pd.DataFrame,
+    dim_porte: pd.DataFrame,
+    replicas: int = BOOTSTRAP_REPLICAS,
+    chunk: int = BOOTSTRAP_CHUNK,
+    seed: int = BOOTSTRAP_SEED,
+    nivel: float = BOOTSTRAP_NIVEL,
+    max_workers: int | None = None,
+) -> pd.DataFrame:
+    """Point estimate, standard error and percentile CI per group, KPI and period."""
+    sums, membros, year_period, grupos = cluster_sums(fato_indicadores, dim_porte)
+    indicator = np.eye(len(PERIODOS))[year_period]
+    estimate = _kpis(np.einsum("gd,dyk,yp->gpk", membros.astype("float64"), sums, indicator))
+
+    sizes = [min(chunk, replicas - start) for start in range(0, replicas, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(sums, membros, year_period, size, child) for size, child in zip(sizes, seeds)]
+    if max_workers and max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            parts = list(pool.map(_replicate_chunk, *zip(*args)))
+    else:
+        parts = [_replicate_chunk(*arg) for arg in args]
+    draws = np.concatenate(parts, axis=1)
+
+    alpha = (1.0 - nivel) / 2
+    with warnings.catch_warnings():
+        # Groups with no services in a period have NaN rates in every replicate.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        lower, upper = np.nanquantile(draws, [alpha, 1.0 - alpha], axis=1)
+        erro = np.nanstd(draws, axis=1, ddof=1)
+
+    periodos = [*PERIODOS, PERIODO_DELTA]
+    shape = estimate.shape
+    g, p, k = np.meshgrid(np.arange(shape[0]), np.arange(shape[1]), np.arange(shape[2]), indexing="ij")
+    grupo = np.asarray(grupos, dtype=object)[g.ravel()]
+    n_distribuidoras = membros.sum(axis=1)[g.ravel()]
+    return pd.DataFrame(
+        {
+            "recorte": np.where(grupo == "nacional", "nacional", "bucket_porte"),
+            "bucket_porte": np.where(grupo == "nacional", None, grupo),
+            "n_distribuidoras": n_distribuidoras,
+            "kpi": np.asarray(KPIS, dtype=object)[k.ravel()],
+            "periodo_regulatorio": np.asarray(periodos, dtype=object)[p.ravel()],
+            "estimativa": estimate.ravel(),
+            "erro_padrao": erro.ravel(),
+            "ic_inferior": lower.ravel(),
+            "ic_superior": upper.ravel(),
+            "replicas": replicas,
+            "nivel_confianca": nivel,
+        }
+    )
+
+
+def quadrature_check(ic: pd.DataFrame) -> pd.DataFrame:
+    """National SE vs the bucket SEs added in quadrature, per additive KPI and period."""
+    aditivos = ic[ic["kpi"].isin(KPI_MEDIDAS)].copy()
+    aditivos["variancia"] = aditivos["erro_padrao"].astype("float64") ** 2
+    chave = ["kpi", "periodo_regulatorio"]
+    nacional = aditivos[aditivos["recorte"] == "nacional"].set_index(chave)["erro_padrao"].astype("float64")
+    buckets = aditivos[aditivos["recorte"] == "bucket_porte"].groupby(chave, sort=False)["variancia"].sum()
+    out = pd.DataFrame({"erro_padrao_nacional": nacional, "erro_padrao_quadratura": np.sqrt(buckets)})
+    out["razao_quadratura"] = out["erro_padrao_quadratura"] / out["erro_padrao_nacional"]
+    return out.reset_index()
+
+
+def group_size_check(ic: pd.DataFrame) -> pd.DataFrame:
+    """Distributors per group, share of the national count and whether the group is too large or too small."""
+    grupos = ic.drop_duplicates(["recorte", "bucket_porte"])
+    nacional = int(grupos.loc[grupos["recorte"] == "nacional", "n_distribuidoras"].sum())
+    out = pd.DataFrame(
+        {
+            "grupo": grupos["bucket_porte"].astype("string").fillna("nacional").to_numpy(),
+            "n_distribuidoras": grupos["n_distribuidoras"].astype("int64").to_numpy(),
+        }
+    )
+    out["share_nacional"] = out["n_distribuidoras"] / max(nacional, 1)
+    bucket = out["grupo"] != "nacional"
+    out["alerta_grupo"] = (
+        ((out["grupo"] == SEM_PORTE) & (out["share_nacional"] > MAX_SHARE_SEM_PORTE))
+        | (bucket & (out["n_distribuidoras"] < MIN_DISTRIBUIDORAS_BUCKET))
+    )
+    return out
@@ -13,12 +13,49 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 
+from src.analysis.anomalies import build_fato_anomalias_mensal
+from src.analysis.bootstrap import build_kpi_bootstrap_ic
+from src.analysis.clustering import build_clusters_distribuidora
+from src.analysis.data_quality import (
+    build_alertas_comparabilidade,
+    build_cobertura_mensal,
+    build_reconciliacao_fontes,
+)
+from src.analysis.dtypes import apply_dtype_policy
+from src.analysis.feature_store import update_feature_store
+from src.analysis.forecast import build_fato_previsao_mensal
+from src.analysis.metrics import add_metrics
+from src.analysis.peer_benchmark import build_benchmark_pares_mensal
+from src.analysis.panel import build_painel_efeitos_mes, build_painel_estudo_evento
+from src.analysis.porte import rank_porte
+from src.analysis.rollup_cube import build_rollup_cube, cube_level, write_rollup_cube
+from src.analysis.scenarios import ano_comparavel, build_base_cenarios, periodo_regulatorio, summarize_cenarios
+from src.analysis.service_codes import code_mix, exclusion_totals
+from src.analysis.sketches import build_sketches, write_sketches
+from src.analysis.star_schema import (
+    DIMENSOES,
+    FATO_SERVICOS_CHAVES,
+    FATO_SERVICOS_MEDIDAS,
+    encode_dimension,
+)
+from src.analysis.tensor_store import build_tensor, write_tensor
+from src.etl.catalog import CATALOG_PATH, refresh_catalog
+from src.etl.instrumentation import annotate_stage, configure_run, instrumented, stage, write_run_report
+from src.etl.parquet_profiles import write_parquet
+
 ROOT = Path(__file__).resolve().parent.parent.parent
 DIR_PROCESSED = ROOT / "data" / "processed"
 DIR_ANALYSIS = DIR_PROCESSED / "analysis"
 DOMAIN_INDICATORS_PATH = ROOT / "data" / "raw" / "dominio-indicadores.csv"
 
 FAMILIAS_VALIDAS = {"QS", "QV", "PM", "CR"}
+# Family -> (fact column, aggregation) for the annual pivot; one column per family.
+FAMILIA_AGREGACOES: dict[str, tuple[str, str]] = {
+    "QS": ("qtd_serv", "sum"),
+    "QV": ("qtd_fora_prazo", "sum"),
+    "PM": ("prazo_medio", "mean"),
+    "CR": ("compensacao_rs", "sum"),
+}
 
 
 def parse_br_number(series: pd.Series) -> pd.Series:
@@ -115,16 +152,7 @@ def infer_codigo_base(sigindicador: str, familia: str) -> str:
     return code
 
 
-def assign_porte_bucket(values: pd.Series) -> pd.Series:
-    pct = values.rank(method="average", pct=True)
-    return pd.cut(
-        pct,
-        bins=[0.0, 0.25, 0.5, 0.75, 1.0],
-        labels=["P", "M", "G", "GG"],
-        include_lowest=True,
-    ).astype("string")
-
-
+@instrumented()
 def load_qualidade_comercial() -> pd.DataFrame:
     path = DIR_PROCESSED / "qualidade_comercial.parquet"
     if not path.exists():
@@ -147,6 +175,7 @@ def load_qualidade_comercial() -> pd.DataFrame:
     return frame
 
 
+@instrumented()
 def load_domain_indicators() -> pd.DataFrame:
     if not DOMAIN_INDICATORS_PATH.exists():
         raise FileNotFoundError(f"Missing file: {DOMAIN_INDICATORS_PATH}")
@@ -171,6 +200,7 @@ def load_domain_indicators() -> pd.DataFrame:
     return domain[["sigindicador", "dscindicador"]]
 
 
+@instrumented()
 def build_dim_indicador_servico(qualidade: pd.DataFrame, domain: pd.DataFrame) -> pd.DataFrame:
     dim = (
         qualidade[["sigindicador"]]
@@ -190,6 +220,64 @@ def build_dim_indicador_servico(qualidade: pd.DataFrame, domain: pd.DataFrame) -
     return dim
 
 
+def pivot_familias(
+    enriched: pd.DataFrame,
+    keys: list[str],
+    agregacoes: dict[str, tuple[str, str]] | None = None,
+) -> pd.DataFrame:
+    """Pivot `familia_indicador` into one column per family in one pass.
+
+    Keys are factorized (NaN kept as its own, last, code) and combined into a
+    group id; sums and counts per (group, family) come from one bincount each.
+    Rows come out in lexicographic key order with NaN last, as a dropna=False
+    groupby would. `has_<familia>` is True when the group has rows of the
+    family (sum) or at least one non-null value (mean); values are 0 otherwise.
+    """
+    agregacoes = agregacoes or FAMILIA_AGREGACOES
+    familias = list(agregacoes)
+    fam_codes = pd.Categorical(enriched["familia_indicador"], categories=familias).codes.astype(np.int64)
+    in_family = fam_codes >= 0
+
+    key_codes = []
+    key_uniques = []
+    for key in keys:
+        codes, uniques = pd.factorize(enriched[key], sort=True, use_na_sentinel=False)
+        key_codes.append(codes[in_family])
+        key_uniques.append(uniques)
+
+    shape = [max(len(uniques), 1) for uniques in key_uniques]
+    flat_keys = np.ravel_multi_index(key_codes, shape)
+    group_ids, group_keys = pd.factorize(flat_keys, sort=True)
+    n_groups, n_fam = len(group_keys), len(familias)
+
+    # Keep the input float dtype (Float64 from parse_br_number), as groupby would.
+    value_dtype = enriched["valor"].dtype if pd.api.types.is_float_dtype(enriched["valor"]) else np.float64
+    valor = enriched["valor"].to_numpy(dtype="float64", na_value=np.nan)[in_family]
+    not_null = ~np.isnan(valor)
+    cell = group_ids * n_fam + fam_codes[in_family]
+    size = n_groups * n_fam
+    soma = np.bincount(cell, weights=np.where(not_null, valor, 0.0), minlength=size).reshape(n_groups, n_fam)
+    linhas = np.bincount(cell, minlength=size).reshape(n_groups, n_fam)
+    validos = np.bincount(cell, weights=not_null, minlength=size).reshape(n_groups, n_fam)
+
+    group_codes = np.unravel_index(group_keys, shape)
+    fact = pd.DataFrame({key: uniques.take(codes) for key, uniques, codes in zip(keys, key_uniques, group_codes)})
+    flags = {}
+    for idx, (familia, (column, agg)) in enumerate(agregacoes.items()):
+        if agg == "mean":
+            present = validos[:, idx] > 0
+            values = np.divide(soma[:, idx], validos[:, idx], out=np.zeros(n_groups), where=present)
+        else:
+            present = linhas[:, idx] > 0
+            values = np.where(present, soma[:, idx], 0.0)
+        fact[column] = pd.array(values, dtype=value_dtype)
+        flags[f"has_{familia.lower()}"] = present
+    for flag, present in flags.items():
+        fact[flag] = present
+    return fact
+
+
+@instrumented()
 def build_fato_indicadores_anuais(qualidade: pd.DataFrame, dim_indicador: pd.DataFrame) -> pd.DataFrame:
     enriched = qualidade.merge(
         dim_indicador[["sigindicador", "familia_indicador", "codigo_base", "classe_local"]],
@@ -200,53 +288,16 @@ def build_fato_indicadores_anuais(qualidade: pd.DataFrame, dim_indicador: pd.Dat
     enriched = enriched.dropna(subset=["ano", "sigagente", "codigo_base"])
 
     keys = ["ano", "sigagente", "codigo_base", "classe_local"]
+    fact = pivot_familias(enriched, keys)
 
-    qs = (
-        enriched[enriched["familia_indicador"] == "QS"]
-        .groupby(keys, dropna=False)["valor"]
-        .sum()
-        .rename("qtd_serv")
-    )
-    qv = (
-        enriched[enriched["familia_indicador"] == "QV"]
-        .groupby(keys, dropna=False)["valor"]
-        .sum()
-        .rename("qtd_fora_prazo")
-    )
-    pm = (
-        enriched[enriched["familia_indicador"] == "PM"]
-        .groupby(keys, dropna=False)["valor"]
-        .mean()
-        .rename("prazo_medio")
-    )
-    cr = (
-        enriched[enriched["familia_indicador"] == "CR"]
-        .groupby(keys, dropna=False)["valor"]
-        .sum()
-        .rename("compensacao_rs")
-    )
-
-    fact = pd.concat([qs, qv, pm, cr], axis=1).reset_index()
-
-    fact["has_qs"] = fact["qtd_serv"].notna()
-    fact["has_qv"] = fact["qtd_fora_prazo"].notna()
-    fact["has_pm"] = fact["prazo_medio"].notna()
-    fact["has_cr"] = fact["compensacao_rs"].notna()
-
-    for col in ["qtd_serv", "qtd_fora_prazo", "prazo_medio", "compensacao_rs"]:
-        fact[col] = fact[col].fillna(0.0)
-
-    fact["taxa_fora_prazo"] = np.where(
-        fact["qtd_serv"] > 0,
-        fact["qtd_fora_prazo"] / fact["qtd_serv"],
-        np.nan,
-    )
-    fact["periodo_regulatorio"] = np.where(fact["ano"] <= 2021, "pre_2022", "pos_2022")
-    fact["ano_comparavel_principal"] = fact["ano"].between(2011, 2023, inclusive="both")
+    add_metrics(fact, ["taxa_fora_prazo"])
+    fact["periodo_regulatorio"] = periodo_regulatorio(fact["ano"])
+    fact["ano_comparavel_principal"] = ano_comparavel(fact["ano"], "anual")
 
     return fact.sort_values(["ano", "sigagente", "codigo_base"]).reset_index(drop=True)
 
 
+@instrumented()
 def build_dim_distribuidora_porte() -> pd.DataFrame:
     path = DIR_PROCESSED / "indger_dados_comerciais.parquet"
     if not path.exists():
@@ -283,15 +334,13 @@ def build_dim_distribuidora_porte() -> pd.DataFrame:
         .rename(columns={"uc_ativa": "uc_ativa_media_mensal"})
     )
 
-    dim["rank_porte_ano"] = (
-        dim.groupby("ano")["uc_ativa_media_mensal"].rank(method="dense", ascending=False).astype("Int64")
-    )
-    dim["bucket_porte"] = dim.groupby("ano", group_keys=False)["uc_ativa_media_mensal"].apply(assign_porte_bucket)
-    dim["share_uc_ano"] = dim["uc_ativa_media_mensal"] / dim.groupby("ano")["uc_ativa_media_mensal"].transform("sum")
+    # Ranks, share and every bucket scheme in one pass over all years.
+    dim = rank_porte(dim)
 
     return dim.sort_values(["ano", "rank_porte_ano", "sigagente"]).reset_index(drop=True)
 
 
+@instrumented()
 def build_uc_ativa_mensal_distribuidora() -> pd.DataFrame:
     """Build monthly UC active totals per distributor."""
     path = DIR_PROCESSED / "indger_dados_comerciais.parquet"
@@ -325,7 +374,9 @@ def build_uc_ativa_mensal_distribuidora() -> pd.DataFrame:
     return monthly.sort_values(["ano", "mes", "sigagente"]).reset_index(drop=True)
 
 
-def build_fato_servicos_municipio_mes() -> pd.DataFrame:
+@instrumented()
+def build_fato_servicos_municipio_mes() -> tuple[pd.DataFrame, dict[str, pd.DataFrame]]:
+    """Keyed service fact (see star_schema) plus its dimensions."""
     path = DIR_PROCESSED / "indger_servicos_comerciais.parquet"
     if not path.exists():
         raise FileNotFoundError(f"Missing file: {path}")
@@ -357,60 +408,47 @@ def build_fato_servicos_municipio_mes() -> pd.DataFrame:
     frame["mes"] = frame["dt_ref"].dt.month
 
     frame["codmunicipioibge"] = (
-        frame["codmunicipioibge"].astype("string").str.replace(".0", "", regex=False).str.strip()
+        frame["codmunicipioibge"].astype("string").str.strip().str.replace(r"\.0$", "", regex=True)
     )
     frame["codtiposervico"] = frame["codtiposervico"].astype("string").str.strip()
 
     frame["qtd_serv_realizado"] = parse_br_number(frame["qtdservrealizado"]).fillna(0.0)
     frame["qtd_fora_prazo"] = parse_br_number(frame["qtdservrealizdescprazo"]).fillna(0.0)
     frame["compensacao_rs"] = parse_br_number(frame["vlrpagocompensacao"]).fillna(0.0)
-    frame["classe_local_servico"] = frame["dsctiposervico"].apply(lambda v: classify_segment(normalize_text(v)))
-
-    keys = [
-        "ano",
-        "mes",
-        "sigagente",
-        "nomagente",
-        "codmunicipioibge",
-        "codtiposervico",
-        "dsctiposervico",
-        "dscprazo",
-        "classe_local_servico",
-    ]
 
-    fact = (
-        frame.groupby(keys, dropna=False)[["qtd_serv_realizado", "qtd_fora_prazo", "compensacao_rs"]]
-        .sum()
-        .reset_index()
+    keyed = pd.DataFrame(
+        {
+            "ano": frame["ano"].to_numpy(dtype="int16"),
+            "mes": frame["mes"].to_numpy(dtype="int16"),
+        }
     )
+    dims: dict[str, pd.DataFrame] = {}
+    for name, (key, _, _) in DIMENSOES.items():
+        keyed[key], dims[name] = encode_dimension(frame, name)
+    for col in FATO_SERVICOS_MEDIDAS:
+        keyed[col] = frame[col].to_numpy()
 
-    fact["taxa_fora_prazo"] = np.where(
-        fact["qtd_serv_realizado"] > 0,
-        fact["qtd_fora_prazo"] / fact["qtd_serv_realizado"],
-        np.nan,
-    )
-    fact["periodo_regulatorio"] = np.where(fact["ano"] <= 2021, "pre_2022", "pos_2022")
-    fact["ano_comparavel_principal"] = fact["ano"].between(2023, 2025, inclusive="both")
+    # Classified once per service type instead of once per row.
+    tipos = dims["dim_tipo_servico"]
+    tipos["classe_local_servico"] = tipos["dsctiposervico"].apply(lambda v: classify_segment(normalize_text(v)))
 
-    return fact.sort_values(["ano", "mes", "sigagente", "codmunicipioibge", "codtiposervico"]).reset_index(drop=True)
+    fact = keyed.groupby(FATO_SERVICOS_CHAVES, sort=True)[FATO_SERVICOS_MEDIDAS].sum().reset_index()
+    return fact, dims
 
 
+@instrumented()
 def build_fato_transgressao_mensal_porte(
-    fato_servicos_municipio_mes: pd.DataFrame,
+    cubo_servicos: pd.DataFrame,
     uc_ativa_mensal_distribuidora: pd.DataFrame,
     dim_porte: pd.DataFrame,
 ) -> pd.DataFrame:
     """Monthly transgression/compensation by distributor, normalized by size."""
-    mensal = (
-        fato_servicos_municipio_mes.groupby(
-            ["ano", "mes", "sigagente", "nomagente", "classe_local_servico"], as_index=False
-        )
-        .agg(
-            qtd_serv_realizado=("qtd_serv_realizado", "sum"),
-            qtd_fora_prazo=("qtd_fora_prazo", "sum"),
-            compensacao_rs=("compensacao_rs", "sum"),
-        )
+    mensal = cube_level(
+        cubo_servicos,
+        "agente_classe_mes",
+        ["ano", "mes", "sigagente", "nomagente", "classe_local_servico", *FATO_SERVICOS_MEDIDAS],
     )
+    mensal = mensal.dropna(subset=["sigagente", "nomagente"]).reset_index(drop=True)
 
     mensal = mensal.merge(
         uc_ativa_mensal_distribuidora[["ano", "mes", "sigagente", "uc_ativa_mes"]],
@@ -423,32 +461,22 @@ def build_fato_transgressao_mensal_porte(
         how="left",
     )
 
-    mensal["taxa_fora_prazo"] = np.where(
-        mensal["qtd_serv_realizado"] > 0,
-        mensal["qtd_fora_prazo"] / mensal["qtd_serv_realizado"],
-        np.nan,
-    )
-    mensal["fora_prazo_por_100k_uc_mes"] = np.where(
-        mensal["uc_ativa_mes"] > 0,
-        mensal["qtd_fora_prazo"] / mensal["uc_ativa_mes"] * 100000.0,
-        np.nan,
-    )
-    mensal["compensacao_rs_por_uc_mes"] = np.where(
-        mensal["uc_ativa_mes"] > 0,
-        mensal["compensacao_rs"] / mensal["uc_ativa_mes"],
-        np.nan,
-    )
-    mensal["compensacao_media_por_transgressao_rs"] = np.where(
-        mensal["qtd_fora_prazo"] > 0,
-        mensal["compensacao_rs"] / mensal["qtd_fora_prazo"],
-        np.nan,
+    add_metrics(
+        mensal,
+        [
+            "taxa_fora_prazo",
+            "fora_prazo_por_100k_uc_mes",
+            "compensacao_rs_por_uc_mes",
+            "compensacao_media_por_transgressao_rs",
+        ],
     )
-    mensal["periodo_regulatorio"] = np.where(mensal["ano"] <= 2021, "pre_2022", "pos_2022")
-    mensal["ano_comparavel_principal"] = mensal["ano"].between(2023, 2025, inclusive="both")
+    mensal["periodo_regulatorio"] = periodo_regulatorio(mensal["ano"])
+    mensal["ano_comparavel_principal"] = ano_comparavel(mensal["ano"], "mensal")
 
     return mensal.sort_values(["ano", "mes", "sigagente", "classe_local_servico"]).reset_index(drop=True)
 
 
+@instrumented()
 def build_fato_transgressao_mensal_distribuidora(
     fato_transgressao_mensal_porte: pd.DataFrame,
 ) -> pd.DataFrame:
@@ -473,55 +501,40 @@ def build_fato_transgressao_mensal_distribuidora(
             compensacao_rs=("compensacao_rs", "sum"),
         )
     )
-    fact["taxa_fora_prazo"] = np.where(
-        fact["qtd_serv_realizado"] > 0,
-        fact["qtd_fora_prazo"] / fact["qtd_serv_realizado"],
-        np.nan,
-    )
-    fact["fora_prazo_por_100k_uc_mes"] = np.where(
-        fact["uc_ativa_mes"] > 0,
-        fact["qtd_fora_prazo"] / fact["uc_ativa_mes"] * 100000.0,
-        np.nan,
-    )
-    fact["compensacao_rs_por_uc_mes"] = np.where(
-        fact["uc_ativa_mes"] > 0,
-        fact["compensacao_rs"] / fact["uc_ativa_mes"],
-        np.nan,
-    )
-    fact["compensacao_media_por_transgressao_rs"] = np.where(
-        fact["qtd_fora_prazo"] > 0,
-        fact["compensacao_rs"] / fact["qtd_fora_prazo"],
-        np.nan,
+    add_metrics(
+        fact,
+        [
+            "taxa_fora_prazo",
+            "fora_prazo_por_100k_uc_mes",
+            "compensacao_rs_por_uc_mes",
+            "compensacao_media_por_transgressao_rs",
+        ],
     )
-    fact["periodo_regulatorio"] = np.where(fact["ano"] <= 2021, "pre_2022", "pos_2022")
-    fact["ano_comparavel_principal"] = fact["ano"].between(2023, 2025, inclusive="both")
+    fact["periodo_regulatorio"] = periodo_regulatorio(fact["ano"])
+    fact["ano_comparavel_principal"] = ano_comparavel(fact["ano"], "mensal")
     return fact.sort_values(["ano", "mes", "sigagente"]).reset_index(drop=True)
 
 
+@instrumented()
 def merge_fato_with_porte(fato_indicadores: pd.DataFrame, dim_porte: pd.DataFrame) -> pd.DataFrame:
     merge_cols = ["ano", "sigagente", "uc_ativa_media_mensal", "bucket_porte", "rank_porte_ano", "nomagente"]
     enriched = fato_indicadores.merge(dim_porte[merge_cols], on=["ano", "sigagente"], how="left")
 
-    enriched["fora_prazo_por_100k_uc"] = np.where(
-        enriched["uc_ativa_media_mensal"] > 0,
-        enriched["qtd_fora_prazo"] / enriched["uc_ativa_media_mensal"] * 100000.0,
-        np.nan,
-    )
-    enriched["compensacao_rs_por_uc"] = np.where(
-        enriched["uc_ativa_media_mensal"] > 0,
-        enriched["compensacao_rs"] / enriched["uc_ativa_media_mensal"],
-        np.nan,
-    )
+    add_metrics(enriched, ["fora_prazo_por_100k_uc", "compensacao_rs_por_uc"])
     return enriched
 
 
+@instrumented()
 def save_table(frame: pd.DataFrame, base_name: str, write_csv: bool = True) -> None:
+    annotate_stage(tabela=base_name)
     DIR_ANALYSIS.mkdir(parents=True, exist_ok=True)
-    frame.to_parquet(DIR_ANALYSIS / f"{base_name}.parquet", index=False)
+    frame = apply_dtype_policy(frame)
+    write_parquet(frame, DIR_ANALYSIS / f"{base_name}.parquet")
     if write_csv:
         frame.to_csv(DIR_ANALYSIS / f"{base_name}.csv", index=False)
 
 
+@instrumented()
 def build_kpi_overview(fato_indicadores: pd.DataFrame) -> pd.DataFrame:
     yearly = (
         fato_indicadores[fato_indicadores["ano_comparavel_principal"]]
@@ -532,15 +545,15 @@ def build_kpi_overview(fato_indicadores: pd.DataFrame) -> pd.DataFrame:
             compensacao_rs=("compensacao_rs", "sum"),
         )
     )
-    yearly["taxa_fora_prazo"] = np.where(
-        yearly["qtd_serv"] > 0,
-        yearly["qtd_fora_prazo"] / yearly["qtd_serv"],
-        np.nan,
-    )
+    add_metrics(yearly, ["taxa_fora_prazo"])
     return yearly.sort_values("ano").reset_index(drop=True)
 
 
-def run_all() -> dict[str, pd.DataFrame]:
+def run_all(
+    bootstrap_workers: int | None = None,
+    panel_workers: int | None = None,
+    sketches: bool = False,
+) -> dict[str, pd.DataFrame]:
     qualidade = load_qualidade_comercial()
     domain = load_domain_indicators()
 
@@ -548,25 +561,72 @@ def run_all() -> dict[str, pd.DataFrame]:
     fato_indicadores = build_fato_indicadores_anuais(qualidade, dim_indicador)
     dim_porte = build_dim_distribuidora_porte()
     uc_ativa_mensal = build_uc_ativa_mensal_distribuidora()
-    fato_servicos = build_fato_servicos_municipio_mes()
+    fato_servicos, dims_servicos = build_fato_servicos_municipio_mes()
+    cubo_servicos = build_rollup_cube(fato_servicos, dims_servicos, uc_ativa_mensal)
     fato_transgressao_mensal_porte = build_fato_transgressao_mensal_porte(
-        fato_servicos, uc_ativa_mensal, dim_porte
+        cubo_servicos, uc_ativa_mensal, dim_porte
     )
     fato_transgressao_mensal_distribuidora = build_fato_transgressao_mensal_distribuidora(
         fato_transgressao_mensal_porte
     )
+    agente_servico_mes = cube_level(cubo_servicos, "agente_servico_mes")
+    servicos_exclusao_codigos = exclusion_totals(agente_servico_mes)
+    servicos_mix_codigos = code_mix(agente_servico_mes)
+    features, linhas_features, _, _ = update_feature_store(fato_transgressao_mensal_porte, servicos_mix_codigos)
+    clusters_distribuidora, clusters_silhueta = build_clusters_distribuidora(features, linhas_features)
+    alertas_comparabilidade, painel_comparavel = build_alertas_comparabilidade(agente_servico_mes)
+    benchmark_pares_mensal = build_benchmark_pares_mensal(fato_transgressao_mensal_distribuidora)
+    cobertura_mensal = build_cobertura_mensal(fato_transgressao_mensal_distribuidora)
+    reconciliacao_fontes = build_reconciliacao_fontes(fato_indicadores, fato_transgressao_mensal_distribuidora)
+    fato_anomalias_mensal = build_fato_anomalias_mensal(
+        fato_transgressao_mensal_porte, fato_transgressao_mensal_distribuidora
+    )
+    tensor = build_tensor(fato_transgressao_mensal_distribuidora)
+    fato_previsao_mensal = build_fato_previsao_mensal(*tensor)
 
     fato_indicadores = merge_fato_with_porte(fato_indicadores, dim_porte)
     kpi_overview = build_kpi_overview(fato_indicadores)
+    kpi_bootstrap_ic = build_kpi_bootstrap_ic(fato_indicadores, dim_porte, max_workers=bootstrap_workers)
+    base_cenarios = build_base_cenarios(fato_indicadores, fato_transgressao_mensal_distribuidora)
+    cenarios_regulatorios = summarize_cenarios(base_cenarios)
+    painel_estudo_evento = build_painel_estudo_evento(fato_indicadores, max_workers=panel_workers)
+    painel_efeitos_mes = build_painel_efeitos_mes(
+        fato_transgressao_mensal_porte,
+        fato_servicos,
+        dims_servicos["dim_tipo_servico"],
+        max_workers=panel_workers,
+    )
 
     save_table(dim_indicador, "dim_indicador_servico")
     save_table(dim_porte, "dim_distribuidora_porte")
     save_table(uc_ativa_mensal, "fato_uc_ativa_mensal_distribuidora")
     save_table(fato_indicadores, "fato_indicadores_anuais")
     save_table(fato_servicos, "fato_servicos_municipio_mes", write_csv=False)
+    for name, dim in dims_servicos.items():
+        save_table(dim, name)
+    write_rollup_cube(cubo_servicos)
     save_table(fato_transgressao_mensal_porte, "fato_transgressao_mensal_porte")
     save_table(fato_transgressao_mensal_distribuidora, "fato_transgressao_mensal_distribuidora")
+    save_table(servicos_exclusao_codigos, "servicos_exclusao_codigos")
+    save_table(servicos_mix_codigos, "servicos_mix_codigos")
+    save_table(clusters_distribuidora, "clusters_distribuidora")
+    save_table(clusters_silhueta, "clusters_silhueta")
+    save_table(benchmark_pares_mensal, "benchmark_pares_mensal")
+    save_table(cobertura_mensal, "cobertura_mensal")
+    save_table(reconciliacao_fontes, "reconciliacao_fontes")
+    save_table(alertas_comparabilidade, "alertas_comparabilidade")
+    save_table(painel_comparavel, "painel_comparavel")
+    save_table(fato_anomalias_mensal, "fato_anomalias_mensal")
+    save_table(fato_previsao_mensal, "fato_previsao_mensal")
     save_table(kpi_overview, "kpi_regulatorio_anual")
+    save_table(kpi_bootstrap_ic, "kpi_bootstrap_ic")
+    save_table(base_cenarios, "base_cenarios")
+    save_table(cenarios_regulatorios, "cenarios_regulatorios")
+    save_table(painel_estudo_evento, "painel_estudo_evento")
+    save_table(painel_efeitos_mes, "painel_efeitos_mes")
+    write_tensor(*tensor)
+    if sketches:
+        write_sketches(build_sketches(fato_servicos, dims_servicos))
 
     return {
         "dim_indicador_servico": dim_indicador,
@@ -574,21 +634,66 @@ def run_all() -> dict[str, pd.DataFrame]:
         "fato_uc_ativa_mensal_distribuidora": uc_ativa_mensal,
         "fato_indicadores_anuais": fato_indicadores,
         "fato_servicos_municipio_mes": fato_servicos,
+        **dims_servicos,
+        "cubo_servicos": cubo_servicos,
         "fato_transgressao_mensal_porte": fato_transgressao_mensal_porte,
         "fato_transgressao_mensal_distribuidora": fato_transgressao_mensal_distribuidora,
+        "servicos_exclusao_codigos": servicos_exclusao_codigos,
+        "servicos_mix_codigos": servicos_mix_codigos,
+        "clusters_distribuidora": clusters_distribuidora,
+        "clusters_silhueta": clusters_silhueta,
+        "benchmark_pares_mensal": benchmark_pares_mensal,
+        "cobertura_mensal": cobertura_mensal,
+        "reconciliacao_fontes": reconciliacao_fontes,
+        "alertas_comparabilidade": alertas_comparabilidade,
+        "painel_comparavel": painel_comparavel,
+        "fato_anomalias_mensal": fato_anomalias_mensal,
+        "fato_previsao_mensal": fato_previsao_mensal,
         "kpi_regulatorio_anual": kpi_overview,
+        "kpi_bootstrap_ic": kpi_bootstrap_ic,
+        "base_cenarios": base_cenarios,
+        "cenarios_regulatorios": cenarios_regulatorios,
+        "painel_estudo_evento": painel_estudo_evento,
+        "painel_efeitos_mes": painel_efeitos_mes,
     }
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Build ANEEL analysis tables")
-    _ = parser.parse_args()
-
-    outputs = run_all()
+    parser.add_argument("--profile", action="store_true", help="dump cProfile stats per stage")
+    parser.add_argument(
+        "--bootstrap-workers",
+        type=int,
+        default=None,
+        help="processes for the KPI bootstrap (default: serial; results are identical)",
+    )
+    parser.add_argument(
+        "--panel-workers",
+        type=int,
+        default=None,
+        help="processes for the per-service-type panel models (default: serial; results are identical)",
+    )
+    parser.add_argument(
+        "--sketches",
+        action="store_true",
+        help="also write the approximate-query sketches of the municipal fact (sketches/)",
+    )
+    args = parser.parse_args()
+
+    configure_run("build_analysis_tables", profile=args.profile)
+    outputs = run_all(
+        bootstrap_workers=args.bootstrap_workers,
+        panel_workers=args.panel_workers,
+        sketches=args.sketches,
+    )
     print("Analysis tables generated:")
     for name, frame in outputs.items():
         print(f"  - {name}: {len(frame):,} rows")
     print(f"Output dir: {DIR_ANALYSIS}")
+    with stage("refresh_catalog"):
+        refresh_catalog()
+    print(f"Catalog: {CATALOG_PATH}")
+    print(f"Run report: {write_run_report()}")
 
 
 if __name__ == "__main__":
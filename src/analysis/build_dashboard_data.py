@@ -6,12 +6,17 @@ Usage:
 
 from __future__ import annotations
 
+import argparse
 import json
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
+from src.analysis.data_quality import apply_painel_comparavel
+from src.analysis.dtypes import apply_dtype_policy
+from src.etl.instrumentation import configure_run, instrumented, stage, write_run_report
+
 ROOT = Path(__file__).resolve().parent.parent.parent
 DIR_ANALYSIS = ROOT / "data" / "processed" / "analysis"
 DIR_NEO = DIR_ANALYSIS / "neoenergia"
@@ -20,7 +25,9 @@ OUTPUT_PATH = DASHBOARD_DIR / "dashboard_data.json"
 
 REQUIRED_INPUT_FILES = [
     DIR_ANALYSIS / "kpi_regulatorio_anual.csv",
+    DIR_ANALYSIS / "kpi_bootstrap_ic.csv",
     DIR_ANALYSIS / "fato_transgressao_mensal_distribuidora.csv",
+    DIR_ANALYSIS / "painel_comparavel.csv",
     DIR_NEO / "neo_anual_2023_2025.csv",
     DIR_NEO / "neo_tendencia_2023_2025.csv",
     DIR_NEO / "neo_benchmark_porte_latest.csv",
@@ -30,6 +37,7 @@ REQUIRED_INPUT_FILES = [
 ]
 
 REQUIRED_NON_EMPTY_SECTIONS = [
+    "kpi_ic",
     "serie_anual",
     "serie_mensal_nacional",
     "neo_anual",
@@ -64,12 +72,13 @@ def _df_to_records(df: pd.DataFrame) -> list[dict]:
     return records
 
 
+@instrumented()
 def _read(name: str, subdir: str | None = None) -> pd.DataFrame:
     base = DIR_NEO if subdir == "neoenergia" else DIR_ANALYSIS
     path = base / f"{name}.csv"
     if not path.exists():
         raise FileNotFoundError(f"Arquivo obrigatório não encontrado: {path}")
-    return pd.read_csv(path)
+    return apply_dtype_policy(pd.read_csv(path))
 
 
 def validate_required_inputs() -> None:
@@ -92,6 +101,7 @@ def validate_non_empty_sections(data: dict) -> None:
         raise RuntimeError(msg)
 
 
+@instrumented()
 def build_kpi_overview(kpi: pd.DataFrame) -> dict:
     """Build KPI summary: pre vs post REN 1000."""
     if kpi.empty:
@@ -125,6 +135,15 @@ def build_kpi_overview(kpi: pd.DataFrame) -> dict:
     }
 
 
+@instrumented()
+def build_kpi_ic(kpi_ic: pd.DataFrame) -> list[dict]:
+    """Bootstrap CIs of the pre/post KPIs (national and per porte bucket)."""
+    if kpi_ic.empty:
+        return []
+    return _df_to_records(kpi_ic)
+
+
+@instrumented()
 def build_serie_anual(kpi: pd.DataFrame) -> list[dict]:
     """Annual time series for the main line/bar chart."""
     if kpi.empty:
@@ -133,6 +152,7 @@ def build_serie_anual(kpi: pd.DataFrame) -> list[dict]:
     return _df_to_records(kpi)
 
 
+@instrumented()
 def build_neo_anual(df: pd.DataFrame) -> list[dict]:
     if df.empty:
         return []
@@ -140,12 +160,14 @@ def build_neo_anual(df: pd.DataFrame) -> list[dict]:
     return _df_to_records(df)
 
 
+@instrumented()
 def build_neo_tendencia(df: pd.DataFrame) -> list[dict]:
     if df.empty:
         return []
     return _df_to_records(df)
 
 
+@instrumented()
 def build_neo_benchmark(df: pd.DataFrame) -> list[dict]:
     if df.empty:
         return []
@@ -153,18 +175,21 @@ def build_neo_benchmark(df: pd.DataFrame) -> list[dict]:
     return _df_to_records(df)
 
 
+@instrumented()
 def build_neo_classe_local(df: pd.DataFrame) -> list[dict]:
     if df.empty:
         return []
     return _df_to_records(df)
 
 
+@instrumented()
 def build_neo_longa(df: pd.DataFrame) -> list[dict]:
     if df.empty:
         return []
     return _df_to_records(df)
 
 
+@instrumented()
 def build_neo_mensal(df: pd.DataFrame) -> list[dict]:
     if df.empty:
         return []
@@ -172,23 +197,33 @@ def build_neo_mensal(df: pd.DataFrame) -> list[dict]:
     return _df_to_records(df)
 
 
-def build_fato_mensal_distribuidora(df: pd.DataFrame) -> list[dict]:
-    """Monthly transgression data for all distributors (for the monthly view)."""
+@instrumented()
+def build_fato_mensal_distribuidora(df: pd.DataFrame, painel: pd.DataFrame) -> list[dict]:
+    """Monthly transgression data for all distributors (for the monthly view).
+
+    Each row carries `painel_comparavel` so the view can hide distributor-years
+    whose volume or service-code mix broke vs the previous year.
+    """
     if df.empty:
         return []
-    df = df.sort_values(["ano", "mes", "sigagente"])
+    df = apply_painel_comparavel(df, painel).sort_values(["ano", "mes", "sigagente"])
     # Only keep useful columns to reduce JSON size
     cols = [
         "ano", "mes", "sigagente", "nomagente", "uc_ativa_mes",
         "qtd_serv_realizado", "qtd_fora_prazo", "compensacao_rs",
         "taxa_fora_prazo", "fora_prazo_por_100k_uc_mes",
-        "compensacao_rs_por_uc_mes", "bucket_porte",
+        "compensacao_rs_por_uc_mes", "bucket_porte", "painel_comparavel",
     ]
     available = [c for c in cols if c in df.columns]
     return _df_to_records(df[available])
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Gera o JSON do dashboard")
+    parser.add_argument("--profile", action="store_true", help="salva estatísticas cProfile por etapa")
+    args = parser.parse_args()
+
+    configure_run("build_dashboard_data", profile=args.profile)
     print("🔧 Gerando dados para o dashboard...")
 
     DASHBOARD_DIR.mkdir(parents=True, exist_ok=True)
@@ -196,7 +231,9 @@ def main():
 
     # Load CSVs
     kpi = _read("kpi_regulatorio_anual")
+    kpi_ic = _read("kpi_bootstrap_ic")
     fato_mensal = _read("fato_transgressao_mensal_distribuidora")
+    painel = _read("painel_comparavel")
     neo_anual = _read("neo_anual_2023_2025", "neoenergia")
     neo_tendencia = _read("neo_tendencia_2023_2025", "neoenergia")
     neo_benchmark = _read("neo_benchmark_porte_latest", "neoenergia")
@@ -211,8 +248,9 @@ def main():
             "project": "TCC — Análise REN 1000/2021 ANEEL",
         },
         "kpi_overview": build_kpi_overview(kpi),
+        "kpi_ic": build_kpi_ic(kpi_ic),
         "serie_anual": build_serie_anual(kpi),
-        "serie_mensal_nacional": build_fato_mensal_distribuidora(fato_mensal),
+        "serie_mensal_nacional": build_fato_mensal_distribuidora(fato_mensal, painel),
         "neo_anual": build_neo_anual(neo_anual),
         "neo_tendencia": build_neo_tendencia(neo_tendencia),
         "neo_benchmark": build_neo_benchmark(neo_benchmark),
@@ -222,11 +260,13 @@ def main():
     }
     validate_non_empty_sections(data)
 
-    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    with stage("write_dashboard_json"):
+        with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
 
     size_mb = OUTPUT_PATH.stat().st_size / 1024 / 1024
     print(f"✅ Arquivo gerado: {OUTPUT_PATH} ({size_mb:.2f} MB)")
+    print(f"📈 Relatório de execução: {write_run_report()}")
 
 
 if __name__ == "__main__":
@@ -6,12 +6,20 @@ Usage:
 
 from __future__ import annotations
 
+import argparse
 from pathlib import Path
 import unicodedata
 
 import numpy as np
 import pandas as pd
 
+from src.analysis.data_quality import match_rate
+from src.analysis.dtypes import apply_dtype_policy
+from src.analysis.metrics import add_metrics
+from src.analysis.rollup_cube import read_cube_level
+from src.analysis.scenarios import PERIODO_POS, PERIODO_PRE, periodo_regulatorio
+from src.etl.instrumentation import configure_run, instrumented, write_run_report
+
 ROOT = Path(__file__).resolve().parent.parent.parent
 DIR_ANALYSIS = ROOT / "data" / "processed" / "analysis"
 REPORT_PATH = ROOT / "reports" / "relatorio_aneel.md"
@@ -35,11 +43,12 @@ def fmt_pct(value: float | int | None) -> str:
     return f"{float(value) * 100:.3f}%"
 
 
+@instrumented()
 def load_table(name: str) -> pd.DataFrame:
     path = DIR_ANALYSIS / f"{name}.parquet"
     if not path.exists():
         raise FileNotFoundError(f"Missing analysis table: {path}")
-    return pd.read_parquet(path)
+    return apply_dtype_policy(pd.read_parquet(path))
 
 
 def find_agent_name(frame: pd.DataFrame, terms: list[str]) -> str | None:
@@ -56,12 +65,14 @@ def find_agent_name(frame: pd.DataFrame, terms: list[str]) -> str | None:
     return None
 
 
+@instrumented()
 def build_pre_post_summary(fato_indicadores: pd.DataFrame) -> dict[str, float]:
     base = fato_indicadores[fato_indicadores["ano_comparavel_principal"]].copy()
     base = base[base["ano"] <= 2023].copy()
 
-    pre = base[base["ano"] <= 2021]
-    post = base[(base["ano"] >= 2022) & (base["ano"] <= 2023)]
+    periodo = periodo_regulatorio(base["ano"])
+    pre = base[periodo == PERIODO_PRE]
+    post = base[periodo == PERIODO_POS]
 
     def summarize(frame: pd.DataFrame) -> tuple[float, float]:
         serv = frame["qtd_serv"].sum()
@@ -83,13 +94,16 @@ def build_pre_post_summary(fato_indicadores: pd.DataFrame) -> dict[str, float]:
     }
 
 
+@instrumented()
 def build_benchmark_table(
     fato_mensal_porte: pd.DataFrame,
     dim_porte: pd.DataFrame,
     focus_names: list[str],
 ) -> pd.DataFrame:
+    """Yearly totals of the focus distributors; the filter runs before the groupby."""
+    foco = fato_mensal_porte[fato_mensal_porte["nomagente"].isin(focus_names)]
     agg = (
-        fato_mensal_porte.groupby(["ano", "sigagente", "nomagente"], as_index=False)
+        foco.groupby(["ano", "sigagente", "nomagente"], as_index=False)
         .agg(
             qtd_serv_realizado=("qtd_serv_realizado", "sum"),
             qtd_fora_prazo=("qtd_fora_prazo", "sum"),
@@ -99,11 +113,7 @@ def build_benchmark_table(
         )
     )
 
-    agg["taxa_fora_prazo"] = np.where(
-        agg["qtd_serv_realizado"] > 0,
-        agg["qtd_fora_prazo"] / agg["qtd_serv_realizado"],
-        np.nan,
-    )
+    add_metrics(agg, ["taxa_fora_prazo"])
 
     agg = agg.merge(
         dim_porte[["ano", "sigagente", "uc_ativa_media_mensal", "bucket_porte", "rank_porte_ano"]],
@@ -111,43 +121,34 @@ def build_benchmark_table(
         how="left",
     )
 
-    result = agg[agg["nomagente"].isin(focus_names)].copy()
-    return result.sort_values(["ano", "nomagente"]).reset_index(drop=True)
-
-
-def build_monthly_summary(fato_mensal_porte: pd.DataFrame) -> pd.DataFrame:
-    monthly = (
-        fato_mensal_porte.groupby(["ano", "mes"], as_index=False)
-        .agg(
-            qtd_serv_realizado=("qtd_serv_realizado", "sum"),
-            qtd_fora_prazo=("qtd_fora_prazo", "sum"),
-            compensacao_rs=("compensacao_rs", "sum"),
-            uc_ativa_mes=("uc_ativa_mes", "sum"),
-        )
-    )
-    monthly["taxa_fora_prazo"] = np.where(
-        monthly["qtd_serv_realizado"] > 0,
-        monthly["qtd_fora_prazo"] / monthly["qtd_serv_realizado"],
-        np.nan,
-    )
-    monthly["fora_prazo_por_100k_uc"] = np.where(
-        monthly["uc_ativa_mes"] > 0,
-        monthly["qtd_fora_prazo"] / monthly["uc_ativa_mes"] * 100000.0,
-        np.nan,
-    )
-    monthly["compensacao_rs_por_uc"] = np.where(
-        monthly["uc_ativa_mes"] > 0,
-        monthly["compensacao_rs"] / monthly["uc_ativa_mes"],
-        np.nan,
+    return agg.sort_values(["ano", "nomagente"]).reset_index(drop=True)
+
+
+@instrumented()
+def build_monthly_summary(nacional_mes: pd.DataFrame) -> pd.DataFrame:
+    """National monthly totals; `nacional_mes` is the rollup cube level (already aggregated)."""
+    monthly = nacional_mes[
+        ["ano", "mes", "qtd_serv_realizado", "qtd_fora_prazo", "compensacao_rs", "uc_ativa_mes"]
+    ].copy()
+    add_metrics(
+        monthly,
+        {
+            "taxa_fora_prazo": "taxa_fora_prazo",
+            "fora_prazo_por_100k_uc": "fora_prazo_por_100k_uc_mes",
+            "compensacao_rs_por_uc": "compensacao_rs_por_uc_mes",
+        },
     )
     return monthly.sort_values(["ano", "mes"]).reset_index(drop=True)
 
 
+@instrumented()
 def render_markdown(
     kpi: pd.DataFrame,
     pre_post: dict[str, float],
+    kpi_ic: pd.DataFrame,
     monthly_summary: pd.DataFrame,
     foco: pd.DataFrame,
+    reconciliacao: pd.DataFrame,
     has_compensation_data: bool,
     data_sources_note: str,
 ) -> str:
@@ -175,6 +176,21 @@ def render_markdown(
     lines.append(f"- Compensacao total (pre): {fmt_money(pre_post['pre_comp'])}")
     lines.append(f"- Compensacao total (pos): {fmt_money(pre_post['post_comp'])}")
     lines.append(f"- Variacao de compensacao total: {fmt_money(pre_post['delta_comp'])}")
+    delta_ic = kpi_ic[(kpi_ic["recorte"] == "nacional") & (kpi_ic["periodo_regulatorio"] == "delta")].set_index("kpi")
+    if not delta_ic.empty:
+        replicas = int(delta_ic["replicas"].iloc[0])
+        nivel = f"{float(delta_ic['nivel_confianca'].iloc[0]) * 100:.0f}%"
+        taxa = delta_ic.loc["taxa_fora_prazo"]
+        comp = delta_ic.loc["compensacao_rs"]
+        lines.append(
+            f"- IC {nivel} da variacao da taxa (bootstrap por distribuidora e ano, {replicas} replicas): "
+            f"[{fmt_pct(taxa['ic_inferior'])}; {fmt_pct(taxa['ic_superior'])}]"
+        )
+        lines.append(
+            f"- IC {nivel} da variacao de compensacao total: "
+            f"[{fmt_money(comp['ic_inferior'])}; {fmt_money(comp['ic_superior'])}]"
+        )
+        lines.append("- Intervalos por porte em `kpi_bootstrap_ic`.")
     lines.append("")
 
     lines.append("## Serie anual consolidada")
@@ -243,6 +259,34 @@ def render_markdown(
             )
     lines.append("")
 
+    lines.append("## Reconciliacao Qualidade Comercial x INDGER")
+    if reconciliacao.empty:
+        lines.append("- Sem anos em comum entre as duas fontes.")
+    else:
+        ambas = reconciliacao[reconciliacao["fonte"] == "ambas"]
+        anos = sorted(reconciliacao["ano"].unique())
+        alertas = reconciliacao.filter(like="alerta_divergencia_").any(axis=1)
+        fora_cobertura = reconciliacao["fonte"].astype("string").str.startswith("fora_cobertura")
+        lines.append(
+            f"- Distribuidoras-ano comparadas ({anos[0]}-{anos[-1]}): {fmt_int(len(ambas))}; "
+            f"so em uma fonte: {fmt_int(int(reconciliacao['alerta_fonte_ausente'].sum()))}; "
+            f"fora da cobertura da outra fonte: {fmt_int(int(fora_cobertura.sum()))}."
+        )
+        for row in match_rate(reconciliacao).itertuples(index=False):
+            lines.append(
+                f"- {row.ano}: pareamento {fmt_pct(row.taxa_pareamento)} "
+                f"({fmt_int(row.ambas)} em ambas, {fmt_int(row.so_anual)} so anual, {fmt_int(row.so_mensal)} so INDGER, "
+                f"{fmt_int(row.fora_cobertura_anual + row.fora_cobertura_mensal)} fora da cobertura)."
+            )
+        lines.append(
+            "- Diferenca relativa mediana (INDGER vs Qualidade): "
+            f"servicos {fmt_pct(ambas['dif_rel_qtd_serv'].median())}, "
+            f"fora do prazo {fmt_pct(ambas['dif_rel_qtd_fora_prazo'].median())}, "
+            f"compensacao {fmt_pct(ambas['dif_rel_compensacao_rs'].median())}."
+        )
+        lines.append(f"- Distribuidoras-ano com divergencia atipica (z robusto): {fmt_int(int(alertas.sum()))}.")
+    lines.append("")
+
     lines.append("## Proximos acompanhamentos")
     lines.append("- Atualizar mensalmente a tabela `fato_transgressao_mensal_porte`.")
     lines.append("- Monitorar anos incompletos (2024-2025) para nao inferir tendencia regulatoria antes da consolidacao.")
@@ -253,7 +297,14 @@ def render_markdown(
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Build ANEEL markdown report")
+    parser.add_argument("--profile", action="store_true", help="dump cProfile stats per stage")
+    args = parser.parse_args()
+
+    configure_run("build_report", profile=args.profile)
     kpi = load_table("kpi_regulatorio_anual")
+    kpi_ic = load_table("kpi_bootstrap_ic")
+    reconciliacao = load_table("reconciliacao_fontes")
     fato_indicadores = load_table("fato_indicadores_anuais")
     fato_mensal_porte = load_table("fato_transgressao_mensal_porte")
     dim_porte = load_table("dim_distribuidora_porte")
@@ -268,7 +319,7 @@ def main() -> None:
     )
 
     pre_post = build_pre_post_summary(fato_indicadores)
-    monthly_summary = build_monthly_summary(fato_mensal_porte)
+    monthly_summary = build_monthly_summary(read_cube_level("nacional_mes"))
 
     coelba = find_agent_name(dim_porte, ["ESTADO DA BAHIA", "COELBA"])
     brasilia = find_agent_name(dim_porte, ["BRASILIA"])
@@ -281,14 +332,17 @@ def main() -> None:
     content = render_markdown(
         kpi,
         pre_post,
+        kpi_ic,
         monthly_summary,
         foco,
+        reconciliacao,
         has_compensation_data,
         data_sources_note,
     )
     REPORT_PATH.write_text(content, encoding="utf-8")
 
     print(f"Report generated: {REPORT_PATH}")
+    print(f"Run report: {write_run_report()}")
 
 
 if __name__ == "__main__":
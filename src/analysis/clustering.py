@@ -0,0 +1,191 @@
+"""K-means clusters of distributor-years over the feature store.
+
+Features are standardized (z-score per column, constant columns dropped,
+missing values at the column mean, i.e. 0). Every k in K_CLUSTERS is fitted
+and scored by the silhouette; the k with the best silhouette labels the rows.
+Clusters are renumbered by size (0 = largest) so labels are stable between
+runs with the same data.
+
+scikit-learn's MiniBatchKMeans and silhouette_score are used when installed;
+otherwise the same sweep runs on a NumPy k-means (k-means++ start, Lloyd
+iterations, CLUSTER_INICIOS restarts) and a NumPy silhouette. The
+`algoritmo` column records which one ran.
+
+Usage:
+    python -m src.analysis.clustering --k-min 2 --k-max 10
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.feature_store import FEATURE_DIR, open_feature_store
+from src.etl.instrumentation import instrumented
+
+try:
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.metrics import silhouette_score
+except ImportError:  # optional dependency
+    MiniBatchKMeans = None
+    silhouette_score = None
+
+K_CLUSTERS = range(2, 9)
+CLUSTER_SEED = 20221000
+CLUSTER_INICIOS = 5
+CLUSTER_MAX_ITER = 100
+SILHUETA_AMOSTRA = 5000
+CLUSTER_COLUNAS = ["sigagente", "nomagente", "ano", "cluster", "n_clusters", "distancia_centro", "algoritmo"]
+
+
+def standardize(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """z-scores with NaN -> 0, and the mask of the columns kept (non-constant, not all NaN)."""
+    x = np.asarray(values, dtype="float64")
+    valid = ~np.isnan(x)
+    count = valid.sum(axis=0)
+    mean = np.where(valid, x, 0.0).sum(axis=0) / np.maximum(count, 1)
+    dev = np.where(valid, x - mean, 0.0)
+    std = np.sqrt((dev**2).sum(axis=0) / np.maximum(count - 1, 1))
+    keep = (count > 1) & (std > 0)
+    z = dev[:, keep] / std[keep]
+    return z, keep
+
+
+def _sq_distances(x: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    d = (x**2).sum(axis=1)[:, None] - 2.0 * x @ centers.T + (centers**2).sum(axis=1)[None, :]
+    return np.maximum(d, 0.0)
+
+
+def _kmeans_numpy(x: np.ndarray, k: int, rng: np.random.Generator) -> tuple[np.ndarray, float]:
+    """Best of CLUSTER_INICIOS Lloyd runs from k-means++ starts: (labels, inertia)."""
+    best_labels, best_inertia = None, np.inf
+    for _ in range(CLUSTER_INICIOS):
+        centers = x[[rng.integers(len(x))]]
+        for _ in range(1, k):
+            d = _sq_distances(x, centers).min(axis=1)
+            p = d / d.sum() if d.sum() > 0 else np.full(len(x), 1.0 / len(x))
+            centers = np.vstack([centers, x[rng.choice(len(x), p=p)]])
+        labels = np.full(len(x), -1)
+        for _ in range(CLUSTER_MAX_ITER):
+            new_labels = _sq_distances(x, centers).argmin(axis=1)
+            if np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+            count = np.bincount(labels, minlength=k)
+            sums = np.zeros_like(centers)
+            np.add.at(sums, labels, x)
+            centers = np.where(count[:, None] > 0, sums / np.maximum(count, 1)[:, None], centers)
+        inertia = float(_sq_distances(x, centers)[np.arange(len(x)), labels].sum())
+        if inertia < best_inertia:
+            best_labels, best_inertia = labels, inertia
+    return best_labels, best_inertia
+
+
+def _silhouette_numpy(x: np.ndarray, labels: np.ndarray, rng: np.random.Generator) -> float:
+    """Mean silhouette over at most SILHUETA_AMOSTRA rows."""
+    if len(x) > SILHUETA_AMOSTRA:
+        sample = rng.choice(len(x), SILHUETA_AMOSTRA, replace=False)
+        x, labels = x[sample], labels[sample]
+    n_labels = labels.max() + 1
+    if n_labels < 2 or n_labels >= len(x):
+        return np.nan
+    dist = np.sqrt(_sq_distances(x, x))
+    count = np.bincount(labels, minlength=n_labels)
+    sums = np.zeros((len(x), n_labels))
+    np.add.at(sums.T, labels, dist)
+    own = count[labels] - 1
+    a = np.where(own > 0, sums[np.arange(len(x)), labels] / np.maximum(own, 1), 0.0)
+    mean_other = np.where(count[None, :] > 0, sums / np.maximum(count, 1)[None, :], np.inf)
+    mean_other[np.arange(len(x)), labels] = np.inf
+    b = mean_other.min(axis=1)
+    s = np.where(own > 0, (b - a) / np.maximum(np.maximum(a, b), np.finfo("float64").tiny), 0.0)
+    return float(s.mean())
+
+
+def fit_kmeans(x: np.ndarray, k: int, seed: int = CLUSTER_SEED) -> tuple[np.ndarray, float, float]:
+    """(labels, inertia, silhouette) for one k."""
+    rng = np.random.default_rng([seed, k])
+    if MiniBatchKMeans is not None:
+        model = MiniBatchKMeans(n_clusters=k, n_init=CLUSTER_INICIOS, random_state=seed).fit(x)
+        labels, inertia = model.labels_, float(model.inertia_)
+        if len(np.unique(labels)) < 2:
+            return labels, inertia, np.nan
+        silhueta = silhouette_score(x, labels, sample_size=min(len(x), SILHUETA_AMOSTRA), random_state=seed)
+        return labels, inertia, float(silhueta)
+    labels, inertia = _kmeans_numpy(x, k, rng)
+    return labels, inertia, _silhouette_numpy(x, labels, rng)
+
+
+def _by_size(labels: np.ndarray) -> np.ndarray:
+    """Renumber clusters by decreasing size (ties by first label)."""
+    count = np.bincount(labels)
+    order = np.lexsort((np.arange(len(count)), -count))
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[labels]
+
+
+@instrumented()
+def build_clusters_distribuidora(
+    values: np.ndarray,
+    linhas: pd.DataFrame,
+    ks: range | list[int] = K_CLUSTERS,
+    seed: int = CLUSTER_SEED,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """(cluster per distributor-year with the best k, silhouette sweep per k)."""
+    algoritmo = "minibatch_kmeans" if MiniBatchKMeans is not None else "kmeans_numpy"
+    x, _ = standardize(values)
+    ks = [k for k in ks if 2 <= k < len(x)]
+    if not ks or not x.shape[1]:
+        return (
+            pd.DataFrame(columns=CLUSTER_COLUNAS),
+            pd.DataFrame(columns=["n_clusters", "inercia", "silhueta", "escolhido", "algoritmo"]),
+        )
+
+    ajustes = {k: fit_kmeans(x, k, seed) for k in ks}
+    varredura = pd.DataFrame(
+        {
+            "n_clusters": ks,
+            "inercia": [ajustes[k][1] for k in ks],
+            "silhueta": [ajustes[k][2] for k in ks],
+        }
+    )
+    silhueta = varredura["silhueta"].to_numpy(dtype="float64")
+    melhor = ks[int(np.nanargmax(silhueta))] if not np.isnan(silhueta).all() else ks[0]
+    varredura["escolhido"] = varredura["n_clusters"] == melhor
+    varredura["algoritmo"] = algoritmo
+
+    labels = _by_size(ajustes[melhor][0])
+    centers = np.stack([x[labels == c].mean(axis=0) for c in range(labels.max() + 1)])
+    clusters = linhas.reset_index(drop=True).copy()
+    clusters["cluster"] = labels
+    clusters["n_clusters"] = melhor
+    clusters["distancia_centro"] = np.sqrt(((x - centers[labels]) ** 2).sum(axis=1))
+    clusters["algoritmo"] = algoritmo
+    return clusters[CLUSTER_COLUNAS], varredura
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="K-means sweep over the distributor-year feature store")
+    parser.add_argument("--k-min", type=int, default=K_CLUSTERS.start)
+    parser.add_argument("--k-max", type=int, default=K_CLUSTERS.stop - 1)
+    parser.add_argument("--seed", type=int, default=CLUSTER_SEED)
+    parser.add_argument("--features-dir", type=Path, default=FEATURE_DIR)
+    parser.add_argument("--output", type=Path, default=None, help="CSV path for the clusters (default: print the sweep)")
+    args = parser.parse_args()
+
+    values, linhas, _ = open_feature_store(args.features_dir)
+    clusters, varredura = build_clusters_distribuidora(
+        values, linhas, range(args.k_min, args.k_max + 1), seed=args.seed
+    )
+    print(varredura.to_string(index=False))
+    if args.output:
+        clusters.to_csv(args.output, index=False)
+        print(f"Clusters: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
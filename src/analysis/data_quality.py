@@ -0,0 +1,354 @@
+"""National data-quality tables for the monthly distributor fact.
+
+`build_cobertura_mensal` turns `fato_transgressao_mensal_distribuidora` into
+one agent x year x month row-count array (a single bincount), and reads every
+per-(distributor, year) statistic from the 12-bit mask of missing months
+through a 4096-entry lookup, so the cost does not depend on how many
+distributors there are:
+
+    meses_com_dados      months with at least one row
+    meses_faltantes      "3,4,9" (empty when the year is complete)
+    qtd_lacunas          runs of consecutive missing months
+    maior_lacuna_meses   longest run of missing months
+    linhas_duplicadas    rows in (sigagente, ano, mes) cells with more than one row
+
+`build_alertas_comparabilidade` lays the cube level `agente_servico_mes` out
+as distributor x year x (total + service codes) and compares every year with
+the previous one in a few array passes (the national version of the
+Neoenergia volume/69-93 share rule):
+
+    alerta_quebra_volume   |volume change| >= 50% (total or code; codes need at
+                           least MIN_SERVICOS_QUEBRA services in one of the years)
+    alerta_quebra_mix      |change of the code's share of the total| >= 0.3
+    alerta_codigo_novo_extinto
+                           a code with at least MIN_SERVICOS_QUEBRA services
+                           that had none the year before, or the reverse
+
+Alerts are ranked by `score_quebra` (the larger change / threshold ratio).
+A code that appears has no finite volume change (`delta_serv_pct` is NaN),
+so appearing and vanishing codes are scored by their share change only and
+never by volume; the score stays finite and a small new code does not
+outrank a real break of the total.
+`painel_comparavel` marks each (sigagente, ano) as comparable with the year
+before unless its total volume or code mix broke; `apply_painel_comparavel`
+adds the flag to any frame keyed by sigagente and ano.
+
+`build_reconciliacao_fontes` aligns `fato_indicadores_anuais` (qualidade
+comercial) and `fato_transgressao_mensal_distribuidora` (INDGER) per
+canonical agent key (`agentes.agent_key`: no accents, case or punctuation,
+renamed distributors mapped through AGENTE_ALIASES) and overlapping year
+with one hash join of the two grouped indexes, and reports the absolute and
+relative (vs annual) gaps of services, violations and compensation. A gap is
+flagged when the robust z of log(mensal / anual) over all agent-years
+reaches the anomaly detector's LIMITE_Z. Agent-years present in only one
+source get `alerta_fonte_ausente`, except in years the other source barely
+covers (fewer than MIN_COBERTURA_FONTE of this source's agents, e.g. the
+annual fact after 2023), which get `fonte = "fora_cobertura_anual"` (or
+`"fora_cobertura_mensal"`) instead. `match_rate` counts the agent-years per
+`fonte` and year and the share matched in both sources.
+"""
+
+from __future__ import annotations
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.agentes import agent_key
+from src.analysis.anomalies import LIMITE_Z, MAD_ESCALA
+from src.analysis.service_codes import code_array
+from src.etl.instrumentation import instrumented
+
+MESES = 12
+COBERTURA_COLUNAS = [
+    "sigagente",
+    "nomagente",
+    "ano",
+    "meses_com_dados",
+    "meses_faltantes",
+    "qtd_lacunas",
+    "maior_lacuna_meses",
+    "linhas_duplicadas",
+]
+
+CODIGO_TOTAL = "total"
+LIMITE_QUEBRA_VOLUME = 0.5
+LIMITE_QUEBRA_MIX = 0.3
+MIN_SERVICOS_QUEBRA = 30
+# Annual (qualidade comercial) column -> monthly (INDGER) column.
+RECONCILIACAO_MEDIDAS = {
+    "qtd_serv": "qtd_serv_realizado",
+    "qtd_fora_prazo": "qtd_fora_prazo",
+    "compensacao_rs": "compensacao_rs",
+}
+# A source covers a year when it has at least this share of the other's agents.
+MIN_COBERTURA_FONTE = 0.5
+FONTES_RECONCILIACAO = ["ambas", "so_anual", "so_mensal", "fora_cobertura_anual", "fora_cobertura_mensal"]
+
+
+def _mask_tables() -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Missing-month text, gap count and longest gap for every 12-bit mask."""
+    textos, lacunas, maiores = [], [], []
+    for mask in range(1 << MESES):
+        faltantes = [mes for mes in range(1, MESES + 1) if mask >> (mes - 1) & 1]
+        runs = []
+        for mes in faltantes:
+            if runs and runs[-1][1] == mes - 1:
+                runs[-1][1] = mes
+            else:
+                runs.append([mes, mes])
+        textos.append(",".join(str(mes) for mes in faltantes))
+        lacunas.append(len(runs))
+        maiores.append(max((fim - inicio + 1 for inicio, fim in runs), default=0))
+    return np.array(textos, dtype=object), np.array(lacunas), np.array(maiores)
+
+
+FALTANTES_TEXTO, QTD_LACUNAS, MAIOR_LACUNA = _mask_tables()
+
+
+@instrumented()
+def build_cobertura_mensal(
+    fato_transgressao_mensal_distribuidora: pd.DataFrame,
+    chave: str = "sigagente",
+) -> pd.DataFrame:
+    """Coverage of every (chave, ano) that has at least one monthly row.
+
+    `chave` is the distributor column: rows of different names mapped to the
+    same key (e.g. `neo_distribuidora` over the Neoenergia aliases) count as
+    one distributor, so a month reported under two names is a duplicate.
+    """
+    frame = fato_transgressao_mensal_distribuidora.dropna(subset=[chave, "ano", "mes"])
+    agente, agentes = pd.factorize(frame[chave], sort=True)
+    ano, anos = pd.factorize(frame["ano"].astype("int64"), sort=True)
+    mes = frame["mes"].to_numpy(dtype="int64") - 1
+
+    shape = (len(agentes), len(anos), MESES)
+    linhas = np.bincount(np.ravel_multi_index((agente, ano, mes), shape), minlength=int(np.prod(shape)))
+    linhas = linhas.reshape(shape)
+    presente = linhas > 0
+
+    pesos = 1 << np.arange(MESES)
+    mascara = (~presente * pesos).sum(axis=2)
+    com_dados = presente.sum(axis=2)
+    duplicadas = np.where(linhas > 1, linhas, 0).sum(axis=2)
+
+    agente_pos, ano_pos = np.nonzero(com_dados)
+    mascara = mascara[agente_pos, ano_pos]
+    cobertura = pd.DataFrame(
+        {
+            chave: agentes.take(agente_pos),
+            "ano": anos.take(ano_pos),
+            "meses_com_dados": com_dados[agente_pos, ano_pos],
+            "meses_faltantes": FALTANTES_TEXTO[mascara],
+            "qtd_lacunas": QTD_LACUNAS[mascara],
+            "maior_lacuna_meses": MAIOR_LACUNA[mascara],
+            "linhas_duplicadas": duplicadas[agente_pos, ano_pos],
+        }
+    )
+    if chave != "sigagente":
+        return cobertura.sort_values([chave, "ano"]).reset_index(drop=True)
+    nomes = frame.drop_duplicates("sigagente").set_index("sigagente")["nomagente"]
+    cobertura["nomagente"] = cobertura["sigagente"].map(nomes)
+    return cobertura[COBERTURA_COLUNAS].sort_values(["sigagente", "ano"]).reset_index(drop=True)
+
+
+@instrumented()
+def build_alertas_comparabilidade(agente_servico_mes: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Ranked year-over-year break alerts and the (sigagente, ano) comparable-panel mask."""
+    values, present, entities, codigos = code_array(agente_servico_mes, ["sigagente", "ano"], ["qtd_serv_realizado"])
+    agente, agentes = pd.factorize(entities["sigagente"], sort=True)
+    ano, anos = pd.factorize(entities["ano"].astype("int64"), sort=True)
+    n_agentes, n_anos, n_codigos = len(agentes), len(anos), len(codigos)
+
+    # Column 0 is the distributor total, the others one service code each.
+    volume = np.zeros((n_agentes, n_anos, n_codigos + 1))
+    volume[agente, ano, 1:] = values[..., 0]
+    volume[..., 0] = volume[..., 1:].sum(axis=-1)
+    observado = np.zeros((n_agentes, n_anos, n_codigos + 1), dtype=bool)
+    observado[agente, ano, 1:] = present
+    observado[..., 0] = observado[..., 1:].any(axis=-1)
+    total = volume[..., :1]
+    share = np.divide(volume, total, out=np.full(volume.shape, np.nan), where=total > 0)
+
+    # Consecutive calendar years, both with data for the distributor.
+    consecutivo = np.diff(np.asarray(anos)) == 1
+    comparavel = consecutivo[None, :] & observado[:, 1:, 0] & observado[:, :-1, 0]
+    atual, anterior = volume[:, 1:], volume[:, :-1]
+    delta_pct = np.divide(atual, anterior, out=np.full(atual.shape, np.nan), where=anterior > 0) - 1
+    delta_share = share[:, 1:] - share[:, :-1]
+    linha = comparavel[..., None] & (observado[:, 1:] | observado[:, :-1])
+
+    relevante = np.maximum(atual, anterior) >= MIN_SERVICOS_QUEBRA
+    # Codes going 0 -> n or n -> 0: flagged apart, scored by the share change only.
+    novo_extinto = linha & relevante & ((anterior == 0) != (atual == 0))
+    novo_extinto[..., 0] = False
+    quebra_volume = linha & relevante & ~novo_extinto & (np.abs(np.nan_to_num(delta_pct)) >= LIMITE_QUEBRA_VOLUME)
+    mudanca_share = np.abs(np.nan_to_num(delta_share))
+    quebra_mix = linha & (mudanca_share >= LIMITE_QUEBRA_MIX)
+    quebra_mix[..., 0] = False
+    score = np.maximum(
+        np.where(quebra_volume, np.abs(np.nan_to_num(delta_pct)) / LIMITE_QUEBRA_VOLUME, 0.0),
+        np.where(quebra_mix | novo_extinto, mudanca_share / LIMITE_QUEBRA_MIX, 0.0),
+    )
+    alerta = quebra_volume | quebra_mix | novo_extinto
+
+    a_pos, y_pos, c_pos = np.nonzero(alerta)
+    rotulos = np.asarray([CODIGO_TOTAL, *codigos], dtype=object)
+    alertas = pd.DataFrame(
+        {
+            "sigagente": agentes.take(a_pos),
+            "ano": anos.take(y_pos + 1),
+            "codtiposervico": rotulos[c_pos],
+            "qtd_serv_realizado": atual[a_pos, y_pos, c_pos],
+            "qtd_serv_anterior": anterior[a_pos, y_pos, c_pos],
+            "delta_serv_pct": delta_pct[a_pos, y_pos, c_pos],
+            "share_serv": share[a_pos, y_pos + 1, c_pos],
+            "share_serv_anterior": share[a_pos, y_pos, c_pos],
+            "delta_share_abs": delta_share[a_pos, y_pos, c_pos],
+            "alerta_quebra_volume": quebra_volume[a_pos, y_pos, c_pos],
+            "alerta_quebra_mix": quebra_mix[a_pos, y_pos, c_pos],
+            "alerta_codigo_novo_extinto": novo_extinto[a_pos, y_pos, c_pos],
+            "score_quebra": score[a_pos, y_pos, c_pos],
+        }
+    )
+    alertas = alertas.sort_values(
+        ["score_quebra", "qtd_serv_realizado", "sigagente", "ano", "codtiposervico"],
+        ascending=[False, False, True, True, True],
+    ).reset_index(drop=True)
+    alertas.insert(0, "rank_alerta", np.arange(1, len(alertas) + 1))
+
+    # Comparable unless the total volume or the code mix broke vs the previous year.
+    quebra_painel = quebra_volume[..., 0] | quebra_mix.any(axis=-1)
+    painel_a, painel_y = np.nonzero(observado[..., 0])
+    quebra_ano = np.zeros((n_agentes, n_anos), dtype=bool)
+    quebra_ano[:, 1:] = quebra_painel
+    qtd = np.zeros((n_agentes, n_anos), dtype="int64")
+    qtd[:, 1:] = alerta.sum(axis=-1)
+    painel = pd.DataFrame(
+        {
+            "sigagente": agentes.take(painel_a),
+            "ano": anos.take(painel_y),
+            "painel_comparavel": ~quebra_ano[painel_a, painel_y],
+            "qtd_alertas": qtd[painel_a, painel_y],
+        }
+    )
+
+    nomes = agente_servico_mes.drop_duplicates("sigagente").set_index("sigagente")["nomagente"]
+    for frame in (alertas, painel):
+        frame.insert(frame.columns.get_loc("sigagente") + 1, "nomagente", frame["sigagente"].map(nomes))
+    return alertas, painel
+
+
+def apply_painel_comparavel(
+    frame: pd.DataFrame,
+    painel: pd.DataFrame,
+    keep_only: bool = False,
+) -> pd.DataFrame:
+    """`frame` with the painel_comparavel flag of its (sigagente, ano); optionally only comparable rows.
+
+    Distributor-years absent from the panel count as comparable.
+    """
+    index = pd.MultiIndex.from_frame(painel[["sigagente", "ano"]].astype({"ano": "int64"}))
+    keys = pd.MultiIndex.from_frame(frame[["sigagente", "ano"]].astype({"ano": "int64"}))
+    pos = index.get_indexer(keys)
+    flag = painel["painel_comparavel"].to_numpy(dtype=bool)
+    out = frame.copy()
+    out["painel_comparavel"] = np.where(pos >= 0, flag[np.maximum(pos, 0)], True)
+    return out[out["painel_comparavel"]].copy() if keep_only else out
+
+
+def _source_totals(frame: pd.DataFrame, measures: list[str]) -> pd.DataFrame:
+    keyed = frame.assign(chave_agente=agent_key(frame["sigagente"]), ano=frame["ano"].astype("int64"))
+    keyed = keyed.dropna(subset=["chave_agente"])
+    aggregations = {measure: (measure, "sum") for measure in measures}
+    aggregations["sigagente"] = ("sigagente", "first")
+    if "mes" in keyed.columns:
+        aggregations["meses"] = ("mes", "nunique")
+    return keyed.groupby(["chave_agente", "ano"], sort=False).agg(**aggregations)
+
+
+@instrumented()
+def build_reconciliacao_fontes(
+    fato_indicadores: pd.DataFrame,
+    fato_transgressao_mensal_distribuidora: pd.DataFrame,
+) -> pd.DataFrame:
+    """Annual (qualidade comercial) vs monthly (INDGER) totals per agent key and overlapping year."""
+    anual = _source_totals(fato_indicadores, list(RECONCILIACAO_MEDIDAS))
+    mensal = _source_totals(
+        fato_transgressao_mensal_distribuidora.rename(columns={v: k for k, v in RECONCILIACAO_MEDIDAS.items()}),
+        list(RECONCILIACAO_MEDIDAS),
+    )
+    anos = np.intersect1d(anual.index.get_level_values("ano"), mensal.index.get_level_values("ano"))
+    anual = anual[anual.index.get_level_values("ano").isin(anos)]
+    mensal = mensal[mensal.index.get_level_values("ano").isin(anos)]
+
+    chaves = anual.index.union(mensal.index).sort_values()
+    pos_anual = anual.index.get_indexer(chaves)
+    pos_mensal = mensal.index.get_indexer(chaves)
+    tem_anual, tem_mensal = pos_anual >= 0, pos_mensal >= 0
+    # Years one source barely covers (the annual fact after 2023) are not absences.
+    ano_pos = np.searchsorted(anos, chaves.get_level_values("ano"))
+    n_anual = np.bincount(ano_pos, weights=tem_anual, minlength=len(anos))
+    n_mensal = np.bincount(ano_pos, weights=tem_mensal, minlength=len(anos))
+    sem_anual = ~tem_anual & (n_anual < MIN_COBERTURA_FONTE * n_mensal)[ano_pos]
+    sem_mensal = ~tem_mensal & (n_mensal < MIN_COBERTURA_FONTE * n_anual)[ano_pos]
+
+    medidas = list(RECONCILIACAO_MEDIDAS)
+    valores_anual = anual[medidas].to_numpy(dtype="float64", na_value=np.nan)[np.maximum(pos_anual, 0)]
+    valores_mensal = mensal[medidas].to_numpy(dtype="float64", na_value=np.nan)[np.maximum(pos_mensal, 0)]
+    valores_anual[~tem_anual] = np.nan
+    valores_mensal[~tem_mensal] = np.nan
+
+    dif_abs = valores_mensal - valores_anual
+    dif_rel = np.full(dif_abs.shape, np.nan)
+    np.divide(dif_abs, valores_anual, out=dif_rel, where=valores_anual > 0)
+    # Robust z of log(mensal / anual) per measure over every aligned agent-year.
+    razao = np.full(dif_abs.shape, np.nan)
+    positivo = (valores_anual > 0) & (valores_mensal > 0)
+    np.log(valores_mensal, out=razao, where=positivo)
+    razao[positivo] -= np.log(valores_anual[positivo])
+    with warnings.catch_warnings():
+        # Measures without any positive pair have an all-NaN column.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mediana = np.nanmedian(razao, axis=0)
+        mad = np.nanmedian(np.abs(razao - mediana), axis=0)
+    escala = np.where(mad > 0, MAD_ESCALA * mad, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (razao - mediana) / escala
+        divergente = np.abs(z) >= LIMITE_Z
+
+    out = pd.DataFrame(
+        {
+            "chave_agente": chaves.get_level_values("chave_agente"),
+            "ano": chaves.get_level_values("ano"),
+            "sigagente_anual": anual["sigagente"].to_numpy(dtype=object)[np.maximum(pos_anual, 0)],
+            "sigagente_mensal": mensal["sigagente"].to_numpy(dtype=object)[np.maximum(pos_mensal, 0)],
+            "meses_mensal": np.where(tem_mensal, mensal["meses"].to_numpy()[np.maximum(pos_mensal, 0)], 0),
+            "fonte": np.select(
+                [tem_anual & tem_mensal, sem_anual, sem_mensal, tem_anual],
+                ["ambas", "fora_cobertura_anual", "fora_cobertura_mensal", "so_anual"],
+                "so_mensal",
+            ),
+        }
+    )
+    out.loc[~tem_anual, "sigagente_anual"] = None
+    out.loc[~tem_mensal, "sigagente_mensal"] = None
+    for k, medida in enumerate(medidas):
+        out[f"{medida}_anual"] = valores_anual[:, k]
+        out[f"{medida}_mensal"] = valores_mensal[:, k]
+        out[f"dif_abs_{medida}"] = dif_abs[:, k]
+        out[f"dif_rel_{medida}"] = dif_rel[:, k]
+        out[f"z_{medida}"] = z[:, k]
+        out[f"alerta_divergencia_{medida}"] = divergente[:, k]
+    out["alerta_fonte_ausente"] = ~(tem_anual & tem_mensal) & ~sem_anual & ~sem_mensal
+    return out
+
+
+def match_rate(reconciliacao: pd.DataFrame) -> pd.DataFrame:
+    """Agent-years per `fonte` and the share matched in both sources, per year (coverage gaps left out)."""
+    contagem = pd.crosstab(reconciliacao["ano"], reconciliacao["fonte"])
+    contagem = contagem.reindex(columns=FONTES_RECONCILIACAO, fill_value=0)
+    pareaveis = contagem[["ambas", "so_anual", "so_mensal"]].sum(axis=1)
+    contagem["taxa_pareamento"] = contagem["ambas"] / pareaveis.replace(0, np.nan)
+    return contagem.rename_axis(columns=None).reset_index()
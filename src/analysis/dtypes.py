@@ -0,0 +1,135 @@
+"""Compact dtype policy for analysis tables.
+
+Applied by `save_table` before writing and by the loaders after reading
+(Parquet or CSV), so every consumer sees the same dtypes:
+
+    enumerations (periodo_regulatorio, bucket_porte, classe_local...)  category
+    ano, mes                                           int16 (Int16 with nulls)
+    counts (qtd_*, uc_ativa_mes, rank_porte_ano)       int32 when integral and in range
+    flags (has_*, alerta_*, ano_comparavel_*)          bool (boolean with nulls)
+    derived ratios (taxa_*, share_*, *_por_*)          float32, opt-in only
+
+float32 ratios are enabled with `float32_ratios=True` or the
+`ANEEL_FLOAT32_RATIOS=1` environment variable; measures such as
+`compensacao_rs` always stay float64.
+"""
+
+from __future__ import annotations
+
+import os
+
+import numpy as np
+import pandas as pd
+
+FLOAT32_ENV_VAR = "ANEEL_FLOAT32_RATIOS"
+
+CATEGORY_COLUMNS = {
+    "periodo_regulatorio",
+    "bucket_porte",
+    "bucket_porte_decil",
+    "bucket_porte_faixa_uc",
+    "bucket_porte_jenks",
+    "classe_local",
+    "classe_local_servico",
+    "familia_indicador",
+    "escopo_servico",
+    "servico_nome",
+}
+CALENDAR_COLUMNS = {"ano", "mes"}
+COUNT_COLUMNS = {
+    "qtd_serv",
+    "qtd_fora_prazo",
+    "qtd_serv_realizado",
+    "uc_ativa_mes",
+    "rank_porte_ano",
+    "meses_com_dados",
+    "qtd_lacunas",
+    "maior_lacuna_meses",
+    "linhas_duplicadas",
+    "qtd_serv_anterior",
+    "qtd_alertas",
+    "rank_alerta",
+    "n_obs",
+    "n_unidades",
+    "n_clusters",
+    "n_distribuidoras",
+    "horizonte",
+    "n_backtest",
+    "cluster",
+    "n_pares_fora_prazo_por_100k_uc_mes",
+    "n_pares_compensacao_rs_por_uc_mes",
+}
+FLAG_PREFIXES = ("has_", "alerta_", "ano_comparavel")
+RATIO_PREFIXES = ("taxa_", "share_")
+RATIO_MARKERS = ("_por_",)
+
+_TRUE_TEXT = {"true", "1"}
+_FALSE_TEXT = {"false", "0"}
+
+
+def float32_ratios_enabled(float32_ratios: bool | None = None) -> bool:
+    if float32_ratios is not None:
+        return float32_ratios
+    return os.environ.get(FLOAT32_ENV_VAR, "").strip().lower() in {"1", "true", "yes"}
+
+
+def is_ratio_column(name: str) -> bool:
+    return name.startswith(RATIO_PREFIXES) or any(marker in name for marker in RATIO_MARKERS)
+
+
+def is_flag_column(name: str) -> bool:
+    return name.startswith(FLAG_PREFIXES)
+
+
+def _as_flag(series: pd.Series) -> pd.Series:
+    if series.dtype == bool:
+        return series
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        values = series
+    else:
+        # CSV round-trip: "True"/"False" strings.
+        text = series.astype("string").str.strip().str.lower()
+        if not text.dropna().isin(_TRUE_TEXT | _FALSE_TEXT).all():
+            return series
+        values = text.map(lambda v: v in _TRUE_TEXT, na_action="ignore")
+    flags = values.astype("boolean")
+    return flags if flags.hasnans else flags.astype(bool)
+
+
+def _as_small_int(series: pd.Series, dtype: str) -> pd.Series:
+    if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return series
+    values = series.to_numpy(dtype="float64", na_value=np.nan)
+    present = values[~np.isnan(values)]
+    info = np.iinfo(dtype)
+    if present.size and (
+        not np.array_equal(present, np.round(present)) or present.min() < info.min or present.max() > info.max
+    ):
+        return series
+    if np.isnan(values).any():
+        return series.astype(dtype.capitalize())
+    return series.astype(dtype)
+
+
+def apply_dtype_policy(frame: pd.DataFrame, float32_ratios: bool | None = None) -> pd.DataFrame:
+    """Return `frame` with the compact dtypes; values are unchanged (ratios within float32)."""
+    use_float32 = float32_ratios_enabled(float32_ratios)
+    out = frame.copy(deep=False)
+    for name in out.columns:
+        series = out[name]
+        if name in CATEGORY_COLUMNS:
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                out[name] = series.astype("category")
+        elif name in CALENDAR_COLUMNS:
+            out[name] = _as_small_int(series, "int16")
+        elif name in COUNT_COLUMNS:
+            out[name] = _as_small_int(series, "int32")
+        elif is_flag_column(name):
+            out[name] = _as_flag(series)
+        elif use_float32 and is_ratio_column(name) and pd.api.types.is_float_dtype(series):
+            out[name] = series.astype("float32" if isinstance(series.dtype, np.dtype) else "Float32")
+    return out
+
+
+def memory_mb(frame: pd.DataFrame) -> float:
+    return frame.memory_usage(deep=True, index=False).sum() / 1024 / 1024
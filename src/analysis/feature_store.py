@@ -0,0 +1,273 @@
+"""Per distributor-year feature matrix, stored compactly and updated by year.
+
+One row per (sigagente, ano) of the monthly facts, one float32 column per
+feature:
+
+    log_uc_ativa_media                     size (log10 of the mean active UCs)
+    qtd_serv_por_uc_mes                    services per UC-month
+    taxa_fora_prazo, fora_prazo_por_100k_uc_mes,
+    compensacao_rs_por_uc_mes,
+    compensacao_media_por_transgressao_rs  rates and compensation intensity
+    share_classe_<classe>                  share of the services per class
+    share_codigo_<codigo>                  share of the services per code
+    delta_taxa_fora_prazo,
+    delta_compensacao_rs_por_uc_mes,
+    delta_log_qtd_serv                     change vs the distributor's previous year
+
+Layout (same convention as the distributor tensor):
+
+    features_distribuidora_ano/valores.npy        float32 (rows, features)
+    features_distribuidora_ano/linhas.csv         posicao, sigagente, nomagente, ano
+    features_distribuidora_ano/features.csv       posicao, feature
+    features_distribuidora_ano/fingerprints.json  version, fingerprint per year
+
+A year's rows depend only on the source rows of that year and of the year
+before (deltas), so `update_feature_store` hashes those slices and recomputes
+only the years whose fingerprint changed; appending a year computes that
+year's rows alone. Share columns missing from a year mean no services of that
+class/code and are filled with 0 when years with different mixes are merged.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.metrics import add_metrics, ratio
+from src.analysis.tensor_store import write_index
+from src.etl.instrumentation import instrumented
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+DIR_ANALYSIS = ROOT / "data" / "processed" / "analysis"
+FEATURE_DIR = DIR_ANALYSIS / "features_distribuidora_ano"
+FEATURE_FILES = ("valores.npy", "linhas.csv", "features.csv")
+FEATURE_VERSION = 1
+
+FEATURE_KEYS = ["sigagente", "ano"]
+FEATURE_RATES = [
+    "taxa_fora_prazo",
+    "fora_prazo_por_100k_uc_mes",
+    "compensacao_rs_por_uc_mes",
+    "compensacao_media_por_transgressao_rs",
+]
+FEATURE_DELTAS = ["taxa_fora_prazo", "compensacao_rs_por_uc_mes", "log_qtd_serv"]
+FEATURE_BASE = ["log_uc_ativa_media", "qtd_serv_por_uc_mes", *FEATURE_RATES]
+SHARE_PREFIXES = ("share_classe_", "share_codigo_")
+
+PORTE_COLUNAS = [
+    "sigagente",
+    "nomagente",
+    "ano",
+    "mes",
+    "classe_local_servico",
+    "qtd_serv_realizado",
+    "qtd_fora_prazo",
+    "compensacao_rs",
+    "uc_ativa_mes",
+]
+MIX_COLUNAS = ["sigagente", "ano", "codtiposervico", "share_qtd_serv_realizado"]
+
+
+def _slice_hashes(frame: pd.DataFrame) -> dict[int, str]:
+    """Order-independent hash of the rows of each year."""
+    row_hash = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    hashes: dict[int, str] = {}
+    for ano, pos in frame.groupby("ano", sort=True).indices.items():
+        total = int(row_hash[pos].sum(dtype="uint64"))
+        hashes[int(ano)] = f"{len(pos)}:{total:016x}"
+    return hashes
+
+
+def year_fingerprints(
+    fato_transgressao_mensal_porte: pd.DataFrame,
+    servicos_mix_codigos: pd.DataFrame,
+) -> dict[int, str]:
+    """Fingerprint per year over the source rows of the year and of the year before."""
+    porte = _slice_hashes(fato_transgressao_mensal_porte[PORTE_COLUNAS])
+    mix = _slice_hashes(servicos_mix_codigos[MIX_COLUNAS])
+    fingerprints = {}
+    for ano in sorted(porte):
+        partes = [str(FEATURE_VERSION)]
+        partes += [porte.get(ano - 1, "-"), mix.get(ano - 1, "-"), porte[ano], mix.get(ano, "-")]
+        fingerprints[ano] = hashlib.sha1("|".join(partes).encode()).hexdigest()
+    return fingerprints
+
+
+def _annual_totals(porte: pd.DataFrame) -> pd.DataFrame:
+    # uc_ativa_mes repeats on every class row of a month: max per month, then sum/mean per year.
+    mensal = porte.groupby([*FEATURE_KEYS, "mes"], as_index=False, observed=True).agg(
+        nomagente=("nomagente", "first"),
+        qtd_serv_realizado=("qtd_serv_realizado", "sum"),
+        qtd_fora_prazo=("qtd_fora_prazo", "sum"),
+        compensacao_rs=("compensacao_rs", "sum"),
+        uc_ativa_mes=("uc_ativa_mes", "max"),
+    )
+    anual = mensal.groupby(FEATURE_KEYS, as_index=False).agg(
+        nomagente=("nomagente", "first"),
+        qtd_serv_realizado=("qtd_serv_realizado", "sum"),
+        qtd_fora_prazo=("qtd_fora_prazo", "sum"),
+        compensacao_rs=("compensacao_rs", "sum"),
+        exposicao_uc_mes=("uc_ativa_mes", "sum"),
+        uc_ativa_media_mensal=("uc_ativa_mes", "mean"),
+    )
+    add_metrics(anual, FEATURE_RATES)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        anual["log_uc_ativa_media"] = np.log10(anual["uc_ativa_media_mensal"].where(lambda s: s > 0))
+        anual["log_qtd_serv"] = np.log10(anual["qtd_serv_realizado"].where(lambda s: s > 0).astype("float64"))
+    anual["qtd_serv_por_uc_mes"] = ratio(anual["qtd_serv_realizado"], anual["exposicao_uc_mes"])
+    return anual
+
+
+def _shares(frame: pd.DataFrame, column: str, values: str, prefix: str) -> pd.DataFrame:
+    wide = frame.pivot_table(index=FEATURE_KEYS, columns=column, values=values, aggfunc="sum", observed=True)
+    wide = wide.fillna(0.0)
+    wide.columns = [f"{prefix}{str(name).strip()}" for name in wide.columns]
+    return wide.reset_index()
+
+
+@instrumented()
+def compute_features(
+    fato_transgressao_mensal_porte: pd.DataFrame,
+    servicos_mix_codigos: pd.DataFrame,
+    anos: list[int] | None = None,
+) -> tuple[np.ndarray, pd.DataFrame, list[str]]:
+    """(float32 values, linhas, features) for the rows of `anos` (default: every year)."""
+    porte = fato_transgressao_mensal_porte[PORTE_COLUNAS].dropna(subset=[*FEATURE_KEYS, "mes"])
+    porte = porte.astype({"ano": "int64", "sigagente": "string"})
+    mix = servicos_mix_codigos[MIX_COLUNAS].dropna(subset=FEATURE_KEYS)
+    mix = mix.astype({"ano": "int64", "sigagente": "string"})
+    if anos is not None:
+        usados = set(anos) | {ano - 1 for ano in anos}
+        porte = porte[porte["ano"].isin(usados)]
+        mix = mix[mix["ano"].isin(usados)]
+
+    anual = _annual_totals(porte)
+    classe = porte.assign(classe_local_servico=porte["classe_local_servico"].astype("string"))
+    anual = anual.merge(
+        _shares(classe, "classe_local_servico", "qtd_serv_realizado", "share_classe_"),
+        on=FEATURE_KEYS,
+        how="left",
+    )
+    classe_cols = [column for column in anual.columns if column.startswith("share_classe_")]
+    servicos = anual["qtd_serv_realizado"].to_numpy(dtype="float64")[:, None]
+    shares = np.full((len(anual), len(classe_cols)), np.nan)
+    np.divide(anual[classe_cols].to_numpy(dtype="float64"), servicos, out=shares, where=servicos > 0)
+    anual[classe_cols] = shares
+    codigo = _shares(mix, "codtiposervico", "share_qtd_serv_realizado", "share_codigo_")
+    anual = anual.merge(codigo, on=FEATURE_KEYS, how="left")
+    codigo_cols = [column for column in codigo.columns if column.startswith("share_codigo_")]
+
+    anterior = anual[[*FEATURE_KEYS, *FEATURE_DELTAS]].assign(ano=anual["ano"] + 1)
+    anual = anual.merge(anterior, on=FEATURE_KEYS, how="left", suffixes=("", "_anterior"))
+    for base in FEATURE_DELTAS:
+        anual[f"delta_{base}"] = anual[base] - anual[f"{base}_anterior"]
+
+    if anos is not None:
+        anual = anual[anual["ano"].isin(anos)]
+    anual = anual.sort_values(FEATURE_KEYS).reset_index(drop=True)
+    features = [
+        *FEATURE_BASE,
+        *sorted(classe_cols),
+        *sorted(codigo_cols),
+        *(f"delta_{base}" for base in FEATURE_DELTAS),
+    ]
+    values = anual[features].to_numpy(dtype="float32", na_value=np.nan)
+    linhas = anual[["sigagente", "nomagente", "ano"]].astype({"nomagente": "string"})
+    return values, linhas, features
+
+
+def _align(values: np.ndarray, features: list[str], todas: list[str]) -> np.ndarray:
+    """Columns of `values` reordered to `todas`; absent shares are 0, other absent features NaN."""
+    out = np.full((len(values), len(todas)), np.nan, dtype="float32")
+    pos = {name: i for i, name in enumerate(features)}
+    for j, name in enumerate(todas):
+        if name in pos:
+            out[:, j] = values[:, pos[name]]
+        elif name.startswith(SHARE_PREFIXES):
+            out[:, j] = 0.0
+    return out
+
+
+def write_feature_store(
+    values: np.ndarray,
+    linhas: pd.DataFrame,
+    features: list[str],
+    fingerprints: dict[int, str],
+    directory: Path = FEATURE_DIR,
+) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    np.save(directory / "valores.npy", np.ascontiguousarray(values, dtype="float32"))
+    write_index(linhas, directory / "linhas.csv")
+    write_index(pd.DataFrame({"feature": features}), directory / "features.csv")
+    payload = {"version": FEATURE_VERSION, "anos": {str(ano): value for ano, value in fingerprints.items()}}
+    (directory / "fingerprints.json").write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    return directory
+
+
+def open_feature_store(directory: Path = FEATURE_DIR) -> tuple[np.ndarray, pd.DataFrame, list[str]]:
+    """(values, linhas, features) as written by `write_feature_store`."""
+    missing = [name for name in FEATURE_FILES if not (directory / name).exists()]
+    if missing:
+        raise FileNotFoundError(f"Missing feature store files in {directory}: {', '.join(missing)}")
+    values = np.load(directory / "valores.npy")
+    linhas = pd.read_csv(directory / "linhas.csv", dtype={"sigagente": "string", "nomagente": "string"})
+    features = pd.read_csv(directory / "features.csv")["feature"].tolist()
+    if values.shape != (len(linhas), len(features)):
+        raise ValueError(
+            f"Feature store shape {values.shape} does not match index files "
+            f"({len(linhas)} rows, {len(features)} features)"
+        )
+    return values, linhas.drop(columns="posicao"), features
+
+
+def _cached_fingerprints(directory: Path) -> dict[int, str]:
+    try:
+        payload = json.loads((directory / "fingerprints.json").read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+    if payload.get("version") != FEATURE_VERSION:
+        return {}
+    return {int(ano): value for ano, value in payload.get("anos", {}).items()}
+
+
+@instrumented()
+def update_feature_store(
+    fato_transgressao_mensal_porte: pd.DataFrame,
+    servicos_mix_codigos: pd.DataFrame,
+    directory: Path = FEATURE_DIR,
+    rebuild: bool = False,
+) -> tuple[np.ndarray, pd.DataFrame, list[str], list[int]]:
+    """Recompute the stale years, write the store and return it with the recomputed years."""
+    fingerprints = year_fingerprints(fato_transgressao_mensal_porte, servicos_mix_codigos)
+    cached = {} if rebuild else _cached_fingerprints(directory)
+    stale = [ano for ano, value in fingerprints.items() if cached.get(ano) != value]
+    reused = [ano for ano in fingerprints if ano not in stale]
+
+    partes: list[tuple[np.ndarray, pd.DataFrame, list[str]]] = []
+    if reused:
+        try:
+            old_values, old_linhas, old_features = open_feature_store(directory)
+        except (FileNotFoundError, ValueError):
+            stale, reused = sorted(fingerprints), []
+        else:
+            keep = old_linhas["ano"].isin(reused).to_numpy()
+            partes.append((old_values[keep], old_linhas[keep], old_features))
+    if stale:
+        partes.append(compute_features(fato_transgressao_mensal_porte, servicos_mix_codigos, stale))
+
+    todas = list(FEATURE_BASE)
+    for prefix in SHARE_PREFIXES:
+        todas += sorted({name for _, _, names in partes for name in names if name.startswith(prefix)})
+    todas += [f"delta_{base}" for base in FEATURE_DELTAS]
+    if not partes:
+        partes.append(compute_features(fato_transgressao_mensal_porte, servicos_mix_codigos))
+    values = np.concatenate([_align(part, names, todas) for part, _, names in partes])
+    linhas = pd.concat([part for _, part, _ in partes], ignore_index=True)
+    order = np.lexsort((linhas["ano"].to_numpy(), linhas["sigagente"].to_numpy(dtype=object)))
+    values, linhas = values[order], linhas.iloc[order].reset_index(drop=True)
+    write_feature_store(values, linhas, todas, fingerprints, directory)
+    return values, linhas, todas, sorted(stale)
@@ -0,0 +1,200 @@
+"""Batched seasonal forecasts of the monthly distributor metrics.
+
+Every distributor x metric (PREVISAO_METRICAS) is one row of a series x
+month matrix taken from the distributor tensor (`tensor_store.build_tensor`);
+the models run on all rows at once:
+
+    sazonal_ingenuo   last observed value of the same calendar month (falls
+                      back to the last observed value)
+    ets_aditivo       exponential smoothing with additive seasonality
+                      (level + 12 seasonal states, no trend); every
+                      (alpha, gamma) of the grid runs as an extra batch axis
+                      and each series keeps the pair with the smallest
+                      one-step error on its training months
+
+One pass over the months stores the model state after each month, so the
+forecasts from every origin come out of a single indexing step. The rolling-
+origin backtest scores origins from MIN_MESES_TREINO on, at horizons
+1..HORIZONTE_PREVISAO, and `modelo_escolhido` marks the model with the
+smaller backtest MAE per series. Missing months do not update the state.
+Forecasts are clipped at zero (both metrics are non-negative).
+"""
+
+from __future__ import annotations
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from src.etl.instrumentation import instrumented
+
+PREVISAO_METRICAS = ["taxa_fora_prazo", "compensacao_rs_por_uc_mes"]
+MODELOS_PREVISAO = ["sazonal_ingenuo", "ets_aditivo"]
+HORIZONTE_PREVISAO = 12
+PERIODO_SAZONAL = 12
+MIN_MESES_TREINO = 18
+ALPHAS = (0.1, 0.3, 0.5, 0.7, 0.9)
+GAMMAS = (0.05, 0.2, 0.4)
+PREVISAO_COLUNAS = [
+    "sigagente",
+    "nomagente",
+    "metrica",
+    "modelo",
+    "horizonte",
+    "ano",
+    "mes",
+    "previsao",
+    "mae_backtest",
+    "n_backtest",
+    "modelo_escolhido",
+]
+
+
+def _forward_fill(values: np.ndarray, axis: int) -> np.ndarray:
+    """Last non-NaN value along `axis` (NaN before the first one)."""
+    shape = [1] * values.ndim
+    shape[axis] = values.shape[axis]
+    position = np.where(np.isnan(values), -1, np.arange(values.shape[axis]).reshape(shape))
+    position = np.maximum.accumulate(position, axis=axis)
+    filled = np.take_along_axis(values, np.maximum(position, 0), axis=axis)
+    return np.where(position >= 0, filled, np.nan)
+
+
+def seasonal_naive_states(series: np.ndarray, phase: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(series, months, 12) last value per calendar month and (series, months) last value, as of each month."""
+    n_series, n_months = series.shape
+    by_phase = np.full((n_series, n_months, PERIODO_SAZONAL), np.nan)
+    by_phase[:, np.arange(n_months), phase] = series
+    return _forward_fill(by_phase, axis=1), _forward_fill(series, axis=1)
+
+
+def ets_states(
+    series: np.ndarray,
+    phase: np.ndarray,
+    alphas: np.ndarray,
+    gammas: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Level (grid, series, months), seasonal (grid, series, months, 12) after each month, one-step forecasts."""
+    n_series, n_months = series.shape
+    n_grid = len(alphas)
+    with warnings.catch_warnings():
+        # Series with no observation in the first year (or at all) have NaN means.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        inicio = np.nanmean(series[:, :PERIODO_SAZONAL], axis=1)
+        inicio = np.where(np.isnan(inicio), np.nanmean(series, axis=1), inicio)
+    sazonal = np.zeros((n_series, PERIODO_SAZONAL))
+    primeiro_ano = series[:, :PERIODO_SAZONAL] - inicio[:, None]
+    sazonal[:, phase[: primeiro_ano.shape[1]]] = np.nan_to_num(primeiro_ano)
+
+    level = np.broadcast_to(inicio, (n_grid, n_series)).copy()
+    season = np.broadcast_to(sazonal, (n_grid, n_series, PERIODO_SAZONAL)).copy()
+    levels = np.empty((n_grid, n_series, n_months))
+    seasons = np.empty((n_grid, n_series, n_months, PERIODO_SAZONAL))
+    one_step = np.empty((n_grid, n_series, n_months))
+    alpha, gamma = alphas[:, None], gammas[:, None]
+    for t in range(n_months):
+        p = phase[t]
+        forecast = level + season[:, :, p]
+        one_step[:, :, t] = forecast
+        erro = np.nan_to_num(series[:, t] - forecast)
+        level += alpha * erro
+        season[:, :, p] += gamma * erro
+        levels[:, :, t] = level
+        seasons[:, :, t] = season
+    return levels, seasons, one_step
+
+
+def origin_forecasts(
+    level: np.ndarray,
+    season: np.ndarray,
+    fallback: np.ndarray | None,
+    phase: np.ndarray,
+    horizon: int,
+) -> np.ndarray:
+    """(series, origins, horizons) forecasts from the state stored at every month."""
+    target_phase = (phase[:, None] + np.arange(1, horizon + 1)[None, :]) % PERIODO_SAZONAL
+    index = np.broadcast_to(target_phase, (season.shape[0], *target_phase.shape))
+    forecast = np.take_along_axis(season, index, axis=2)
+    if level is not None:
+        forecast = forecast + level[:, :, None]
+    if fallback is not None:
+        forecast = np.where(np.isnan(forecast), fallback[:, :, None], forecast)
+    return np.clip(forecast, 0.0, None)
+
+
+def backtest_mae(series: np.ndarray, forecasts: np.ndarray, first_origin: int) -> tuple[np.ndarray, np.ndarray]:
+    """Mean absolute error and number of scored points per series, over origins >= first_origin."""
+    n_series, n_months, horizon = forecasts.shape
+    target_pos = np.arange(n_months)[:, None] + np.arange(1, horizon + 1)[None, :]
+    padded = np.concatenate([series, np.full((n_series, horizon), np.nan)], axis=1)
+    target = padded[:, target_pos]
+    erro = np.abs(forecasts - target)
+    erro[:, :first_origin] = np.nan
+    valid = ~np.isnan(erro)
+    count = valid.sum(axis=(1, 2))
+    total = np.where(valid, erro, 0.0).sum(axis=(1, 2))
+    mae = np.full(n_series, np.nan)
+    np.divide(total, count, out=mae, where=count > 0)
+    return mae, count
+
+
+@instrumented()
+def build_fato_previsao_mensal(
+    values: np.ndarray,
+    agentes: pd.DataFrame,
+    meses: pd.DataFrame,
+    metricas: list[str],
+    horizonte: int = HORIZONTE_PREVISAO,
+) -> pd.DataFrame:
+    """Forecasts of every model for the `horizonte` months after the tensor's last month."""
+    n_agentes, n_months, _ = values.shape
+    if not n_agentes or not n_months:
+        return pd.DataFrame(columns=PREVISAO_COLUNAS)
+    k_pos = [metricas.index(metrica) for metrica in PREVISAO_METRICAS]
+    series = values[:, :, k_pos].transpose(0, 2, 1).reshape(-1, n_months)
+    phase = meses["mes"].to_numpy(dtype="int64") - 1
+    first_origin = min(MIN_MESES_TREINO, n_months) - 1
+
+    by_phase, last = seasonal_naive_states(series, phase)
+    naive = origin_forecasts(None, by_phase, last, phase, horizonte)
+
+    grid_alpha, grid_gamma = (grid.ravel() for grid in np.meshgrid(ALPHAS, GAMMAS, indexing="ij"))
+    levels, seasons, one_step = ets_states(series, phase, grid_alpha, grid_gamma)
+    # Smoothing pair per series from one-step errors before the first backtest origin.
+    treino = slice(PERIODO_SAZONAL, max(first_origin + 1, PERIODO_SAZONAL + 1))
+    erro = (one_step[:, :, treino] - series[None, :, treino]) ** 2
+    valid = ~np.isnan(erro)
+    sse = np.where(valid, erro, 0.0).sum(axis=2) / np.maximum(valid.sum(axis=2), 1)
+    sse[:, ~valid.any(axis=(0, 2))] = np.inf
+    escolha = np.where(np.isinf(sse).all(axis=0), len(grid_alpha) // 2, sse.argmin(axis=0))
+    rows = np.arange(len(series))
+    ets = origin_forecasts(levels[escolha, rows], seasons[escolha, rows], last, phase, horizonte)
+
+    forecasts = np.stack([naive, ets])
+    maes, counts = zip(*(backtest_mae(series, forecast, first_origin) for forecast in forecasts))
+    mae, count = np.stack(maes), np.stack(counts)
+    escolhido = np.where(np.isnan(mae), np.inf, mae).argmin(axis=0)
+
+    observada = ~np.isnan(series).all(axis=1)
+    keep = np.broadcast_to(observada[None, :, None], (len(MODELOS_PREVISAO), len(series), horizonte))
+    m_pos, s_pos, h_pos = np.nonzero(keep)
+    ultimo = int(meses["ano"].iloc[-1]) * 12 + int(meses["mes"].iloc[-1]) - 1
+    alvo = ultimo + h_pos + 1
+    agente_pos, metrica_pos = np.divmod(s_pos, len(PREVISAO_METRICAS))
+    out = pd.DataFrame(
+        {
+            "sigagente": agentes["sigagente"].to_numpy(dtype=object)[agente_pos],
+            "nomagente": agentes["nomagente"].to_numpy(dtype=object)[agente_pos],
+            "metrica": np.asarray(PREVISAO_METRICAS, dtype=object)[metrica_pos],
+            "modelo": np.asarray(MODELOS_PREVISAO, dtype=object)[m_pos],
+            "horizonte": h_pos + 1,
+            "ano": alvo // 12,
+            "mes": alvo % 12 + 1,
+            "previsao": forecasts[m_pos, s_pos, n_months - 1, h_pos],
+            "mae_backtest": mae[m_pos, s_pos],
+            "n_backtest": count[m_pos, s_pos],
+            "modelo_escolhido": escolhido[s_pos] == m_pos,
+        }
+    )
+    return out.sort_values(["sigagente", "metrica", "modelo", "horizonte"]).reset_index(drop=True)
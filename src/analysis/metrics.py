@@ -0,0 +1,101 @@
+"""Registry of derived ratio metrics.
+
+Each ratio is defined once as numerator / denominator * scale, with NaN when
+the denominator is not positive. Tables keep only additive measures while
+they are aggregated; builders call `add_metrics` after the last groupby and
+only for the columns they output.
+
+Inputs are looked up by alias (first column present wins), so the same
+metric works on monthly tables (`qtd_serv_realizado`, `uc_ativa_mes`) and on
+annual ones (`qtd_serv`, `exposicao_uc_mes`); `inputs=` pins a column
+explicitly. A metric can be written under another name by passing a
+mapping {output column: metric}.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Mapping
+
+import numpy as np
+import pandas as pd
+
+# Input role -> candidate columns, in lookup order.
+INPUT_ALIASES: dict[str, tuple[str, ...]] = {
+    "servicos": ("qtd_serv_realizado", "qtd_serv"),
+    "fora_prazo": ("qtd_fora_prazo",),
+    "compensacao": ("compensacao_rs",),
+    "uc_mes": ("uc_ativa_mes", "exposicao_uc_mes"),
+    "uc_media": ("uc_ativa_media_mensal",),
+}
+
+# metric -> (numerator role, denominator role, scale)
+METRICS: dict[str, tuple[str, str, float | None]] = {
+    "taxa_fora_prazo": ("fora_prazo", "servicos", None),
+    "fora_prazo_por_100k_uc_mes": ("fora_prazo", "uc_mes", 100000.0),
+    "compensacao_rs_por_uc_mes": ("compensacao", "uc_mes", None),
+    "compensacao_media_por_transgressao_rs": ("compensacao", "fora_prazo", None),
+    "fora_prazo_por_100k_uc": ("fora_prazo", "uc_media", 100000.0),
+    "compensacao_rs_por_uc": ("compensacao", "uc_media", None),
+}
+
+
+def _resolve_input(columns: Iterable[str], role: str, inputs: Mapping[str, str]) -> str:
+    if role in inputs:
+        return inputs[role]
+    available = set(columns)
+    for column in INPUT_ALIASES[role]:
+        if column in available:
+            return column
+    raise KeyError(f"No column for metric input '{role}' (tried {', '.join(INPUT_ALIASES[role])})")
+
+
+def _as_float(series: pd.Series) -> np.ndarray:
+    return series.to_numpy(dtype="float64", na_value=np.nan)
+
+
+def ratio(numerator: pd.Series, denominator: pd.Series, scale: float | None = None) -> np.ndarray:
+    """numerator / denominator (* scale) where denominator > 0, NaN elsewhere."""
+    num = _as_float(numerator)
+    den = _as_float(denominator)
+    out = np.full(len(num), np.nan)
+    np.divide(num, den, out=out, where=den > 0)
+    if scale is not None:
+        out *= scale
+    return out
+
+
+def metric_inputs(metrics: Iterable[str] | Mapping[str, str], available: Iterable[str]) -> list[str]:
+    """Columns among `available` (e.g. a Parquet schema) needed to evaluate `metrics`."""
+    available = list(available)
+    names = metrics.values() if isinstance(metrics, Mapping) else metrics
+    columns: list[str] = []
+    for name in names:
+        numerator, denominator, _ = METRICS[name]
+        columns += [_resolve_input(available, numerator, {}), _resolve_input(available, denominator, {})]
+    return list(dict.fromkeys(columns))
+
+
+def add_metrics(
+    frame: pd.DataFrame,
+    metrics: Iterable[str] | Mapping[str, str],
+    inputs: Mapping[str, str] | None = None,
+) -> pd.DataFrame:
+    """Evaluate only the requested metrics on `frame` (in place) and return it."""
+    inputs = inputs or {}
+    pairs = metrics.items() if isinstance(metrics, Mapping) else ((name, name) for name in metrics)
+    for output, name in pairs:
+        numerator, denominator, scale = METRICS[name]
+        frame[output] = ratio(
+            frame[_resolve_input(frame.columns, numerator, inputs)],
+            frame[_resolve_input(frame.columns, denominator, inputs)],
+            scale,
+        )
+    return frame
+
+
+def select_columns(frame: pd.DataFrame, columns: list[str], inputs: Mapping[str, str] | None = None) -> pd.DataFrame:
+    """`frame[columns]`, evaluating registry metrics that are requested but absent."""
+    missing = [column for column in columns if column not in frame.columns and column in METRICS]
+    if missing:
+        frame = add_metrics(frame.copy(deep=False), missing, inputs)
+    return frame[columns]
@@ -12,21 +12,23 @@ from pathlib import Path
 
 import numpy as np
 import pandas as pd
+from pyarrow import parquet as pq
+
+from src.analysis.agentes import NEO_ALIASES
+from src.analysis.anomalies import ANOMALIA_MEDIDAS, score_series
+from src.analysis.data_quality import build_cobertura_mensal
+from src.analysis.dtypes import apply_dtype_policy
+from src.analysis.metrics import METRICS, add_metrics, metric_inputs, select_columns
+from src.analysis.rollup_cube import read_cube_level
+from src.analysis.service_codes import ESCOPO_COLUNA, exclusion_totals
+from src.analysis.trends import JANELA_PRIMEIRO_ULTIMO, build_trends, janela_label, trends_wide
+from src.etl.instrumentation import configure_run, instrumented, write_run_report
 
 ROOT = Path(__file__).resolve().parent.parent.parent
 DIR_ANALYSIS = ROOT / "data" / "processed" / "analysis"
 DIR_OUT = DIR_ANALYSIS / "neoenergia"
 REPORT_PATH = ROOT / "reports" / "neoenergia_diagnostico.md"
 
-NEO_ALIASES: dict[str, list[str]] = {
-    "Neoenergia Coelba": ["Neoenergia Coelba", "COELBA"],
-    "Neoenergia Pernambuco": ["Neoenergia Pernambuco", "Neoenergia PE", "CELPE"],
-    "Neoenergia Cosern": ["Neoenergia Cosern", "COSERN"],
-    "Neoenergia Elektro": ["Neoenergia Elektro", "ELEKTRO"],
-    "Neoenergia Brasilia": ["Neoenergia Brasilia", "Neoenergia Brasília"],
-}
-
-
 def normalize_key(text: object) -> str:
     if text is None or pd.isna(text):
         return ""
@@ -84,41 +86,44 @@ def add_neo_distribuidora(frame: pd.DataFrame, lookup: dict[str, str]) -> pd.Dat
     return out[out["neo_distribuidora"].notna()].copy()
 
 
+@instrumented()
 def load_table(name: str, columns: list[str] | None = None) -> pd.DataFrame:
     path = DIR_ANALYSIS / f"{name}.parquet"
     if not path.exists():
         raise FileNotFoundError(f"Missing analysis table: {path}")
-    return pd.read_parquet(path, columns=columns)
-
-
-def validate_monthly(frame: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    if columns is None:
+        return apply_dtype_policy(pd.read_parquet(path))
+    # Registry ratios are evaluated from their inputs instead of being read.
+    metrics = [column for column in columns if column in METRICS]
+    read = [column for column in columns if column not in METRICS]
+    read += metric_inputs(metrics, pq.read_schema(path).names)
+    frame = apply_dtype_policy(pd.read_parquet(path, columns=list(dict.fromkeys(read))))
+    return select_columns(frame, columns)
+
+
+@instrumented()
+def validate_monthly(
+    frame: pd.DataFrame,
+    reconciliacao: pd.DataFrame,
+    lookup: dict[str, str],
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Coverage per neo_distribuidora (aliases merged), Neoenergia slice of `reconciliacao_fontes` and row checks."""
+    neo_cobertura = build_cobertura_mensal(frame, chave="neo_distribuidora")
     coverage = (
-        frame.groupby(["neo_distribuidora", "ano"], as_index=False)
-        .agg(meses_com_dados=("mes", "nunique"))
+        neo_cobertura[["neo_distribuidora", "ano", "meses_com_dados", "meses_faltantes"]]
         .sort_values(["neo_distribuidora", "ano"])
+        .reset_index(drop=True)
     )
 
-    expected_months = set(range(1, 13))
-    missing_rows: list[dict[str, object]] = []
-    for (dist, ano), group in frame.groupby(["neo_distribuidora", "ano"]):
-        missing = sorted(expected_months - set(group["mes"].astype(int).tolist()))
-        missing_rows.append(
-            {
-                "neo_distribuidora": dist,
-                "ano": int(ano),
-                "meses_faltantes": ",".join(str(m) for m in missing) if missing else "",
-            }
-        )
-    missing_df = pd.DataFrame(missing_rows)
-    coverage = coverage.merge(missing_df, on=["neo_distribuidora", "ano"], how="left")
-
+    neo_reconciliacao = add_neo_distribuidora(
+        reconciliacao.assign(sigagente=reconciliacao["sigagente_mensal"].fillna(reconciliacao["sigagente_anual"])),
+        lookup,
+    )
     num_cols = ["qtd_serv_realizado", "qtd_fora_prazo", "compensacao_rs", "uc_ativa_mes", "taxa_fora_prazo"]
 
     checks = {
         "linhas_total": int(len(frame)),
-        "duplicidades_chave_ano_mes_dist": int(
-            frame.duplicated(subset=["ano", "mes", "neo_distribuidora"], keep=False).sum()
-        ),
+        "duplicidades_chave_ano_mes_dist": int(neo_cobertura["linhas_duplicadas"].sum()),
         "fora_prazo_maior_que_servico": int((frame["qtd_fora_prazo"] > frame["qtd_serv_realizado"]).sum()),
         "linhas_taxa_fora_prazo_maior_1": int((frame["taxa_fora_prazo"] > 1.0).sum()),
         "linhas_uc_ativa_zero_ou_negativa": int((frame["uc_ativa_mes"] <= 0).sum()),
@@ -126,6 +131,7 @@ def validate_monthly(frame: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
             ((frame["compensacao_rs"] > 0) & (frame["qtd_fora_prazo"] <= 0)).sum()
         ),
         "linhas_valor_negativo": int((frame[num_cols] < 0).any(axis=1).sum()),
+        "divergencias_qualidade_indger": int(neo_reconciliacao.filter(like="alerta_divergencia_").any(axis=1).sum()),
     }
 
     checks_df = pd.DataFrame(
@@ -135,6 +141,7 @@ def validate_monthly(frame: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
     return coverage, checks_df
 
 
+@instrumented()
 def build_annual_monthly_view(frame: pd.DataFrame) -> pd.DataFrame:
     annual = (
         frame.groupby(["ano", "neo_distribuidora"], as_index=False)
@@ -149,30 +156,20 @@ def build_annual_monthly_view(frame: pd.DataFrame) -> pd.DataFrame:
         .sort_values(["ano", "neo_distribuidora"])
     )
 
-    annual["taxa_fora_prazo"] = np.where(
-        annual["qtd_serv_realizado"] > 0,
-        annual["qtd_fora_prazo"] / annual["qtd_serv_realizado"],
-        np.nan,
-    )
-    annual["fora_prazo_por_100k_uc_mes"] = np.where(
-        annual["exposicao_uc_mes"] > 0,
-        annual["qtd_fora_prazo"] / annual["exposicao_uc_mes"] * 100000.0,
-        np.nan,
-    )
-    annual["compensacao_rs_por_uc_mes"] = np.where(
-        annual["exposicao_uc_mes"] > 0,
-        annual["compensacao_rs"] / annual["exposicao_uc_mes"],
-        np.nan,
-    )
-    annual["compensacao_media_por_transgressao_rs"] = np.where(
-        annual["qtd_fora_prazo"] > 0,
-        annual["compensacao_rs"] / annual["qtd_fora_prazo"],
-        np.nan,
+    add_metrics(
+        annual,
+        [
+            "taxa_fora_prazo",
+            "fora_prazo_por_100k_uc_mes",
+            "compensacao_rs_por_uc_mes",
+            "compensacao_media_por_transgressao_rs",
+        ],
     )
 
     return annual
 
 
+@instrumented()
 def build_trend_table(annual: pd.DataFrame, base_year: int = 2023, last_year: int = 2025) -> pd.DataFrame:
     metrics = [
         "taxa_fora_prazo",
@@ -180,33 +177,24 @@ def build_trend_table(annual: pd.DataFrame, base_year: int = 2023, last_year: in
         "compensacao_rs_por_uc_mes",
         "compensacao_media_por_transgressao_rs",
     ]
-    rows: list[dict[str, object]] = []
-    for dist in sorted(annual["neo_distribuidora"].unique()):
-        row: dict[str, object] = {"neo_distribuidora": dist}
-        sub = annual[annual["neo_distribuidora"] == dist].set_index("ano")
-        for metric in metrics:
-            base_val = sub.at[base_year, metric] if base_year in sub.index else np.nan
-            last_val = sub.at[last_year, metric] if last_year in sub.index else np.nan
-            row[f"{metric}_{base_year}"] = base_val
-            row[f"{metric}_{last_year}"] = last_val
-            row[f"delta_{metric}_abs"] = (
-                last_val - base_val if pd.notna(last_val) and pd.notna(base_val) else np.nan
-            )
-            row[f"delta_{metric}_pct"] = (
-                (last_val / base_val - 1.0)
-                if pd.notna(last_val) and pd.notna(base_val) and base_val != 0
-                else np.nan
-            )
-        rows.append(row)
-
-    return pd.DataFrame(rows)
+    trends = build_trends(annual, ["neo_distribuidora"], metrics, windows=[(base_year, last_year)])
+    wide = trends_wide(trends, ["neo_distribuidora"], janela_label(base_year, last_year))
 
+    columns: dict[str, pd.Series] = {}
+    for metric in metrics:
+        columns[f"{metric}_{base_year}"] = wide[("valor_base", metric)]
+        columns[f"{metric}_{last_year}"] = wide[("valor_final", metric)]
+        columns[f"delta_{metric}_abs"] = wide[("delta_abs", metric)]
+        columns[f"delta_{metric}_pct"] = wide[("delta_pct", metric)]
+    return pd.DataFrame(columns).reset_index()
 
+
+@instrumented()
 def build_class_view(frame: pd.DataFrame, lookup: dict[str, str]) -> pd.DataFrame:
     neo = add_neo_distribuidora(frame, lookup)
 
     grouped = (
-        neo.groupby(["neo_distribuidora", "classe_local_servico"], as_index=False)
+        neo.groupby(["neo_distribuidora", "classe_local_servico"], as_index=False, observed=True)
         .agg(
             qtd_serv_realizado=("qtd_serv_realizado", "sum"),
             qtd_fora_prazo=("qtd_fora_prazo", "sum"),
@@ -216,21 +204,7 @@ def build_class_view(frame: pd.DataFrame, lookup: dict[str, str]) -> pd.DataFram
         .sort_values(["neo_distribuidora", "qtd_fora_prazo"], ascending=[True, False])
     )
 
-    grouped["taxa_fora_prazo"] = np.where(
-        grouped["qtd_serv_realizado"] > 0,
-        grouped["qtd_fora_prazo"] / grouped["qtd_serv_realizado"],
-        np.nan,
-    )
-    grouped["fora_prazo_por_100k_uc_mes"] = np.where(
-        grouped["exposicao_uc_mes"] > 0,
-        grouped["qtd_fora_prazo"] / grouped["exposicao_uc_mes"] * 100000.0,
-        np.nan,
-    )
-    grouped["compensacao_rs_por_uc_mes"] = np.where(
-        grouped["exposicao_uc_mes"] > 0,
-        grouped["compensacao_rs"] / grouped["exposicao_uc_mes"],
-        np.nan,
-    )
+    add_metrics(grouped, ["taxa_fora_prazo", "fora_prazo_por_100k_uc_mes", "compensacao_rs_por_uc_mes"])
 
     totals = grouped.groupby("neo_distribuidora")[["qtd_fora_prazo", "compensacao_rs"]].transform("sum")
     grouped["share_fora_prazo"] = np.where(
@@ -247,6 +221,7 @@ def build_class_view(frame: pd.DataFrame, lookup: dict[str, str]) -> pd.DataFram
     return grouped
 
 
+@instrumented()
 def build_long_run(indicadores: pd.DataFrame, lookup: dict[str, str]) -> tuple[pd.DataFrame, pd.DataFrame]:
     neo = add_neo_distribuidora(indicadores, lookup)
 
@@ -259,45 +234,30 @@ def build_long_run(indicadores: pd.DataFrame, lookup: dict[str, str]) -> tuple[p
         )
         .sort_values(["ano", "neo_distribuidora"])
     )
-    annual["taxa_fora_prazo"] = np.where(
-        annual["qtd_serv"] > 0,
-        annual["qtd_fora_prazo"] / annual["qtd_serv"],
-        np.nan,
-    )
-
-    rows: list[dict[str, object]] = []
-    for dist, group in annual.groupby("neo_distribuidora"):
-        group = group.sort_values("ano")
-        first = group.iloc[0]
-        last = group.iloc[-1]
-        rows.append(
-            {
-                "neo_distribuidora": dist,
-                "ano_inicio": int(first["ano"]),
-                "ano_fim": int(last["ano"]),
-                "taxa_inicio": first["taxa_fora_prazo"],
-                "taxa_fim": last["taxa_fora_prazo"],
-                "delta_taxa_abs": last["taxa_fora_prazo"] - first["taxa_fora_prazo"],
-                "delta_taxa_pct": (
-                    (last["taxa_fora_prazo"] / first["taxa_fora_prazo"] - 1.0)
-                    if pd.notna(first["taxa_fora_prazo"]) and first["taxa_fora_prazo"] != 0
-                    else np.nan
-                ),
-                "compensacao_inicio": first["compensacao_rs"],
-                "compensacao_fim": last["compensacao_rs"],
-                "delta_comp_abs": last["compensacao_rs"] - first["compensacao_rs"],
-                "delta_comp_pct": (
-                    (last["compensacao_rs"] / first["compensacao_rs"] - 1.0)
-                    if pd.notna(first["compensacao_rs"]) and first["compensacao_rs"] != 0
-                    else np.nan
-                ),
-            }
-        )
-
-    summary = pd.DataFrame(rows).sort_values("neo_distribuidora")
+    add_metrics(annual, ["taxa_fora_prazo"])
+
+    trends = build_trends(
+        annual, ["neo_distribuidora"], ["taxa_fora_prazo", "compensacao_rs"], first_last=True
+    )
+    wide = trends_wide(trends, ["neo_distribuidora"], JANELA_PRIMEIRO_ULTIMO)
+    summary = pd.DataFrame(
+        {
+            "ano_inicio": wide[("ano_base", "taxa_fora_prazo")].astype(int),
+            "ano_fim": wide[("ano_final", "taxa_fora_prazo")].astype(int),
+            "taxa_inicio": wide[("valor_base", "taxa_fora_prazo")],
+            "taxa_fim": wide[("valor_final", "taxa_fora_prazo")],
+            "delta_taxa_abs": wide[("delta_abs", "taxa_fora_prazo")],
+            "delta_taxa_pct": wide[("delta_pct", "taxa_fora_prazo")],
+            "compensacao_inicio": wide[("valor_base", "compensacao_rs")],
+            "compensacao_fim": wide[("valor_final", "compensacao_rs")],
+            "delta_comp_abs": wide[("delta_abs", "compensacao_rs")],
+            "delta_comp_pct": wide[("delta_pct", "compensacao_rs")],
+        }
+    ).reset_index()
     return annual, summary
 
 
+@instrumented()
 def build_latest_size_benchmark(annual_monthly: pd.DataFrame) -> pd.DataFrame:
     latest_year = int(annual_monthly["ano"].max())
     latest = annual_monthly[annual_monthly["ano"] == latest_year].copy()
@@ -322,14 +282,19 @@ def build_latest_size_benchmark(annual_monthly: pd.DataFrame) -> pd.DataFrame:
     return latest
 
 
+@instrumented()
 def build_spike_table(monthly: pd.DataFrame) -> pd.DataFrame:
-    frame = monthly.sort_values(["neo_distribuidora", "ano", "mes"]).copy()
-    frame["taxa_var_abs"] = frame.groupby("neo_distribuidora")["taxa_fora_prazo"].diff()
-    frame["taxa_var_pct"] = frame.groupby("neo_distribuidora")["taxa_fora_prazo"].pct_change()
-
-    spikes = frame[
-        frame["taxa_var_pct"].notna() & (frame["taxa_var_pct"].abs() >= 0.5)
-    ].copy()
+    """Abrupt changes (>= 50%) of each Neoenergia distributor's monthly rate.
+
+    Series are keyed by `neo_distribuidora`, so the months a distributor
+    reported under each of its NEO_ALIASES form one series and the month of a
+    rename is still compared with the month before; the rule is the national
+    detector's (`anomalies.score_series`).
+    """
+    totais = monthly.groupby(["neo_distribuidora", "ano", "mes"], as_index=False)[ANOMALIA_MEDIDAS].sum()
+    add_metrics(totais, ["taxa_fora_prazo"])
+    frame = score_series(totais, ["neo_distribuidora"])
+    spikes = frame[frame["alerta_variacao_abrupta"]]
 
     return spikes[
         [
@@ -345,25 +310,27 @@ def build_spike_table(monthly: pd.DataFrame) -> pd.DataFrame:
     ].sort_values(["neo_distribuidora", "ano", "mes"])
 
 
+@instrumented()
 def build_service_code_share(
     servicos: pd.DataFrame,
     lookup: dict[str, str],
     focus_codes: tuple[str, ...] = ("69", "93"),
 ) -> pd.DataFrame:
-    neo = add_neo_distribuidora(servicos, lookup)
-    neo = neo.copy()
-    neo["codtiposervico"] = neo["codtiposervico"].astype("string").str.strip()
-    neo["serv_focus"] = np.where(
-        neo["codtiposervico"].isin(focus_codes),
-        neo["qtd_serv_realizado"],
-        0.0,
-    )
-
-    share = (
-        neo.groupby(["neo_distribuidora", "ano"], as_index=False)
-        .agg(total_serv=("qtd_serv_realizado", "sum"), serv_focus=("serv_focus", "sum"))
-        .sort_values(["neo_distribuidora", "ano"])
-    )
+    totals = exclusion_totals(servicos, {"total": (), "sem_foco": focus_codes}, by=["sigagente", "ano"])
+    neo = add_neo_distribuidora(totals, lookup)
+    wide = neo.pivot_table(
+        index=["neo_distribuidora", "ano"],
+        columns=ESCOPO_COLUNA,
+        values="qtd_serv_realizado",
+        aggfunc="sum",
+        fill_value=0,
+    )
+    share = pd.DataFrame(
+        {
+            "total_serv": wide["total"],
+            "serv_focus": (wide["total"] - wide.get("sem_foco", 0)).astype("float64"),
+        }
+    ).reset_index()
     share["share_serv_focus"] = np.where(
         share["total_serv"] > 0,
         share["serv_focus"] / share["total_serv"],
@@ -372,6 +339,7 @@ def build_service_code_share(
     return share
 
 
+@instrumented()
 def build_comparability_alerts(
     annual_monthly: pd.DataFrame,
     share_codes: pd.DataFrame,
@@ -394,15 +362,15 @@ def build_comparability_alerts(
     return alerts.sort_values(["neo_distribuidora", "ano"]).reset_index(drop=True)
 
 
+@instrumented()
 def build_annual_excluding_codes(
     servicos: pd.DataFrame,
     monthly_neo: pd.DataFrame,
     lookup: dict[str, str],
     excluded_codes: tuple[str, ...] = ("69", "93"),
 ) -> pd.DataFrame:
-    neo = add_neo_distribuidora(servicos, lookup).copy()
-    neo["codtiposervico"] = neo["codtiposervico"].astype("string").str.strip()
-    neo = neo[~neo["codtiposervico"].isin(excluded_codes)].copy()
+    escopo = "sem_cod_" + "_".join(excluded_codes)
+    neo = add_neo_distribuidora(exclusion_totals(servicos, {escopo: excluded_codes}), lookup)
 
     monthly = (
         neo.groupby(["ano", "mes", "neo_distribuidora"], as_index=False)
@@ -428,22 +396,8 @@ def build_annual_excluding_codes(
         .sort_values(["ano", "neo_distribuidora"])
     )
 
-    annual["taxa_fora_prazo"] = np.where(
-        annual["qtd_serv_realizado"] > 0,
-        annual["qtd_fora_prazo"] / annual["qtd_serv_realizado"],
-        np.nan,
-    )
-    annual["fora_prazo_por_100k_uc_mes"] = np.where(
-        annual["exposicao_uc_mes"] > 0,
-        annual["qtd_fora_prazo"] / annual["exposicao_uc_mes"] * 100000.0,
-        np.nan,
-    )
-    annual["compensacao_rs_por_uc_mes"] = np.where(
-        annual["exposicao_uc_mes"] > 0,
-        annual["compensacao_rs"] / annual["exposicao_uc_mes"],
-        np.nan,
-    )
-    annual["escopo_servico"] = "sem_cod_69_93"
+    add_metrics(annual, ["taxa_fora_prazo", "fora_prazo_por_100k_uc_mes", "compensacao_rs_por_uc_mes"])
+    annual["escopo_servico"] = escopo
 
     return annual
 
@@ -553,6 +507,7 @@ def add_pretty_columns_for_markdown(
     }
 
 
+@instrumented()
 def write_outputs(
     monthly_neo: pd.DataFrame,
     annual_monthly: pd.DataFrame,
@@ -585,6 +540,7 @@ def write_outputs(
     spikes.to_csv(DIR_OUT / "neo_outliers_taxa.csv", index=False)
 
 
+@instrumented()
 def build_report(
     annual_monthly: pd.DataFrame,
     annual_excl_codes: pd.DataFrame,
@@ -802,7 +758,10 @@ def build_report(
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Generate focused Neoenergia benchmark report")
-    _ = parser.parse_args()
+    parser.add_argument("--profile", action="store_true", help="dump cProfile stats per stage")
+    args = parser.parse_args()
+
+    configure_run("neoenergia_diagnostico", profile=args.profile)
 
     lookup = build_lookup()
 
@@ -836,8 +795,8 @@ def main() -> None:
         "fato_indicadores_anuais",
         columns=["ano", "sigagente", "qtd_serv", "qtd_fora_prazo", "compensacao_rs"],
     )
-    servicos = load_table(
-        "fato_servicos_municipio_mes",
+    servicos = read_cube_level(
+        "agente_servico_mes",
         columns=[
             "ano",
             "mes",
@@ -848,11 +807,12 @@ def main() -> None:
             "compensacao_rs",
         ],
     )
+    reconciliacao = load_table("reconciliacao_fontes")
 
     neo_monthly = add_neo_distribuidora(monthly_dist, lookup)
     neo_monthly = neo_monthly.sort_values(["neo_distribuidora", "ano", "mes"]).reset_index(drop=True)
 
-    coverage, checks = validate_monthly(neo_monthly)
+    coverage, checks = validate_monthly(neo_monthly, reconciliacao, lookup)
     annual_monthly = build_annual_monthly_view(neo_monthly)
     annual_excl_codes = build_annual_excluding_codes(servicos, neo_monthly, lookup)
     trend = build_trend_table(annual_monthly)
@@ -899,6 +859,7 @@ def main() -> None:
     print("Neoenergia diagnostic generated:")
     print(f"  - report: {REPORT_PATH}")
     print(f"  - outputs: {DIR_OUT}")
+    print(f"  - run report: {write_run_report()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,324 @@
+"""Fixed-effects panel estimates of the REN 1000 effect.
+
+No fixed-effect dummy is ever materialized: every model absorbs its effects
+with weighted group means (one bincount per effect and column), iterated as
+alternating projections until the means vanish, so the cost grows with the
+number of rows and not with the number of municipalities or distributors.
+
+    painel_estudo_evento   event study on `fato_indicadores_anuais`: unit
+                           fixed effects and event-time dummies around
+                           ANO_EVENTO (leads up to -LEADS_EVENTO, binned;
+                           lags up to +LAGS_EVENTO; reference -1 = 2021),
+                           standard errors clustered by distributor
+    painel_efeitos_mes     two-way fixed effects (unit, month) on the monthly
+                           facts; the month effects are the composition-
+                           adjusted path of `taxa_fora_prazo`, relative to the
+                           first month of the panel
+
+The outcome is `taxa_fora_prazo` weighted by the services in the row, so the
+pooled estimates match the national pooled rate. The monthly facts only cover
+the post-2022 years and REN 1000 started for every distributor at once, so
+calendar fixed effects would absorb any common 2022 effect: the event study
+runs on the annual series, with unit effects only, and its leads show the
+pre-trend. Per-service-type models run on a process pool when `max_workers`
+is above 1; the results do not depend on it.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.scenarios import ANO_CORTE
+from src.analysis.tensor_store import month_index
+from src.etl.instrumentation import instrumented
+
+ANO_EVENTO = ANO_CORTE
+LEADS_EVENTO = 5
+LAGS_EVENTO = 1
+TEMPO_REFERENCIA = -1
+TEMPOS_EVENTO = [t for t in range(-LEADS_EVENTO, LAGS_EVENTO + 1) if t != TEMPO_REFERENCIA]
+# Two-sided 95% normal quantile for ic_inferior / ic_superior.
+Z_CRITICO = 1.959963984540054
+
+TOLERANCIA = 1e-10
+MAX_ITERACOES = 1000
+MODELO_TODOS = "todos"
+
+ESTUDO_EVENTO_COLUNAS = [
+    "modelo",
+    "tempo_evento",
+    "ano",
+    "coeficiente",
+    "erro_padrao",
+    "ic_inferior",
+    "ic_superior",
+    "n_obs",
+    "n_unidades",
+    "n_clusters",
+]
+EFEITOS_MES_COLUNAS = ["fonte", "modelo", "ano", "mes", "efeito_mes", "n_obs", "n_unidades", "qtd_serv_realizado"]
+
+
+def _group_codes(frame: pd.DataFrame, columns: list[str]) -> np.ndarray:
+    """Dense 0..n-1 code per row for the combination of `columns`."""
+    return frame.groupby(columns, dropna=False, observed=True, sort=True).ngroup().to_numpy()
+
+
+def _group_means(values: np.ndarray, codes: np.ndarray, weights: np.ndarray, totals: np.ndarray) -> np.ndarray:
+    """(groups, columns) weighted means of the columns of `values`."""
+    sums = np.stack(
+        [np.bincount(codes, weights=weights * values[:, j], minlength=len(totals)) for j in range(values.shape[1])],
+        axis=1,
+    )
+    return sums / totals[:, None]
+
+
+def absorb(
+    values: np.ndarray,
+    effects: list[np.ndarray],
+    weights: np.ndarray,
+    tol: float = TOLERANCIA,
+    max_iter: int = MAX_ITERACOES,
+) -> tuple[np.ndarray, int]:
+    """Columns of `values` net of every fixed effect in `effects` (within transformation)."""
+    out = np.array(values, dtype="float64", copy=True)
+    if out.ndim == 1:
+        out = out[:, None]
+    effects = [np.unique(codes, return_inverse=True)[1] for codes in effects]
+    totals = [np.bincount(codes, weights=weights) for codes in effects]
+    scale = max(float(np.abs(out).max(initial=0.0)), 1.0)
+    for iteration in range(1, max_iter + 1):
+        largest = 0.0
+        for codes, total in zip(effects, totals):
+            means = _group_means(out, codes, weights, total)
+            out -= means[codes]
+            largest = max(largest, float(np.abs(means).max(initial=0.0)))
+        # One effect is exact after a single pass.
+        if len(effects) == 1 or largest <= tol * scale:
+            return out, iteration
+    return out, max_iter
+
+
+def fixed_effects(
+    y: np.ndarray,
+    effects: list[np.ndarray],
+    weights: np.ndarray,
+    tol: float = TOLERANCIA,
+    max_iter: int = MAX_ITERACOES,
+) -> tuple[list[np.ndarray], int]:
+    """Level of every fixed effect of y = sum_e effect_e[codes_e] + u (backfitting).
+
+    Codes must be dense (0..n-1, all present) so levels line up with them.
+    """
+    residual = np.asarray(y, dtype="float64").copy()
+    totals = [np.bincount(codes, weights=weights) for codes in effects]
+    levels = [np.zeros(len(total)) for total in totals]
+    scale = max(float(np.abs(residual).max(initial=0.0)), 1.0)
+    for iteration in range(1, max_iter + 1):
+        largest = 0.0
+        for k, (codes, total) in enumerate(zip(effects, totals)):
+            step = np.bincount(codes, weights=weights * residual, minlength=len(total)) / total
+            levels[k] += step
+            residual -= step[codes]
+            largest = max(largest, float(np.abs(step).max(initial=0.0)))
+        if largest <= tol * scale:
+            return levels, iteration
+    return levels, max_iter
+
+
+def fe_ols(
+    y: np.ndarray,
+    X: np.ndarray,
+    effects: list[np.ndarray],
+    weights: np.ndarray,
+    cluster: np.ndarray,
+) -> dict[str, np.ndarray | int]:
+    """Weighted least squares of y on X with absorbed effects and cluster-robust (CR1) errors.
+
+    Columns of X that the effects absorb completely get NaN coefficients.
+    """
+    within, _ = absorb(np.column_stack([y, X]), effects, weights)
+    yt, Xt = within[:, 0], within[:, 1:]
+    n_obs, n_cols = Xt.shape
+    coef = np.full(n_cols, np.nan)
+    erro = np.full(n_cols, np.nan)
+    n_clusters = int(len(np.unique(cluster)))
+
+    norm = np.sqrt(weights @ Xt**2) if n_obs else np.zeros(n_cols)
+    keep = norm > 1e-12 * max(float(norm.max(initial=0.0)), 1.0)
+    k = int(keep.sum())
+    if not k or n_obs <= k or n_clusters < 2:
+        return {"coef": coef, "erro_padrao": erro, "n_obs": n_obs, "n_clusters": n_clusters}
+
+    Xk = Xt[:, keep]
+    root = np.sqrt(weights)
+    beta, *_ = np.linalg.lstsq(Xk * root[:, None], yt * root, rcond=None)
+    residual = yt - Xk @ beta
+    bread = np.linalg.pinv((Xk * weights[:, None]).T @ Xk)
+    cluster_pos = np.unique(cluster, return_inverse=True)[1]
+    scores = weights * residual
+    sums = np.stack([np.bincount(cluster_pos, weights=scores * Xk[:, j]) for j in range(k)], axis=1)
+    correction = n_clusters / (n_clusters - 1) * (n_obs - 1) / (n_obs - k)
+    variance = correction * bread @ (sums.T @ sums) @ bread
+
+    coef[keep] = beta
+    erro[keep] = np.sqrt(np.clip(np.diag(variance), 0.0, None))
+    return {"coef": coef, "erro_padrao": erro, "n_obs": n_obs, "n_clusters": n_clusters}
+
+
+def _rate_panel(frame: pd.DataFrame, serv: str = "qtd_serv_realizado") -> pd.DataFrame:
+    """Rows with services, plus the outcome (taxa_fora_prazo) and the weight."""
+    out = frame[frame[serv].fillna(0) > 0].copy()
+    out["peso"] = out[serv].to_numpy(dtype="float64")
+    out["taxa"] = out["qtd_fora_prazo"].to_numpy(dtype="float64", na_value=0.0) / out["peso"]
+    return out
+
+
+def event_time(ano: np.ndarray) -> np.ndarray:
+    """Years relative to ANO_EVENTO, with both ends binned."""
+    return np.clip(np.asarray(ano, dtype="int64") - ANO_EVENTO, -LEADS_EVENTO, LAGS_EVENTO)
+
+
+def _event_study(
+    modelo: str,
+    y: np.ndarray,
+    tempo: np.ndarray,
+    unit: np.ndarray,
+    cluster: np.ndarray,
+    weights: np.ndarray,
+) -> dict[str, object]:
+    X = (tempo[:, None] == np.asarray(TEMPOS_EVENTO)[None, :]).astype("float64")
+    fit = fe_ols(y, X, [unit], weights, cluster)
+    return {"modelo": modelo, "n_unidades": int(len(np.unique(unit))), **fit}
+
+
+def _month_effects(
+    fonte: str,
+    modelo: str,
+    y: np.ndarray,
+    unit: np.ndarray,
+    periodo: np.ndarray,
+    weights: np.ndarray,
+) -> pd.DataFrame:
+    if not len(y):
+        return pd.DataFrame(columns=EFEITOS_MES_COLUNAS)
+    _, unit_pos = np.unique(unit, return_inverse=True)
+    meses, mes_pos = np.unique(periodo, return_inverse=True)
+    (_, level), _ = fixed_effects(y, [unit_pos, mes_pos], weights)
+    return pd.DataFrame(
+        {
+            "fonte": fonte,
+            "modelo": modelo,
+            "ano": meses // 12,
+            "mes": meses % 12 + 1,
+            "efeito_mes": level - level[0],
+            "n_obs": np.bincount(mes_pos),
+            "n_unidades": int(unit_pos.max()) + 1,
+            "qtd_serv_realizado": np.bincount(mes_pos, weights=weights),
+        }
+    )
+
+
+def _run(function, jobs: list[tuple], max_workers: int | None) -> list:
+    if max_workers and max_workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(function, *zip(*jobs)))
+    return [function(*job) for job in jobs]
+
+
+@instrumented()
+def build_painel_estudo_evento(fato_indicadores: pd.DataFrame, max_workers: int | None = None) -> pd.DataFrame:
+    """Event-time coefficients, pooled and per codigo_base, on the comparable annual years."""
+    base = fato_indicadores[fato_indicadores["ano_comparavel_principal"].astype(bool)]
+    panel = _rate_panel(base.dropna(subset=["sigagente", "ano", "codigo_base"]), "qtd_serv")
+    tempo = event_time(panel["ano"].to_numpy())
+    cluster = _group_codes(panel, ["sigagente"])
+    weights = panel["peso"].to_numpy()
+    y = panel["taxa"].to_numpy()
+
+    jobs = [
+        (
+            MODELO_TODOS,
+            y,
+            tempo,
+            _group_codes(panel, ["sigagente", "codigo_base", "classe_local"]),
+            cluster,
+            weights,
+        )
+    ]
+    codigo = panel["codigo_base"].astype("string").to_numpy(dtype=object)
+    subset_unit = _group_codes(panel, ["sigagente", "classe_local"])
+    for modelo in sorted(set(codigo)):
+        rows = codigo == modelo
+        jobs.append((modelo, y[rows], tempo[rows], subset_unit[rows], cluster[rows], weights[rows]))
+
+    frames = []
+    for fit in _run(_event_study, jobs, max_workers):
+        frames.append(
+            pd.DataFrame(
+                {
+                    "modelo": fit["modelo"],
+                    "tempo_evento": TEMPOS_EVENTO,
+                    "coeficiente": fit["coef"],
+                    "erro_padrao": fit["erro_padrao"],
+                    "n_obs": fit["n_obs"],
+                    "n_unidades": fit["n_unidades"],
+                    "n_clusters": fit["n_clusters"],
+                }
+            )
+        )
+    out = pd.concat(frames, ignore_index=True)
+    out["ano"] = out["tempo_evento"] + ANO_EVENTO
+    out["ic_inferior"] = out["coeficiente"] - Z_CRITICO * out["erro_padrao"]
+    out["ic_superior"] = out["coeficiente"] + Z_CRITICO * out["erro_padrao"]
+    return out[ESTUDO_EVENTO_COLUNAS]
+
+
+@instrumented()
+def build_painel_efeitos_mes(
+    fato_transgressao_mensal_porte: pd.DataFrame,
+    fato_servicos: pd.DataFrame,
+    dim_tipo_servico: pd.DataFrame,
+    max_workers: int | None = None,
+) -> pd.DataFrame:
+    """Month effects of two-way (unit, month) models on the monthly facts.
+
+    Units: distributor x service class for the porte table; distributor x
+    municipality (x service type in the pooled model) for the keyed
+    municipality fact, whose per-service-type models use `codtiposervico`.
+    """
+    jobs = []
+    porte = _rate_panel(fato_transgressao_mensal_porte.dropna(subset=["sigagente", "ano", "mes"]))
+    jobs.append(
+        (
+            "fato_transgressao_mensal_porte",
+            MODELO_TODOS,
+            porte["taxa"].to_numpy(),
+            _group_codes(porte, ["sigagente", "classe_local_servico"]),
+            month_index(porte["ano"], porte["mes"]),
+            porte["peso"].to_numpy(),
+        )
+    )
+
+    servicos = _rate_panel(fato_servicos)
+    y = servicos["taxa"].to_numpy()
+    weights = servicos["peso"].to_numpy()
+    periodo = month_index(servicos["ano"], servicos["mes"])
+    agente = servicos["id_agente"].to_numpy(dtype="int64")
+    municipio = servicos["id_municipio"].to_numpy(dtype="int64")
+    tipo = servicos["id_tipo_servico"].to_numpy(dtype="int64")
+    unit = (agente * (municipio.max(initial=0) + 1) + municipio) if len(servicos) else agente
+    fonte = "fato_servicos_municipio_mes"
+    jobs.append((fonte, MODELO_TODOS, y, unit * (tipo.max(initial=0) + 1) + tipo, periodo, weights))
+    codigos = dim_tipo_servico.set_index("id_tipo_servico")["codtiposervico"].astype("string")
+    for id_tipo in np.unique(tipo):
+        rows = tipo == id_tipo
+        jobs.append((fonte, str(codigos.get(id_tipo, id_tipo)), y[rows], unit[rows], periodo[rows], weights[rows]))
+
+    frames = [frame for frame in _run(_month_effects, jobs, max_workers) if len(frame)]
+    if not frames:
+        return pd.DataFrame(columns=EFEITOS_MES_COLUNAS)
+    return pd.concat(frames, ignore_index=True)[EFEITOS_MES_COLUNAS]
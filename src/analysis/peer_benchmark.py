@@ -0,0 +1,90 @@
+"""Peer benchmark of every distributor-month within its porte bucket and year.
+
+Peers are the distributor-months with the same (`bucket_porte`, `ano`). For
+each metric of BENCHMARK_METRICAS the table holds the row's percentile rank
+among its peers (average rank of ties / number of peers with data, as
+`Series.rank(pct=True)`) and the peer bands p10/p50/p90 (linear
+interpolation, as `Series.quantile`) and `n_pares_<metrica>`, the number
+of peers with data for that metric (the row itself included).
+
+Ranks and quantiles come from one lexsort by (group, value) per metric
+(`porte.grouped_percentile_rank`, shared with the porte ranks): tie runs
+get their average rank, and every band is two positional lookups in the
+group's sorted block. Rows without a bucket or without the metric get NaN.
+
+The table is written sorted by `sigagente`, so a focus group is a filtered
+Parquet read (`read_benchmark_pares(["SIGLA", ...])`).
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.dtypes import apply_dtype_policy
+from src.analysis.porte import grouped_percentile_rank
+from src.etl.instrumentation import instrumented
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+DIR_ANALYSIS = ROOT / "data" / "processed" / "analysis"
+BENCHMARK_PATH = DIR_ANALYSIS / "benchmark_pares_mensal.parquet"
+
+BENCHMARK_METRICAS = ["fora_prazo_por_100k_uc_mes", "compensacao_rs_por_uc_mes"]
+BENCHMARK_GRUPO = ["bucket_porte", "ano"]
+BENCHMARK_QUANTIS = {"p10": 0.10, "p50": 0.50, "p90": 0.90}
+
+
+def grouped_rank_quantiles(
+    group: np.ndarray,
+    values: np.ndarray,
+    n_groups: int,
+    quantis: list[float],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Percentile rank per row, (groups, quantis) bands and rows with data per group; group -1 is ignored."""
+    order, pct, count = grouped_percentile_rank(group, values, n_groups)
+    bands = np.full((n_groups, len(quantis)), np.nan)
+    v = values[order]
+    start = np.concatenate([[0], np.cumsum(count)[:-1]])
+    has = np.flatnonzero(count)
+    h = np.asarray(quantis)[None, :] * (count[has, None] - 1)
+    lo, hi = np.floor(h).astype("int64"), np.ceil(h).astype("int64")
+    base = start[has, None]
+    bands[has] = v[base + lo] + (h - lo) * (v[base + hi] - v[base + lo])
+    return pct, bands, count
+
+
+@instrumented()
+def build_benchmark_pares_mensal(fato_transgressao_mensal_distribuidora: pd.DataFrame) -> pd.DataFrame:
+    """One row per distributor-month: metric, percentile among peers and peer bands, per metric."""
+    out = fato_transgressao_mensal_distribuidora[
+        ["sigagente", "nomagente", "ano", "mes", *BENCHMARK_GRUPO[:1], *BENCHMARK_METRICAS]
+    ].reset_index(drop=True)
+    # Rows without a bucket get group -1 (no peers).
+    grupo = out.groupby(BENCHMARK_GRUPO, observed=True, sort=True).ngroup().fillna(-1).to_numpy(dtype="int64")
+    valido = grupo >= 0
+    safe = np.maximum(grupo, 0)
+    n_groups = int(grupo.max(initial=-1)) + 1
+
+    for metrica in BENCHMARK_METRICAS:
+        values = out[metrica].to_numpy(dtype="float64", na_value=np.nan)
+        pct, bands, count = grouped_rank_quantiles(grupo, values, n_groups + 1, list(BENCHMARK_QUANTIS.values()))
+        out[f"n_pares_{metrica}"] = np.where(valido, count[safe], 0)
+        out[f"percentil_{metrica}"] = pct
+        for q, nome in enumerate(BENCHMARK_QUANTIS):
+            out[f"{nome}_{metrica}"] = np.where(valido, bands[safe, q], np.nan)
+    return out.sort_values(["sigagente", "ano", "mes"]).reset_index(drop=True)
+
+
+def read_benchmark_pares(
+    sigagentes: list[str] | None = None,
+    columns: list[str] | None = None,
+    path: Path = BENCHMARK_PATH,
+) -> pd.DataFrame:
+    """Filtered read of the peer benchmark for a focus group (default: every distributor)."""
+    if not path.exists():
+        raise FileNotFoundError(f"Missing analysis table: {path}")
+    filters = [("sigagente", "in", list(sigagentes))] if sigagentes else None
+    frame = pd.read_parquet(path, columns=columns, filters=filters)
+    return apply_dtype_policy(frame.reset_index(drop=True))
@@ -0,0 +1,176 @@
+"""Distributor size (porte) ranks and buckets, for every year at once.
+
+`rank_porte` sorts the (ano, value) pairs once and derives, per row, the
+within-year dense rank (largest = 1), the average-tie percentile rank, the
+share of the year's total and one bucket column per scheme in ESQUEMAS_PORTE:
+
+    quartis    percentile quartiles P/M/G/GG -> `bucket_porte` (default)
+    decis      percentile deciles D01..D10
+    faixas_uc  fixed UC thresholds; 60 mil UCs is the small-distributor cut
+               used in ANEEL rules
+    jenks      natural breaks: 1D k-means on log10(UC) per year, all years
+               iterated together
+
+Percentile schemes use the same rule as the previous per-year
+`rank(pct=True)` + `pd.cut`: a row falls in the first class whose upper
+percentile it does not exceed.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+ESQUEMAS_PORTE: dict[str, dict[str, object]] = {
+    "quartis": {
+        "tipo": "percentil",
+        "cortes": (0.25, 0.5, 0.75),
+        "rotulos": ("P", "M", "G", "GG"),
+        "coluna": "bucket_porte",
+    },
+    "decis": {
+        "tipo": "percentil",
+        "cortes": tuple(i / 10 for i in range(1, 10)),
+        "rotulos": tuple(f"D{i:02d}" for i in range(1, 11)),
+        "coluna": "bucket_porte_decil",
+    },
+    "faixas_uc": {
+        "tipo": "limites_uc",
+        "cortes": (60_000, 500_000, 2_000_000),
+        "rotulos": ("ate_60k", "60k_500k", "500k_2M", "acima_2M"),
+        "coluna": "bucket_porte_faixa_uc",
+    },
+    "jenks": {
+        "tipo": "quebras_naturais",
+        "rotulos": ("P", "M", "G", "GG"),
+        "coluna": "bucket_porte_jenks",
+    },
+}
+ESQUEMA_PADRAO = "quartis"
+JENKS_MAX_ITER = 100
+
+
+def grouped_percentile_rank(
+    group: np.ndarray,
+    values: np.ndarray,
+    n_groups: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Rows sorted by (group, value), average-tie percentile rank and rows per group.
+
+    One lexsort: a row's rank is its position inside its group's sorted block
+    and tie runs get the run's average rank, as `Series.rank(pct=True)`. Rows
+    with a NaN value or a negative group are left out (NaN rank).
+    """
+    pct = np.full(len(values), np.nan)
+    idx = np.flatnonzero((group >= 0) & ~np.isnan(values))
+    order = idx[np.lexsort((values[idx], group[idx]))]
+    g, v = group[order], values[order]
+    count = np.bincount(g, minlength=n_groups)
+    if not len(order):
+        return order, pct, count
+    start = np.concatenate([[0], np.cumsum(count)[:-1]])
+    position = np.arange(len(order)) - start[g] + 1
+    tie = np.cumsum(np.r_[True, (g[1:] != g[:-1]) | (v[1:] != v[:-1])]) - 1
+    average = np.bincount(tie, weights=position) / np.bincount(tie)
+    pct[order] = average[tie] / count[g]
+    return order, pct, count
+
+
+def _year_ranks(ano_pos: np.ndarray, values: np.ndarray, n_years: int) -> tuple[np.ndarray, np.ndarray]:
+    """Dense descending rank and average-tie percentile rank within each year (NaN stays NaN)."""
+    dense = np.full(len(values), np.nan)
+    order, pct, _ = grouped_percentile_rank(ano_pos, values, n_years)
+    if not len(order):
+        return dense, pct
+    year, value = ano_pos[order], values[order]
+    m = len(order)
+
+    new_year = np.r_[True, year[1:] != year[:-1]]
+    new_value = new_year | np.r_[True, value[1:] != value[:-1]]
+    start = np.maximum.accumulate(np.where(new_year, np.arange(m), 0))
+
+    distinct_asc = np.cumsum(new_value)
+    distinct_asc = distinct_asc - distinct_asc[start] + 1
+    n_distinct = np.bincount(year, weights=new_value, minlength=n_years)
+    dense[order] = n_distinct[year] - distinct_asc + 1
+    return dense, pct
+
+
+def _natural_breaks(ano_pos: np.ndarray, values: np.ndarray, pct: np.ndarray, n_years: int, k: int) -> np.ndarray:
+    """Class 0..k-1 (ordered by center) from 1D k-means on log10(1 + value), per year."""
+    labels = np.full(len(values), -1)
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return labels
+    x = np.log10(1.0 + np.clip(values[valid], 0.0, None))
+    year = ano_pos[valid]
+    # Start from the percentile classes, then Lloyd iterations for all years together.
+    label = np.minimum(np.searchsorted(np.arange(1, k) / k, pct[valid], side="left"), k - 1)
+    centers = np.full((n_years, k), np.nan)
+    for _ in range(JENKS_MAX_ITER):
+        cell = year * k + label
+        count = np.bincount(cell, minlength=n_years * k)
+        total = np.bincount(cell, weights=x, minlength=n_years * k)
+        with np.errstate(invalid="ignore"):
+            updated = (total / count).reshape(n_years, k)
+        centers = np.where(np.isnan(updated), centers, updated)
+        distance = np.abs(x[:, None] - centers[year])
+        distance[np.isnan(distance)] = np.inf
+        new_label = distance.argmin(axis=1)
+        if np.array_equal(new_label, label):
+            break
+        label = new_label
+    # Relabel so that class 0 is the smallest non-empty center of its year.
+    cell = year * k + label
+    with np.errstate(invalid="ignore"):
+        final = np.bincount(cell, weights=x, minlength=n_years * k) / np.bincount(cell, minlength=n_years * k)
+    final = np.where(np.isnan(final), np.inf, final).reshape(n_years, k)
+    rank = np.argsort(np.argsort(final, axis=1, kind="stable"), axis=1)
+    labels[valid] = rank[year, label]
+    return labels
+
+
+def _labels(codes: np.ndarray, rotulos: tuple[str, ...]) -> pd.Series:
+    text = np.array(rotulos, dtype=object)[np.clip(codes, 0, len(rotulos) - 1)]
+    return pd.Series(np.where(codes >= 0, text, None), dtype="string")
+
+
+def rank_porte(
+    frame: pd.DataFrame,
+    value: str = "uc_ativa_media_mensal",
+    esquemas: list[str] | None = None,
+) -> pd.DataFrame:
+    """`frame` plus rank_porte_ano, share_uc_ano and one bucket column per scheme."""
+    esquemas = esquemas or list(ESQUEMAS_PORTE)
+    out = frame.reset_index(drop=True)
+    values = out[value].to_numpy(dtype="float64", na_value=np.nan)
+    ano_pos, anos = pd.factorize(out["ano"], sort=True)
+    n_years = len(anos)
+
+    dense, pct = _year_ranks(ano_pos, values, n_years)
+    valid = ~np.isnan(values)
+    total = np.bincount(ano_pos[valid], weights=values[valid], minlength=n_years)
+
+    out["rank_porte_ano"] = pd.array(np.where(np.isnan(dense), None, dense), dtype="Int64")
+    buckets: dict[str, pd.Series] = {}
+    for nome in esquemas:
+        esquema = ESQUEMAS_PORTE[nome]
+        rotulos = esquema["rotulos"]
+        if esquema["tipo"] == "percentil":
+            codes = np.searchsorted(np.asarray(esquema["cortes"]), pct, side="left")
+        elif esquema["tipo"] == "limites_uc":
+            codes = np.searchsorted(np.asarray(esquema["cortes"], dtype="float64"), values, side="left")
+        elif esquema["tipo"] == "quebras_naturais":
+            codes = _natural_breaks(ano_pos, values, pct, n_years, len(rotulos))
+        else:
+            raise ValueError(f"Unknown porte scheme type: {esquema['tipo']}")
+        buckets[esquema["coluna"]] = _labels(np.where(valid, codes, -1), rotulos)
+
+    default = ESQUEMAS_PORTE[ESQUEMA_PADRAO]["coluna"]
+    if default in buckets:
+        out[default] = buckets.pop(default)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out["share_uc_ano"] = values / total[ano_pos]
+    for column, labels in buckets.items():
+        out[column] = labels
+    return out
@@ -0,0 +1,117 @@
+"""Materialized rollup cube over fato_servicos_municipio_mes.
+
+The grouping sets that downstream scripts re-aggregated on their own are
+computed here from a single scan of the keyed service fact and stored as one
+Parquet file, `cubo_servicos.parquet`, with a `nivel` column. Columns that
+are not part of a level are null on its rows.
+
+    agente_classe_mes   ano, mes, sigagente, nomagente, classe_local_servico
+    agente_servico_mes  ano, mes, sigagente, nomagente, codtiposervico
+    nacional_mes        ano, mes
+
+Measures are the additive ones of the fact plus `uc_ativa_mes`: the
+distributor's active UCs on `agente_classe_mes` rows, and on `nacional_mes`
+their sum over the distributor x class rows (the exposure convention of
+`build_report.build_monthly_summary`). It is null on `agente_servico_mes`.
+
+Consumers read one level with `read_cube_level`, a filtered Parquet read
+(rows are written sorted by level, so other levels' row groups are skipped).
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+
+from src.analysis.dtypes import apply_dtype_policy
+from src.analysis.star_schema import FATO_SERVICOS_MEDIDAS
+from src.etl.instrumentation import instrumented
+from src.etl.parquet_profiles import resolve_write_profile, write_parquet
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+DIR_ANALYSIS = ROOT / "data" / "processed" / "analysis"
+CUBE_PATH = DIR_ANALYSIS / "cubo_servicos.parquet"
+
+GROUPING_SETS: dict[str, list[str]] = {
+    "agente_classe_mes": ["ano", "mes", "sigagente", "nomagente", "classe_local_servico"],
+    "agente_servico_mes": ["ano", "mes", "sigagente", "nomagente", "codtiposervico"],
+    "nacional_mes": ["ano", "mes"],
+}
+CUBE_DIMENSIONS = ["ano", "mes", "sigagente", "nomagente", "classe_local_servico", "codtiposervico"]
+CUBE_MEASURES = [*FATO_SERVICOS_MEDIDAS, "uc_ativa_mes"]
+CUBE_ROW_GROUP_SIZE = 64_000
+
+
+@instrumented()
+def build_rollup_cube(
+    fato_servicos_municipio_mes: pd.DataFrame,
+    dims_servicos: dict[str, pd.DataFrame],
+    uc_ativa_mensal_distribuidora: pd.DataFrame,
+) -> pd.DataFrame:
+    """All GROUPING_SETS stacked in one frame, from one pass over the fact."""
+    # The only scan of the fact: drop municipality and deadline, keep ids.
+    base = (
+        fato_servicos_municipio_mes.groupby(["ano", "mes", "id_agente", "id_tipo_servico"], as_index=False)[
+            FATO_SERVICOS_MEDIDAS
+        ]
+        .sum()
+        .merge(dims_servicos["dim_agente"], on="id_agente", how="left")
+        .merge(
+            dims_servicos["dim_tipo_servico"][["id_tipo_servico", "codtiposervico", "classe_local_servico"]],
+            on="id_tipo_servico",
+            how="left",
+        )
+    )
+
+    levels: dict[str, pd.DataFrame] = {}
+    for nivel in ("agente_classe_mes", "agente_servico_mes"):
+        keys = GROUPING_SETS[nivel]
+        levels[nivel] = base.groupby(keys, dropna=False, as_index=False)[FATO_SERVICOS_MEDIDAS].sum()
+
+    levels["agente_classe_mes"] = levels["agente_classe_mes"].merge(
+        uc_ativa_mensal_distribuidora[["ano", "mes", "sigagente", "uc_ativa_mes"]],
+        on=["ano", "mes", "sigagente"],
+        how="left",
+    )
+    levels["nacional_mes"] = levels["agente_classe_mes"].groupby(GROUPING_SETS["nacional_mes"], as_index=False)[
+        CUBE_MEASURES
+    ].sum()
+
+    frames = []
+    for nivel, frame in levels.items():
+        frame = frame.reindex(columns=[*CUBE_DIMENSIONS, *CUBE_MEASURES])
+        frame.insert(0, "nivel", nivel)
+        frames.append(frame)
+    cube = pd.concat(frames, ignore_index=True)
+    for column in ("sigagente", "nomagente", "classe_local_servico", "codtiposervico"):
+        cube[column] = cube[column].astype("string")
+    return cube
+
+
+def cube_level(cube: pd.DataFrame, nivel: str, columns: list[str] | None = None) -> pd.DataFrame:
+    """Rows of one level with its key columns and the measures (or `columns`)."""
+    columns = columns or [*GROUPING_SETS[nivel], *CUBE_MEASURES]
+    rows = cube[cube["nivel"] == nivel]
+    return rows[columns].reset_index(drop=True)
+
+
+@instrumented()
+def write_rollup_cube(cube: pd.DataFrame, path: Path = CUBE_PATH) -> Path:
+    profile = dict(resolve_write_profile(None))
+    profile.update(sort_by=("nivel", "ano", "mes"), row_group_size=CUBE_ROW_GROUP_SIZE)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_parquet(cube, path, profile)
+    return path
+
+
+@instrumented()
+def read_cube_level(nivel: str, columns: list[str] | None = None, path: Path = CUBE_PATH) -> pd.DataFrame:
+    """Filtered read of one grouping level."""
+    if nivel not in GROUPING_SETS:
+        raise ValueError(f"Unknown cube level: {nivel} (expected one of {', '.join(GROUPING_SETS)})")
+    if not path.exists():
+        raise FileNotFoundError(f"Missing rollup cube: {path}")
+    columns = columns or [*GROUPING_SETS[nivel], *CUBE_MEASURES]
+    frame = pd.read_parquet(path, columns=columns, filters=[("nivel", "==", nivel)])
+    return apply_dtype_policy(frame.reset_index(drop=True))
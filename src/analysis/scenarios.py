@@ -0,0 +1,230 @@
+"""Regulatory period rules and the pre/post scenario engine.
+
+The default rule lives here: REN 1000 applies from ANO_CORTE on
+(`periodo_regulatorio` pre_2022 / pos_2022) and each source has its own
+comparable window (JANELAS_COMPARAVEIS, `ano_comparavel_principal`).
+
+Alternative cutoffs are scenarios, not pipeline re-runs. A scenario is
+
+    {"corte": "2022-07", "janela": ("2015-01", "2023-12"), "excluir": [("2020-03", "2020-12")]}
+
+(first post month; optional window, default: the source's comparable years;
+optional excluded month ranges). `build_base_cenarios` pre-aggregates the
+annual and monthly facts once into national rows with a month span (annual
+rows span the whole year); `summarize_cenarios` evaluates every scenario on
+that base with one scenario x row mask and one bincount per measure. A row
+counts only when its whole span falls inside the window, on one side of the
+cutoff and outside every excluded range, so an annual row is dropped when a
+cutoff or an exclusion cuts through its year.
+
+Usage:
+    python -m src.analysis.scenarios --cenario meio_2022:corte=2022-07 \\
+        --cenario sem_covid:corte=2022-01,excluir=2020-03..2020-12
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.etl.instrumentation import instrumented
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+DIR_ANALYSIS = ROOT / "data" / "processed" / "analysis"
+
+ANO_CORTE = 2022
+PERIODO_PRE = "pre_2022"
+PERIODO_POS = "pos_2022"
+PERIODOS = [PERIODO_PRE, PERIODO_POS]
+JANELAS_COMPARAVEIS: dict[str, tuple[int, int]] = {
+    "anual": (2011, 2023),
+    "mensal": (2023, 2025),
+}
+
+CENARIO_MEDIDAS = ["qtd_serv", "qtd_fora_prazo", "compensacao_rs"]
+CENARIO_PERIODOS = ["pre", "pos", "delta"]
+CENARIOS: dict[str, dict[str, object]] = {
+    "padrao": {"corte": f"{ANO_CORTE}-01"},
+    "corte_meio_2022": {"corte": f"{ANO_CORTE}-07"},
+    "sem_covid_2020": {"corte": f"{ANO_CORTE}-01", "excluir": [("2020-03", "2020-12")]},
+    "sem_transicao_2022": {"corte": f"{ANO_CORTE}-01", "excluir": [(f"{ANO_CORTE}-01", f"{ANO_CORTE}-12")]},
+}
+CENARIO_COLUNAS = [
+    "cenario",
+    "fonte",
+    "corte",
+    "periodo",
+    "ano_inicio",
+    "ano_fim",
+    "n_meses",
+    *CENARIO_MEDIDAS,
+    "taxa_fora_prazo",
+]
+
+
+def periodo_regulatorio(ano: pd.Series | np.ndarray) -> np.ndarray:
+    """pre_2022 / pos_2022 label per year under the default cutoff."""
+    return np.where(np.asarray(ano) < ANO_CORTE, PERIODO_PRE, PERIODO_POS)
+
+
+def ano_comparavel(ano: pd.Series, fonte: str) -> pd.Series:
+    """True for the years inside the comparable window of `fonte` ("anual" or "mensal")."""
+    return ano.between(*JANELAS_COMPARAVEIS[fonte], inclusive="both")
+
+
+def _mes(texto: str) -> int:
+    """"AAAA-MM" -> months since year 0 (same index as tensor_store.month_index)."""
+    ano, mes = texto.split("-")
+    return int(ano) * 12 + int(mes) - 1
+
+
+@instrumented()
+def build_base_cenarios(
+    fato_indicadores: pd.DataFrame,
+    fato_transgressao_mensal_distribuidora: pd.DataFrame,
+) -> pd.DataFrame:
+    """National totals per year (annual fact, mes = 0) and per month (monthly fact)."""
+    anual = fato_indicadores.groupby("ano", as_index=False)[CENARIO_MEDIDAS].sum()
+    anual.insert(0, "fonte", "anual")
+    anual.insert(2, "mes", 0)
+    mensal = (
+        fato_transgressao_mensal_distribuidora.rename(columns={"qtd_serv_realizado": "qtd_serv"})
+        .groupby(["ano", "mes"], as_index=False)[CENARIO_MEDIDAS]
+        .sum()
+    )
+    mensal.insert(0, "fonte", "mensal")
+    base = pd.concat([anual, mensal], ignore_index=True)
+    return base.astype({"ano": "int64", "mes": "int64"}).sort_values(["fonte", "ano", "mes"]).reset_index(drop=True)
+
+
+@instrumented()
+def summarize_cenarios(base: pd.DataFrame, cenarios: dict[str, dict[str, object]] | None = None) -> pd.DataFrame:
+    """Pre, post and post - pre totals and pooled rate per (scenario, source)."""
+    cenarios = cenarios or CENARIOS
+    nomes = list(cenarios)
+    fonte_pos, fontes = pd.factorize(base["fonte"], sort=True)
+    ano = base["ano"].to_numpy(dtype="int64")
+    mes = base["mes"].to_numpy(dtype="int64")
+    inicio = np.where(mes == 0, ano * 12, ano * 12 + mes - 1)
+    fim = np.where(mes == 0, ano * 12 + 11, inicio)
+
+    n_cen, n_fontes, n_rows = len(nomes), len(fontes), len(base)
+    corte = np.array([_mes(str(cenarios[nome]["corte"])) for nome in nomes])
+    janela = np.empty((n_cen, n_fontes, 2), dtype="int64")
+    for s, nome in enumerate(nomes):
+        for f, fonte in enumerate(fontes):
+            if cenarios[nome].get("janela"):
+                janela[s, f] = [_mes(str(limite)) for limite in cenarios[nome]["janela"]]
+            else:
+                primeiro, ultimo = JANELAS_COMPARAVEIS[fonte]
+                janela[s, f] = [primeiro * 12, ultimo * 12 + 11]
+    n_excl = max((len(cenarios[nome].get("excluir", [])) for nome in nomes), default=0)
+    # Padding ranges (1, 0) never overlap anything.
+    excluir = np.tile(np.array([1, 0]), (n_cen, max(n_excl, 1), 1))
+    for s, nome in enumerate(nomes):
+        for e, (de, ate) in enumerate(cenarios[nome].get("excluir", [])):
+            excluir[s, e] = [_mes(de), _mes(ate)]
+
+    dentro = (inicio >= janela[:, fonte_pos, 0]) & (fim <= janela[:, fonte_pos, 1])
+    excluida = (
+        (inicio[None, None, :] <= excluir[:, :, 1, None]) & (fim[None, None, :] >= excluir[:, :, 0, None])
+    ).any(axis=1)
+    pre = fim[None, :] < corte[:, None]
+    pos = inicio[None, :] >= corte[:, None]
+    valido = dentro & ~excluida & (pre | pos)
+
+    s_pos, r_pos = np.nonzero(valido)
+    p_pos = pos[s_pos, r_pos].astype("int64")
+    cell = (s_pos * n_fontes + fonte_pos[r_pos]) * 2 + p_pos
+    n_cells = n_cen * n_fontes * 2
+    shape = (n_cen, n_fontes, 2)
+    totals = np.stack(
+        [
+            np.bincount(cell, weights=base[medida].to_numpy(dtype="float64")[r_pos], minlength=n_cells)
+            for medida in CENARIO_MEDIDAS
+        ],
+        axis=-1,
+    ).reshape(*shape, len(CENARIO_MEDIDAS))
+    n_meses = np.bincount(cell, weights=(fim - inicio + 1)[r_pos], minlength=n_cells).reshape(shape)
+    ano_inicio = np.full(n_cells, np.iinfo("int64").max)
+    ano_fim = np.full(n_cells, np.iinfo("int64").min)
+    np.minimum.at(ano_inicio, cell, ano[r_pos])
+    np.maximum.at(ano_fim, cell, ano[r_pos])
+    vazio = n_meses.ravel() == 0
+    ano_inicio = np.where(vazio, np.nan, ano_inicio).reshape(shape)
+    ano_fim = np.where(vazio, np.nan, ano_fim).reshape(shape)
+
+    serv = totals[..., CENARIO_MEDIDAS.index("qtd_serv")]
+    taxa = np.full(serv.shape, np.nan)
+    np.divide(totals[..., CENARIO_MEDIDAS.index("qtd_fora_prazo")], serv, out=taxa, where=serv > 0)
+    totals = np.where((n_meses > 0)[..., None], totals, np.nan)
+    values = np.concatenate([totals, taxa[..., None]], axis=-1)
+    values = np.concatenate([values, values[:, :, 1:2] - values[:, :, 0:1]], axis=2)
+
+    s, f, p = np.meshgrid(np.arange(n_cen), np.arange(n_fontes), np.arange(3), indexing="ij")
+    s, f, p = s.ravel(), f.ravel(), p.ravel()
+    delta = p == 2
+    pp = np.minimum(p, 1)
+    out = pd.DataFrame(
+        {
+            "cenario": np.asarray(nomes, dtype=object)[s],
+            "fonte": np.asarray(fontes, dtype=object)[f],
+            "corte": np.asarray([str(cenarios[nome]["corte"]) for nome in nomes], dtype=object)[s],
+            "periodo": np.asarray(CENARIO_PERIODOS, dtype=object)[p],
+            "ano_inicio": np.where(delta, np.nan, ano_inicio[s, f, pp]),
+            "ano_fim": np.where(delta, np.nan, ano_fim[s, f, pp]),
+            "n_meses": np.where(delta, np.nan, n_meses[s, f, pp]),
+        }
+    )
+    flat = values.reshape(-1, values.shape[-1])
+    for k, medida in enumerate([*CENARIO_MEDIDAS, "taxa_fora_prazo"]):
+        out[medida] = flat[:, k]
+    out = out.astype({"ano_inicio": "Int64", "ano_fim": "Int64", "n_meses": "Int64"})
+    return out[CENARIO_COLUNAS]
+
+
+def parse_cenario(texto: str) -> tuple[str, dict[str, object]]:
+    """"nome:corte=2022-07,janela=2015-01..2023-12,excluir=2020-03..2020-12+2021-01..2021-02"."""
+    nome, _, spec = texto.partition(":")
+    cenario: dict[str, object] = {"corte": f"{ANO_CORTE}-01"}
+    for item in filter(None, spec.split(",")):
+        chave, _, valor = item.partition("=")
+        if chave == "corte":
+            cenario["corte"] = valor
+        elif chave == "janela":
+            cenario["janela"] = tuple(valor.split(".."))
+        elif chave == "excluir":
+            cenario["excluir"] = [tuple(faixa.split("..")) for faixa in valor.split("+")]
+        else:
+            raise ValueError(f"Unknown scenario key: {chave}")
+    return nome, cenario
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre/post REN 1000 summaries for alternative cutoffs")
+    parser.add_argument(
+        "--cenario",
+        action="append",
+        default=[],
+        help="nome:corte=AAAA-MM[,janela=AAAA-MM..AAAA-MM][,excluir=AAAA-MM..AAAA-MM+...] (repeatable)",
+    )
+    parser.add_argument("--output", type=Path, default=None, help="CSV path (default: print)")
+    args = parser.parse_args()
+
+    path = DIR_ANALYSIS / "base_cenarios.parquet"
+    if not path.exists():
+        raise FileNotFoundError(f"Missing analysis table: {path}")
+    cenarios = dict(parse_cenario(texto) for texto in args.cenario) or CENARIOS
+    summary = summarize_cenarios(pd.read_parquet(path), cenarios)
+    if args.output:
+        summary.to_csv(args.output, index=False)
+        print(f"Scenarios: {args.output}")
+    else:
+        print(summary.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Service-code exclusion scenarios and code-mix shares for every distributor.
+
+Both read the additive per-(agent, ano, mes, codtiposervico) aggregate that
+the rollup cube already materializes (`agente_servico_mes`), laid out once as
+an entity x code x measure array:
+
+    exclusion_totals   totals per entity for many exclusion sets at once:
+                       total - (sum over the excluded codes), one einsum for
+                       all sets; an entity stays in a scope while it has a
+                       row for at least one code outside the set
+    code_mix           the full entity x code matrix of one measure, long,
+                       with each code's share of the entity total
+
+`by` sets the entity grain (default: distributor x month for exclusions,
+distributor x year for the mix).
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.metrics import add_metrics
+from src.analysis.star_schema import FATO_SERVICOS_MEDIDAS
+from src.etl.instrumentation import instrumented
+
+EXCLUSOES_PADRAO: dict[str, tuple[str, ...]] = {
+    "todos": (),
+    "sem_cod_69_93": ("69", "93"),
+}
+ESCOPO_COLUNA = "escopo_servico"
+
+
+def code_array(
+    agente_servico_mes: pd.DataFrame,
+    by: list[str],
+    measures: list[str] | None = None,
+) -> tuple[np.ndarray, np.ndarray, pd.DataFrame, pd.Index]:
+    """(entities, codes, measures) sums, (entities, codes) presence, entity keys and codes."""
+    measures = measures or FATO_SERVICOS_MEDIDAS
+    frame = agente_servico_mes.dropna(subset=[*by, "codtiposervico"])
+    codigo = frame["codtiposervico"].astype("string").str.strip()
+    codigo_pos, codigos = pd.factorize(codigo, sort=True)
+    entities = frame[by].drop_duplicates().sort_values(by).reset_index(drop=True)
+    entity_pos = pd.MultiIndex.from_frame(entities).get_indexer(pd.MultiIndex.from_frame(frame[by]))
+
+    n_entities, n_codes = len(entities), len(codigos)
+    cell = entity_pos * n_codes + codigo_pos
+    values = np.stack(
+        [
+            np.bincount(
+                cell,
+                weights=frame[measure].to_numpy(dtype="float64", na_value=0.0),
+                minlength=n_entities * n_codes,
+            )
+            for measure in measures
+        ],
+        axis=-1,
+    ).reshape(n_entities, n_codes, len(measures))
+    present = np.bincount(cell, minlength=n_entities * n_codes).reshape(n_entities, n_codes) > 0
+    return values, present, entities, pd.Index(codigos)
+
+
+def _restore_counts(frame: pd.DataFrame, source: pd.DataFrame, measures: list[str]) -> pd.DataFrame:
+    for measure in measures:
+        if pd.api.types.is_integer_dtype(source[measure]):
+            frame[measure] = frame[measure].round().astype("int64")
+    return frame
+
+
+@instrumented()
+def exclusion_totals(
+    agente_servico_mes: pd.DataFrame,
+    exclusoes: dict[str, tuple[str, ...]] | None = None,
+    by: list[str] | None = None,
+) -> pd.DataFrame:
+    """Long table: one row per (escopo_servico, entity) with the measures and taxa_fora_prazo."""
+    exclusoes = EXCLUSOES_PADRAO if exclusoes is None else exclusoes
+    by = by or ["sigagente", "ano", "mes"]
+    measures = FATO_SERVICOS_MEDIDAS
+    values, present, entities, codigos = code_array(agente_servico_mes, by, measures)
+
+    escopos = list(exclusoes)
+    excluded = np.zeros((len(escopos), len(codigos)))
+    for s, escopo in enumerate(escopos):
+        excluded[s] = codigos.isin([str(code).strip() for code in exclusoes[escopo]])
+
+    totals = values.sum(axis=1)
+    kept = totals[None] - np.einsum("eck,sc->sek", values, excluded)
+    kept_present = (present[None] & (excluded[:, None, :] == 0)).any(axis=-1)
+
+    s_pos, e_pos = np.nonzero(kept_present)
+    out = entities.take(e_pos).reset_index(drop=True)
+    out.insert(0, ESCOPO_COLUNA, np.asarray(escopos, dtype=object)[s_pos])
+    for k, measure in enumerate(measures):
+        out[measure] = kept[s_pos, e_pos, k]
+    out = _restore_counts(out, agente_servico_mes, measures)
+    add_metrics(out, ["taxa_fora_prazo"])
+    return out
+
+
+@instrumented()
+def code_mix(
+    agente_servico_mes: pd.DataFrame,
+    by: list[str] | None = None,
+    measure: str = "qtd_serv_realizado",
+) -> pd.DataFrame:
+    """Entity x code matrix of `measure` (rows with data only) and share_<measure> of the entity total."""
+    by = by or ["sigagente", "ano"]
+    values, present, entities, codigos = code_array(agente_servico_mes, by, [measure])
+    matrix = values[..., 0]
+    total = matrix.sum(axis=1, keepdims=True)
+    share = np.full(matrix.shape, np.nan)
+    np.divide(matrix, total, out=share, where=total > 0)
+
+    e_pos, c_pos = np.nonzero(present)
+    out = entities.take(e_pos).reset_index(drop=True)
+    out["codtiposervico"] = codigos.take(c_pos)
+    out[measure] = matrix[e_pos, c_pos]
+    out = _restore_counts(out, agente_servico_mes, [measure])
+    out[f"share_{measure}"] = share[e_pos, c_pos]
+    return out
@@ -0,0 +1,289 @@
+"""Mergeable sketches of the municipal service fact, for approximate queries.
+
+Built once from `fato_servicos_municipio_mes` (optional: `build_analysis_tables
+--sketches`), one sketch per (sigagente, ano) cell, stored sparse in Parquet:
+
+    sketches/hll_municipios.parquet   HyperLogLog of the distinct municipalities
+                                      (IBGE code): sigagente, ano, registro, rho
+    sketches/quantis_taxa.parquet     log-bucket quantile sketch (DDSketch-style) of
+                                      taxa_fora_prazo per municipality-month, per
+                                      service code: sigagente, ano,
+                                      codtiposervico, bucket, contagem
+    sketches/cms_codigos.parquet      count-min of qtd_serv_realizado per service
+                                      code: sigagente, ano, linha, coluna, contagem
+
+Every sketch merges by a plain reduction over its cells (HLL: max per
+register; quantiles and count-min: sum per bucket/counter), so any set of
+agents and years - or a new month added to a year's cells - is answered by
+`merge_sketch` without touching the fact. Error bounds:
+
+    distinct     relative standard error 1.04 / sqrt(2 ** HLL_P)
+    quantiles    relative error DDS_ALPHA on the returned value (zeros exact)
+    heavy codes  overestimate <= e / CMS_LARGURA * total, with probability
+                 1 - exp(-CMS_PROFUNDIDADE)
+
+Hashes use `pd.util.hash_array` on the stable text keys (IBGE code, service
+code), so sketches from different builds merge.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.star_schema import load_dimension
+from src.etl.instrumentation import instrumented
+from src.etl.parquet_profiles import write_parquet
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+DIR_ANALYSIS = ROOT / "data" / "processed" / "analysis"
+SKETCH_DIR = DIR_ANALYSIS / "sketches"
+
+SKETCH_CELULA = ["sigagente", "ano"]
+HLL_P = 12
+DDS_ALPHA = 0.01
+DDS_GAMMA = (1.0 + DDS_ALPHA) / (1.0 - DDS_ALPHA)
+BUCKET_ZERO = np.iinfo("int16").min
+CMS_LARGURA = 512
+CMS_PROFUNDIDADE = 4
+
+# kind -> (file, sketch key columns, value column, reduction); other columns are groupable dimensions.
+SKETCHES: dict[str, tuple[str, list[str], str, str]] = {
+    "distintos": ("hll_municipios.parquet", ["registro"], "rho", "max"),
+    "quantis": ("quantis_taxa.parquet", ["bucket"], "contagem", "sum"),
+    "frequentes": ("cms_codigos.parquet", ["linha", "coluna"], "contagem", "sum"),
+}
+
+
+def _text_hash(values: pd.Series, hash_key: str | None = None) -> np.ndarray:
+    text = values.astype("string").str.strip().fillna("").to_numpy(dtype=object)
+    if hash_key is None:
+        return pd.util.hash_array(text)
+    return pd.util.hash_array(text, hash_key=hash_key)
+
+
+def _leading_zeros(values: np.ndarray) -> np.ndarray:
+    """Leading zero bits of uint64 values (64 for zero); exact via the two 32-bit halves."""
+    hi = (values >> np.uint64(32)).astype("float64")
+    lo = (values & np.uint64(0xFFFFFFFF)).astype("float64")
+    with np.errstate(divide="ignore"):
+        lz_hi = 31 - np.floor(np.log2(hi))
+        lz_lo = 63 - np.floor(np.log2(lo))
+    return np.where(hi > 0, lz_hi, np.where(lo > 0, lz_lo, 64)).astype("int64")
+
+
+def _cms_hash_key(linha: int) -> str:
+    return f"cms{linha:013d}"
+
+
+def cms_columns(codes: pd.Series) -> np.ndarray:
+    """(CMS_PROFUNDIDADE, codes) counter column of each code in each row."""
+    return np.stack(
+        [
+            (_text_hash(codes, _cms_hash_key(linha)) % np.uint64(CMS_LARGURA)).astype("int64")
+            for linha in range(CMS_PROFUNDIDADE)
+        ]
+    )
+
+
+def dds_bucket(values: np.ndarray) -> np.ndarray:
+    """Log bucket ceil(log_gamma(x)) for x > 0, BUCKET_ZERO for 0."""
+    with np.errstate(divide="ignore"):
+        bucket = np.ceil(np.log(np.where(values > 0, values, 1.0)) / np.log(DDS_GAMMA))
+    return np.where(values > 0, bucket, BUCKET_ZERO).astype("int64")
+
+
+def dds_value(bucket: np.ndarray) -> np.ndarray:
+    """Representative value of a bucket (within DDS_ALPHA of every value in it)."""
+    return np.where(bucket == BUCKET_ZERO, 0.0, 2.0 * DDS_GAMMA ** bucket.astype("float64") / (DDS_GAMMA + 1.0))
+
+
+@instrumented()
+def build_sketches(
+    fato_servicos: pd.DataFrame,
+    dims: dict[str, pd.DataFrame],
+) -> dict[str, pd.DataFrame]:
+    """Sparse sketch tables per (sigagente, ano) from the keyed service fact."""
+    agente = dims["dim_agente"].set_index("id_agente")["sigagente"]
+    municipio = dims["dim_municipio"].set_index("id_municipio")["codmunicipioibge"]
+    tipo = dims["dim_tipo_servico"].set_index("id_tipo_servico")["codtiposervico"]
+
+    chaves = ["ano", "mes", "id_agente", "id_municipio", "id_tipo_servico"]
+    base = fato_servicos.groupby(chaves, as_index=False, observed=True)[["qtd_serv_realizado", "qtd_fora_prazo"]].sum()
+    base["sigagente"] = base["id_agente"].map(agente).astype("string")
+    base = base.dropna(subset=["sigagente"])
+    base["ano"] = base["ano"].astype("int64")
+
+    # HyperLogLog: top HLL_P bits pick the register, rho = leading zeros of the rest + 1.
+    municipios = base.drop_duplicates(["sigagente", "ano", "id_municipio"])
+    h = _text_hash(municipios["id_municipio"].map(municipio))
+    registro = (h >> np.uint64(64 - HLL_P)).astype("int64")
+    resto = h << np.uint64(HLL_P)
+    rho = np.minimum(_leading_zeros(resto), 64 - HLL_P) + 1
+    hll = municipios[SKETCH_CELULA].assign(registro=registro, rho=rho)
+    hll = hll.groupby([*SKETCH_CELULA, "registro"], as_index=False)["rho"].max()
+
+    # Quantiles: one count per (cell, code, log bucket) of the municipality-month rate.
+    servicos = base["qtd_serv_realizado"].to_numpy(dtype="float64")
+    com_servico = servicos > 0
+    taxa = base["qtd_fora_prazo"].to_numpy(dtype="float64")[com_servico] / servicos[com_servico]
+    quantis = base.loc[com_servico, SKETCH_CELULA].assign(
+        codtiposervico=base.loc[com_servico, "id_tipo_servico"].map(tipo).astype("string").str.strip(),
+        bucket=dds_bucket(taxa),
+    )
+    quantis = quantis.groupby([*SKETCH_CELULA, "codtiposervico", "bucket"], as_index=False).size()
+    quantis = quantis.rename(columns={"size": "contagem"})
+
+    # Count-min: service volume per code, CMS_PROFUNDIDADE hashed rows.
+    por_codigo = base.assign(codtiposervico=base["id_tipo_servico"].map(tipo)).groupby(
+        [*SKETCH_CELULA, "codtiposervico"], as_index=False, observed=True
+    )["qtd_serv_realizado"].sum()
+    colunas = cms_columns(por_codigo["codtiposervico"])
+    cms = pd.concat(
+        [por_codigo[SKETCH_CELULA].assign(linha=linha, coluna=colunas[linha]) for linha in range(CMS_PROFUNDIDADE)],
+        ignore_index=True,
+    )
+    cms["contagem"] = np.tile(por_codigo["qtd_serv_realizado"].to_numpy(dtype="int64"), CMS_PROFUNDIDADE)
+    cms = cms.groupby([*SKETCH_CELULA, "linha", "coluna"], as_index=False)["contagem"].sum()
+
+    return {"distintos": hll, "quantis": quantis, "frequentes": cms}
+
+
+@instrumented()
+def write_sketches(sketches: dict[str, pd.DataFrame], directory: Path = SKETCH_DIR) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    for kind, frame in sketches.items():
+        write_parquet(frame, directory / SKETCHES[kind][0])
+    return directory
+
+
+def read_sketch(
+    kind: str,
+    sigagentes: list[str] | None = None,
+    anos: list[int] | None = None,
+    directory: Path = SKETCH_DIR,
+) -> pd.DataFrame:
+    """Filtered read of one sketch table."""
+    if kind not in SKETCHES:
+        raise ValueError(f"Unknown sketch: {kind} (expected one of {', '.join(SKETCHES)})")
+    path = directory / SKETCHES[kind][0]
+    if not path.exists():
+        raise FileNotFoundError(f"Missing sketch: {path}")
+    filters = []
+    if sigagentes:
+        filters.append(("sigagente", "in", list(sigagentes)))
+    if anos:
+        filters.append(("ano", "in", [int(ano) for ano in anos]))
+    return pd.read_parquet(path, filters=filters or None)
+
+
+def merge_sketch(kind: str, frame: pd.DataFrame, by: list[str] | None = None) -> pd.DataFrame:
+    """Merge the cells of a sketch table down to `by` (default: everything in one group)."""
+    _, chaves, valor, reducao = SKETCHES[kind]
+    grouped = frame.groupby([*(by or []), *chaves], as_index=False, observed=True)[valor]
+    return grouped.max() if reducao == "max" else grouped.sum()
+
+
+def _groups(frame: pd.DataFrame, by: list[str]) -> tuple[np.ndarray, pd.DataFrame]:
+    """Group position of every row and the group keys (in position order)."""
+    if not by:
+        return np.zeros(len(frame), dtype="int64"), pd.DataFrame(index=[0])
+    pos = frame.groupby(by, observed=True, sort=False).ngroup().to_numpy(dtype="int64")
+    first = np.unique(pos, return_index=True)[1]
+    return pos, frame.iloc[first][by].reset_index(drop=True)
+
+
+def estimate_distinct(hll: pd.DataFrame, by: list[str] | None = None) -> pd.DataFrame:
+    """Distinct municipalities per `by` group from the merged registers."""
+    by = list(by or [])
+    merged = merge_sketch("distintos", hll, by)
+    pos, out = _groups(merged, by)
+    m = 2**HLL_P
+    alpha = 0.7213 / (1.0 + 1.079 / m)
+    soma = np.bincount(pos, weights=np.exp2(-merged["rho"].to_numpy(dtype="float64")), minlength=len(out))
+    vazios = m - np.bincount(pos, minlength=len(out)).astype("float64")
+    bruto = alpha * m * m / (soma + vazios)
+    # Small range: linear counting on the empty registers.
+    linear = m * np.log(m / np.maximum(vazios, 1.0))
+    out["distintos_estimados"] = np.where((bruto <= 2.5 * m) & (vazios > 0), linear, bruto)
+    out["erro_padrao_relativo"] = 1.04 / np.sqrt(m)
+    return out
+
+
+def estimate_quantiles(
+    quantis: pd.DataFrame,
+    probabilidades: list[float],
+    by: list[str] | None = None,
+) -> pd.DataFrame:
+    """taxa_fora_prazo quantiles per `by` group (one row per group and probability)."""
+    by = list(by or [])
+    merged = merge_sketch("quantis", quantis, by).sort_values([*by, "bucket"]).reset_index(drop=True)
+    probs = np.asarray(probabilidades, dtype="float64")
+    if merged.empty:
+        return pd.DataFrame(columns=[*by, "probabilidade", "taxa_fora_prazo", "n", "erro_relativo"])
+    pos, chaves = _groups(merged, by)
+    contagem = merged["contagem"].to_numpy(dtype="float64")
+    acumulado = np.cumsum(contagem)
+    n = np.bincount(pos, weights=contagem, minlength=len(chaves))
+    inicio = np.concatenate([[0.0], np.cumsum(n)[:-1]])
+    # Rows are sorted by group, so each group's cumulative counts form one block.
+    rank = inicio[:, None] + probs[None, :] * (n[:, None] - 1)
+    linha = np.minimum(np.searchsorted(acumulado, rank.ravel(), side="right"), len(merged) - 1)
+
+    out = chaves.loc[np.repeat(np.arange(len(chaves)), len(probs))].reset_index(drop=True)
+    out["probabilidade"] = np.tile(probs, len(chaves))
+    out["taxa_fora_prazo"] = dds_value(merged["bucket"].to_numpy(dtype="int64")[linha])
+    out["n"] = np.repeat(n, len(probs)).astype("int64")
+    out["erro_relativo"] = DDS_ALPHA
+    return out
+
+
+def estimate_heavy_hitters(
+    cms: pd.DataFrame,
+    codigos: pd.Series,
+    top: int = 10,
+    by: list[str] | None = None,
+) -> pd.DataFrame:
+    """Top `top` candidate codes by estimated qtd_serv_realizado per `by` group."""
+    by = list(by or [])
+    merged = merge_sketch("frequentes", cms, by)
+    if merged.empty:
+        return pd.DataFrame(columns=[*by, "codtiposervico", "qtd_serv_estimada", "erro_maximo", "confianca"])
+    pos, chaves = _groups(merged, by)
+    tabela = np.zeros((len(chaves), CMS_PROFUNDIDADE, CMS_LARGURA), dtype="int64")
+    tabela[pos, merged["linha"].to_numpy(dtype="int64"), merged["coluna"].to_numpy(dtype="int64")] = merged[
+        "contagem"
+    ].to_numpy(dtype="int64")
+    codigos = pd.Series(codigos.astype("string").str.strip().dropna().unique())
+    estimativa = tabela[:, np.arange(CMS_PROFUNDIDADE)[:, None], cms_columns(codigos)].min(axis=1)
+    total = tabela[:, 0, :].sum(axis=1)
+
+    ordem = np.argsort(-estimativa, axis=1, kind="stable")[:, :top]
+    g = np.repeat(np.arange(len(chaves)), ordem.shape[1])
+    out = chaves.loc[g].reset_index(drop=True)
+    out["codtiposervico"] = codigos.to_numpy(dtype=object)[ordem.ravel()]
+    out["qtd_serv_estimada"] = estimativa[g, ordem.ravel()]
+    out["erro_maximo"] = np.e / CMS_LARGURA * total[g]
+    out["confianca"] = 1.0 - np.exp(-CMS_PROFUNDIDADE)
+    return out[out["qtd_serv_estimada"] > 0].reset_index(drop=True)
+
+
+def query_sketch(
+    kind: str,
+    sigagentes: list[str] | None = None,
+    anos: list[int] | None = None,
+    by: list[str] | None = None,
+    probabilidades: list[float] | None = None,
+    top: int = 10,
+    directory: Path = SKETCH_DIR,
+) -> pd.DataFrame:
+    """Approximate answer for the selected agents/years, grouped by `by` (e.g. ["ano"])."""
+    frame = read_sketch(kind, sigagentes, anos, directory)
+    if kind == "distintos":
+        return estimate_distinct(frame, by)
+    if kind == "quantis":
+        return estimate_quantiles(frame, probabilidades or [0.1, 0.5, 0.9], by)
+    codigos = load_dimension("dim_tipo_servico", directory.parent)["codtiposervico"]
+    return estimate_heavy_hitters(frame, codigos, top, by)
@@ -0,0 +1,140 @@
+"""Conformed dimensions and integer surrogate keys for the service fact.
+
+`fato_servicos_municipio_mes` is stored as keys + additive measures; the
+descriptive strings live once in the dimensions below. Surrogate keys are
+assigned in sorted natural-key order (NaN last), so ordering by key is the
+same as ordering by the strings.
+
+    dim_agente        id_agente (int16)        sigagente, nomagente
+    dim_municipio     id_municipio (int32)     codmunicipioibge
+    dim_tipo_servico  id_tipo_servico (int16)  codtiposervico, dsctiposervico, classe_local_servico
+    dim_prazo         id_prazo (int16)         dscprazo
+
+Consumers that need the human-readable table use `join_dimensions` (in
+memory) or `load_fato_servicos_view` (from Parquet, reading only the
+dimensions the requested columns need).
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.dtypes import apply_dtype_policy
+from src.analysis.metrics import add_metrics
+from src.analysis.scenarios import ano_comparavel, periodo_regulatorio
+from src.etl.instrumentation import instrumented
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+DIR_ANALYSIS = ROOT / "data" / "processed" / "analysis"
+
+# dimension -> (surrogate key, natural key columns, key dtype)
+DIMENSOES: dict[str, tuple[str, list[str], str]] = {
+    "dim_agente": ("id_agente", ["sigagente", "nomagente"], "int16"),
+    "dim_municipio": ("id_municipio", ["codmunicipioibge"], "int32"),
+    "dim_tipo_servico": ("id_tipo_servico", ["codtiposervico", "dsctiposervico"], "int16"),
+    "dim_prazo": ("id_prazo", ["dscprazo"], "int16"),
+}
+# Attributes derived from the natural key (filled by the builder).
+ATRIBUTOS_DIMENSAO: dict[str, list[str]] = {"dim_tipo_servico": ["classe_local_servico"]}
+
+FATO_SERVICOS_CHAVES = ["ano", "mes", "id_agente", "id_municipio", "id_tipo_servico", "id_prazo"]
+FATO_SERVICOS_MEDIDAS = ["qtd_serv_realizado", "qtd_fora_prazo", "compensacao_rs"]
+FATO_SERVICOS_DERIVADAS = ["taxa_fora_prazo", "periodo_regulatorio", "ano_comparavel_principal"]
+# Column order of the human-readable view (the pre-star layout).
+FATO_SERVICOS_VIEW = [
+    "ano",
+    "mes",
+    "sigagente",
+    "nomagente",
+    "codmunicipioibge",
+    "codtiposervico",
+    "dsctiposervico",
+    "dscprazo",
+    "classe_local_servico",
+    *FATO_SERVICOS_MEDIDAS,
+    *FATO_SERVICOS_DERIVADAS,
+]
+
+
+def encode_dimension(frame: pd.DataFrame, dimension: str) -> tuple[np.ndarray, pd.DataFrame]:
+    """Surrogate key per row and the dimension table (key + natural columns)."""
+    key, columns, dtype = DIMENSOES[dimension]
+    codes = []
+    uniques = []
+    for column in columns:
+        col_codes, col_uniques = pd.factorize(frame[column], sort=True, use_na_sentinel=False)
+        codes.append(col_codes)
+        uniques.append(col_uniques)
+
+    shape = [max(len(values), 1) for values in uniques]
+    ids, combos = pd.factorize(np.ravel_multi_index(codes, shape), sort=True)
+    if len(combos) > np.iinfo(dtype).max:
+        raise ValueError(f"{dimension}: {len(combos):,} members do not fit {dtype}")
+
+    combo_codes = np.unravel_index(combos, shape)
+    dim = pd.DataFrame({key: np.arange(len(combos), dtype=dtype)})
+    for column, values, column_codes in zip(columns, uniques, combo_codes):
+        dim[column] = values.take(column_codes)
+    return ids.astype(dtype), dim
+
+
+def add_derived_columns(fact: pd.DataFrame) -> pd.DataFrame:
+    """Ratios and period flags that are not stored in the keyed fact."""
+    add_metrics(fact, ["taxa_fora_prazo"])
+    fact["periodo_regulatorio"] = periodo_regulatorio(fact["ano"])
+    fact["ano_comparavel_principal"] = ano_comparavel(fact["ano"], "mensal")
+    return fact
+
+
+def dimensions_for(columns: list[str]) -> list[str]:
+    """Dimensions whose natural columns are requested."""
+    wanted = set(columns)
+    return [
+        name
+        for name, (_, natural, _) in DIMENSOES.items()
+        if wanted & {*natural, *ATRIBUTOS_DIMENSAO.get(name, [])}
+    ]
+
+
+def join_dimensions(
+    fact: pd.DataFrame,
+    dims: dict[str, pd.DataFrame],
+    columns: list[str] | None = None,
+) -> pd.DataFrame:
+    """Human-readable view of a keyed fact; `columns` limits the joins done."""
+    columns = columns or FATO_SERVICOS_VIEW
+    view = fact
+    for name in dimensions_for(columns):
+        key = DIMENSOES[name][0]
+        if key in view.columns:
+            view = view.merge(dims[name], on=key, how="left", sort=False)
+    if set(FATO_SERVICOS_DERIVADAS) & set(columns):
+        view = add_derived_columns(view.copy())
+    return view[[column for column in columns if column in view.columns]]
+
+
+def load_dimension(name: str, directory: Path = DIR_ANALYSIS) -> pd.DataFrame:
+    path = directory / f"{name}.parquet"
+    if not path.exists():
+        raise FileNotFoundError(f"Missing dimension table: {path}")
+    return apply_dtype_policy(pd.read_parquet(path))
+
+
+@instrumented()
+def load_fato_servicos_view(columns: list[str] | None = None, directory: Path = DIR_ANALYSIS) -> pd.DataFrame:
+    """Read fato_servicos_municipio_mes with dimension columns joined back."""
+    path = directory / "fato_servicos_municipio_mes.parquet"
+    if not path.exists():
+        raise FileNotFoundError(f"Missing analysis table: {path}")
+
+    columns = columns or FATO_SERVICOS_VIEW
+    dims = {name: load_dimension(name, directory) for name in dimensions_for(columns)}
+    fact_columns = [column for column in columns if column in FATO_SERVICOS_CHAVES + FATO_SERVICOS_MEDIDAS]
+    fact_columns += [DIMENSOES[name][0] for name in dims]
+    if set(FATO_SERVICOS_DERIVADAS) & set(columns):
+        fact_columns += ["ano", *FATO_SERVICOS_MEDIDAS]
+    fact = pd.read_parquet(path, columns=list(dict.fromkeys(fact_columns)))
+    return apply_dtype_policy(join_dimensions(fact, dims, columns))
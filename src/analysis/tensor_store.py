@@ -0,0 +1,150 @@
+"""Dense distributor x month x metric tensor, memory-mapped.
+
+`build_analysis_tables` writes the monthly distributor table a second time as
+one float64 array of shape (agents, months, metrics) plus three index files:
+
+    tensor_distribuidora_mes/valores.npy    values, NaN where there is no row
+    tensor_distribuidora_mes/agentes.csv    posicao, sigagente, nomagente
+    tensor_distribuidora_mes/meses.csv      posicao, ano, mes (contiguous, no gaps)
+    tensor_distribuidora_mes/metricas.csv   posicao, metrica
+
+Months are contiguous, so positional operations (diff, rolling windows,
+seasonal lags) on an agent's slice need no sort or groupby. `open_tensor`
+maps the array read-only; `agent_slice` is a zero-copy view of one
+distributor's history and `agent_history` wraps it in a frame.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.metrics import add_metrics
+from src.etl.instrumentation import instrumented
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+DIR_ANALYSIS = ROOT / "data" / "processed" / "analysis"
+TENSOR_DIR = DIR_ANALYSIS / "tensor_distribuidora_mes"
+TENSOR_FILES = ("valores.npy", "agentes.csv", "meses.csv", "metricas.csv")
+
+TENSOR_MEASURES = ["qtd_serv_realizado", "qtd_fora_prazo", "compensacao_rs", "uc_ativa_mes"]
+TENSOR_RATIOS = [
+    "taxa_fora_prazo",
+    "fora_prazo_por_100k_uc_mes",
+    "compensacao_rs_por_uc_mes",
+    "compensacao_media_por_transgressao_rs",
+]
+TENSOR_METRICS = [*TENSOR_MEASURES, *TENSOR_RATIOS]
+
+
+def month_index(ano: pd.Series, mes: pd.Series) -> np.ndarray:
+    """Months since year 0 (ano * 12 + mes - 1)."""
+    return ano.to_numpy(dtype="int64") * 12 + mes.to_numpy(dtype="int64") - 1
+
+
+@instrumented()
+def build_tensor(
+    fato_transgressao_mensal_distribuidora: pd.DataFrame,
+) -> tuple[np.ndarray, pd.DataFrame, pd.DataFrame, list[str]]:
+    """(values, agentes, meses, metricas) from the monthly distributor table."""
+    mensal = fato_transgressao_mensal_distribuidora.dropna(subset=["sigagente", "ano", "mes"])
+    # One cell per (agent, month): a code reported under two names is summed.
+    grouped = mensal.groupby(["sigagente", "ano", "mes"], as_index=False, sort=False).agg(
+        nomagente=("nomagente", "first"),
+        qtd_serv_realizado=("qtd_serv_realizado", "sum"),
+        qtd_fora_prazo=("qtd_fora_prazo", "sum"),
+        compensacao_rs=("compensacao_rs", "sum"),
+        uc_ativa_mes=("uc_ativa_mes", "max"),
+    )
+    add_metrics(grouped, TENSOR_RATIOS)
+
+    agentes = (
+        grouped[["sigagente", "nomagente"]]
+        .drop_duplicates("sigagente")
+        .astype("string")
+        .sort_values("sigagente")
+        .reset_index(drop=True)
+    )
+    periodos = month_index(grouped["ano"], grouped["mes"])
+    first = int(periodos.min()) if len(periodos) else 0
+    n_months = int(periodos.max()) - first + 1 if len(periodos) else 0
+    todos = np.arange(first, first + n_months)
+    meses = pd.DataFrame({"ano": todos // 12, "mes": todos % 12 + 1})
+
+    values = np.full((len(agentes), n_months, len(TENSOR_METRICS)), np.nan)
+    agent_pos = pd.Index(agentes["sigagente"]).get_indexer(grouped["sigagente"].astype("string"))
+    values[agent_pos, periodos - first, :] = grouped[TENSOR_METRICS].to_numpy(dtype="float64", na_value=np.nan)
+    return values, agentes, meses, list(TENSOR_METRICS)
+
+
+def write_index(frame: pd.DataFrame, path: Path) -> None:
+    """Write `frame` as a CSV index file with a leading `posicao` column (0..n-1)."""
+    frame = frame.reset_index(drop=True)
+    frame.insert(0, "posicao", np.arange(len(frame)))
+    frame.to_csv(path, index=False)
+
+
+@instrumented()
+def write_tensor(
+    values: np.ndarray,
+    agentes: pd.DataFrame,
+    meses: pd.DataFrame,
+    metricas: list[str],
+    directory: Path = TENSOR_DIR,
+) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    np.save(directory / "valores.npy", np.ascontiguousarray(values, dtype="float64"))
+    write_index(agentes, directory / "agentes.csv")
+    write_index(meses, directory / "meses.csv")
+    write_index(pd.DataFrame({"metrica": metricas}), directory / "metricas.csv")
+    return directory
+
+
+def open_tensor(directory: Path = TENSOR_DIR) -> tuple[np.ndarray, pd.DataFrame, pd.DataFrame, list[str]]:
+    """Read-only memory map of the tensor plus its index files."""
+    missing = [name for name in TENSOR_FILES if not (directory / name).exists()]
+    if missing:
+        raise FileNotFoundError(f"Missing tensor files in {directory}: {', '.join(missing)}")
+    values = np.load(directory / "valores.npy", mmap_mode="r")
+    agentes = pd.read_csv(directory / "agentes.csv", dtype={"sigagente": "string", "nomagente": "string"})
+    meses = pd.read_csv(directory / "meses.csv")
+    metricas = pd.read_csv(directory / "metricas.csv")["metrica"].tolist()
+    if values.shape != (len(agentes), len(meses), len(metricas)):
+        raise ValueError(
+            f"Tensor shape {values.shape} does not match index files "
+            f"({len(agentes)} agents, {len(meses)} months, {len(metricas)} metrics)"
+        )
+    return values, agentes.drop(columns="posicao"), meses.drop(columns="posicao"), metricas
+
+
+def agent_position(agentes: pd.DataFrame, sigagente: str) -> int:
+    positions = pd.Index(agentes["sigagente"])
+    if sigagente not in positions:
+        raise KeyError(f"Unknown distributor: {sigagente}")
+    return int(positions.get_loc(sigagente))
+
+
+def agent_slice(values: np.ndarray, agentes: pd.DataFrame, sigagente: str) -> np.ndarray:
+    """(months, metrics) view of one distributor; no copy from the memory map."""
+    return values[agent_position(agentes, sigagente)]
+
+
+def agent_history(
+    sigagente: str,
+    metrics: list[str] | None = None,
+    directory: Path = TENSOR_DIR,
+    dropna: bool = True,
+) -> pd.DataFrame:
+    """One distributor's monthly series as a frame (ano, mes, metrics)."""
+    values, agentes, meses, metricas = open_tensor(directory)
+    metrics = metrics or metricas
+    unknown = sorted(set(metrics) - set(metricas))
+    if unknown:
+        raise KeyError(f"Unknown tensor metrics: {', '.join(unknown)}")
+    block = agent_slice(values, agentes, sigagente)[:, [metricas.index(name) for name in metrics]]
+    frame = pd.concat([meses, pd.DataFrame(block, columns=metrics)], axis=1)
+    if dropna:
+        frame = frame[~np.isnan(block).all(axis=1)].reset_index(drop=True)
+    return frame
@@ -0,0 +1,104 @@
+"""Year-over-year trend engine.
+
+`build_trends` lays an annual table out once as an entity x year x metric
+array and reads every requested comparison from it:
+
+    windows=[(2023, 2025), ...]   base year vs final year (NaN when absent)
+    first_last=True               first vs last year with a row, per entity
+
+The result is long: one row per (entity, janela, metrica) with ano_base,
+ano_final, valor_base, valor_final, delta_abs and delta_pct (NaN when the
+base is 0 or either value is missing). Reports filter it or pivot it with
+`trends_wide`.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+import numpy as np
+import pandas as pd
+
+from src.etl.instrumentation import instrumented
+
+JANELA_PRIMEIRO_ULTIMO = "primeiro_ultimo"
+TREND_VALUES = ["ano_base", "ano_final", "valor_base", "valor_final", "delta_abs", "delta_pct"]
+
+
+def janela_label(base_year: int, last_year: int) -> str:
+    return f"{base_year}_{last_year}"
+
+
+def _pct(base: np.ndarray, final: np.ndarray) -> np.ndarray:
+    out = np.full(base.shape, np.nan)
+    np.divide(final, base, out=out, where=(base != 0) & ~np.isnan(base) & ~np.isnan(final))
+    return out - 1.0
+
+
+@instrumented()
+def build_trends(
+    annual: pd.DataFrame,
+    keys: list[str],
+    metrics: list[str],
+    windows: Iterable[tuple[int, int]] = (),
+    first_last: bool = False,
+) -> pd.DataFrame:
+    """Long trend table for every entity in `annual` (one row per entity and year)."""
+    entities = annual[keys].drop_duplicates().sort_values(keys).reset_index(drop=True)
+    codes = pd.MultiIndex.from_frame(entities).get_indexer(pd.MultiIndex.from_frame(annual[keys]))
+    anos = np.sort(annual["ano"].astype("int64").unique())
+    ano_pos = np.searchsorted(anos, annual["ano"].to_numpy(dtype="int64"))
+
+    n_entities, n_years = len(entities), len(anos)
+    values = np.full((n_entities, n_years, len(metrics)), np.nan)
+    values[codes, ano_pos] = annual[metrics].to_numpy(dtype="float64", na_value=np.nan)
+    present = np.zeros((n_entities, n_years), dtype=bool)
+    present[codes, ano_pos] = True
+
+    def at_year(year: int) -> np.ndarray:
+        pos = int(np.searchsorted(anos, year))
+        if pos < n_years and anos[pos] == year:
+            return values[:, pos]
+        return np.full((n_entities, len(metrics)), np.nan)
+
+    blocks: list[tuple[str, np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+    for base_year, last_year in windows:
+        blocks.append(
+            (
+                janela_label(base_year, last_year),
+                np.full(n_entities, base_year),
+                np.full(n_entities, last_year),
+                at_year(base_year),
+                at_year(last_year),
+            )
+        )
+    if first_last and n_years:
+        first = present.argmax(axis=1)
+        last = n_years - 1 - present[:, ::-1].argmax(axis=1)
+        rows = np.arange(n_entities)
+        blocks.append((JANELA_PRIMEIRO_ULTIMO, anos[first], anos[last], values[rows, first], values[rows, last]))
+
+    frames = []
+    n_metrics = len(metrics)
+    for janela, ano_base, ano_final, base, final in blocks:
+        frame = entities.loc[entities.index.repeat(n_metrics)].reset_index(drop=True)
+        frame["janela"] = janela
+        frame["metrica"] = np.tile(metrics, n_entities)
+        frame["ano_base"] = np.repeat(ano_base, n_metrics)
+        frame["ano_final"] = np.repeat(ano_final, n_metrics)
+        frame["valor_base"] = base.ravel()
+        frame["valor_final"] = final.ravel()
+        frame["delta_abs"] = (final - base).ravel()
+        frame["delta_pct"] = _pct(base, final).ravel()
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=[*keys, "janela", "metrica", *TREND_VALUES])
+    return pd.concat(frames, ignore_index=True)
+
+
+def trends_wide(trends: pd.DataFrame, keys: list[str], janela: str) -> pd.DataFrame:
+    """Entity-indexed frame with (value, metric) columns for a single window."""
+    subset = trends[trends["janela"] == janela]
+    metrics = list(dict.fromkeys(subset["metrica"]))
+    wide = subset.pivot(index=keys, columns="metrica", values=TREND_VALUES)
+    return wide.reindex(columns=pd.MultiIndex.from_product([TREND_VALUES, metrics]))
@@ -11,6 +11,10 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
+from src.analysis.sketches import SKETCH_DIR, SKETCHES, query_sketch
+from src.analysis.tensor_store import TENSOR_DIR, agent_history
+from src.etl.catalog import CATALOG_PATH, load_catalog
+
 ROOT = Path(__file__).resolve().parent.parent.parent
 DASHBOARD_DIR = ROOT / "dashboard"
 DASHBOARD_JSON_PATH = DASHBOARD_DIR / "dashboard_data.json"
@@ -32,7 +36,9 @@ REQUIRED_JSON_KEYS = {
 
 REQUIRED_INPUTS = [
     ANALYSIS_DIR / "kpi_regulatorio_anual.csv",
+    ANALYSIS_DIR / "kpi_bootstrap_ic.csv",
     ANALYSIS_DIR / "fato_transgressao_mensal_distribuidora.csv",
+    ANALYSIS_DIR / "painel_comparavel.csv",
     NEO_DIR / "neo_anual_2023_2025.csv",
     NEO_DIR / "neo_tendencia_2023_2025.csv",
     NEO_DIR / "neo_benchmark_porte_latest.csv",
@@ -136,4 +142,81 @@ def api_artifacts() -> dict[str, Any]:
     return _artifact_status()
 
 
+@app.get("/api/catalog")
+def api_catalog() -> dict[str, Any]:
+    if not CATALOG_PATH.exists():
+        raise HTTPException(
+            status_code=503,
+            detail="catalog.json not found. Run `make catalog` first.",
+        )
+    return load_catalog()
+
+
+@app.get("/api/catalog/{table}")
+def api_catalog_table(table: str) -> dict[str, Any]:
+    tables = api_catalog().get("tables", {})
+    if table not in tables:
+        raise HTTPException(status_code=404, detail=f"Table not found in catalog: {table}")
+    return {"table": table, **tables[table]}
+
+
+@app.get("/api/series/{sigagente}")
+def api_series(sigagente: str, metricas: str | None = None) -> dict[str, Any]:
+    metrics = [name.strip() for name in metricas.split(",") if name.strip()] if metricas else None
+    try:
+        history = agent_history(sigagente, metrics)
+    except FileNotFoundError as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=f"{exc}. Run `make analysis` first.",
+        ) from exc
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc.args[0])) from exc
+    history = history.astype(object).where(history.notna(), None)
+    return {
+        "sigagente": sigagente,
+        "source": str(TENSOR_DIR.relative_to(ROOT)),
+        "data": history.to_dict(orient="records"),
+    }
+
+
+@app.get("/api/sketches/{tipo}")
+def api_sketches(
+    tipo: str,
+    sigagentes: str | None = None,
+    anos: str | None = None,
+    por: str | None = None,
+    quantis: str | None = None,
+    top: int = 10,
+) -> dict[str, Any]:
+    if tipo not in SKETCHES:
+        raise HTTPException(status_code=404, detail=f"Unknown sketch: {tipo} (expected one of {', '.join(SKETCHES)})")
+
+    def split(text: str | None) -> list[str]:
+        return [item.strip() for item in text.split(",") if item.strip()] if text else []
+
+    try:
+        result = query_sketch(
+            tipo,
+            sigagentes=split(sigagentes) or None,
+            anos=[int(ano) for ano in split(anos)] or None,
+            by=split(por),
+            probabilidades=[float(q) for q in split(quantis)] or None,
+            top=top,
+        )
+    except FileNotFoundError as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=f"{exc}. Run `python -m src.analysis.build_analysis_tables --sketches` first.",
+        ) from exc
+    except (KeyError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    result = result.astype(object).where(result.notna(), None)
+    return {
+        "tipo": tipo,
+        "source": str(SKETCH_DIR.relative_to(ROOT)),
+        "data": result.to_dict(orient="records"),
+    }
+
+
 app.mount("/", StaticFiles(directory=str(DASHBOARD_DIR), html=True), name="dashboard")
@@ -0,0 +1,273 @@
+"""Metadata-only data-quality catalog built from Parquet footers.
+
+For every processed and analysis Parquet file the catalog records row count,
+per-column null count, min and max (read from the footer statistics), the
+year range and the number of distinct agents per year. Footer statistics
+cover most of it; a single streamed batch scan over a few columns is only
+done for (year, agent) pairs, which footers never hold, and for columns whose
+statistics are missing.
+
+Entries are reused while the file's size and mtime are unchanged, so a
+rebuild after one table changes only reads that table.
+
+Usage:
+    python -m src.etl.catalog
+    python -m src.etl.catalog --rebuild
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+from decimal import Decimal
+from pathlib import Path
+from typing import Any
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import parquet as pq
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+DIR_PROCESSED = ROOT / "data" / "processed"
+DIR_ANALYSIS = DIR_PROCESSED / "analysis"
+CATALOG_PATH = DIR_PROCESSED / "catalog.json"
+
+CATALOG_VERSION = 1
+AGENT_COLUMN = "sigagente"
+# Year source per table; tables not listed use `ano` when present.
+YEAR_COLUMNS: dict[str, str] = {
+    "qualidade_comercial": "anoindice",
+    "indger_servicos_comerciais": "datreferenciainformada",
+    "indger_dados_comerciais": "datreferenciainformada",
+}
+SCAN_BATCH_SIZE = 256_000
+
+
+def _json_value(value: Any) -> Any:
+    """Footer statistics come as Python/bytes/date objects; make them JSON-safe."""
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, (dt.date, dt.datetime, dt.time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _merge_min(current: Any, value: Any) -> Any:
+    if value is None:
+        return current
+    return value if current is None or value < current else current
+
+
+def _merge_max(current: Any, value: Any) -> Any:
+    if value is None:
+        return current
+    return value if current is None or value > current else current
+
+
+def footer_column_stats(parquet_file: pq.ParquetFile) -> tuple[dict[str, dict[str, Any]], list[str]]:
+    """Merge row-group statistics per column; return (stats, columns lacking stats)."""
+    metadata = parquet_file.metadata
+    schema = parquet_file.schema_arrow
+    stats: dict[str, dict[str, Any]] = {
+        name: {"type": str(schema.field(name).type), "null_count": 0, "min": None, "max": None}
+        for name in schema.names
+    }
+    missing: set[str] = set()
+
+    for rg_index in range(metadata.num_row_groups):
+        row_group = metadata.row_group(rg_index)
+        for col_index in range(row_group.num_columns):
+            chunk = row_group.column(col_index)
+            name = chunk.path_in_schema.split(".")[0]
+            if name not in stats:
+                continue
+            chunk_stats = chunk.statistics
+            if chunk_stats is None or not chunk_stats.has_null_count:
+                missing.add(name)
+                continue
+            stats[name]["null_count"] += chunk_stats.null_count
+            if chunk_stats.has_min_max:
+                stats[name]["min"] = _merge_min(stats[name]["min"], chunk_stats.min)
+                stats[name]["max"] = _merge_max(stats[name]["max"], chunk_stats.max)
+            elif chunk_stats.null_count < row_group.num_rows:
+                missing.add(name)
+
+    for name, entry in stats.items():
+        entry["stats_source"] = "scan" if name in missing else "footer"
+    return stats, sorted(missing)
+
+
+def _year_array(column: pa.ChunkedArray | pa.Array) -> pa.Array:
+    """Year as int from an int, timestamp/date or ISO-like string column."""
+    if pa.types.is_integer(column.type):
+        return column
+    if pa.types.is_timestamp(column.type) or pa.types.is_date(column.type):
+        return pc.year(column)
+    if pa.types.is_floating(column.type):
+        return pc.cast(pc.floor(column), pa.int64())
+    text = pc.utf8_trim_whitespace(pc.cast(column, pa.string()))
+    year_text = pc.utf8_slice_codeunits(text, 0, 4)
+    valid = pc.match_substring_regex(year_text, r"^\d{4}$")
+    return pc.cast(pc.if_else(valid, year_text, pa.scalar(None, pa.string())), pa.int64())
+
+
+def scan_table(
+    parquet_file: pq.ParquetFile,
+    stat_columns: list[str],
+    year_column: str | None,
+    agent_column: str | None,
+) -> tuple[dict[str, dict[str, Any]], dict[int, set[str]]]:
+    """One streamed pass over the columns that the footer cannot answer."""
+    columns = list(dict.fromkeys([*stat_columns, *(c for c in (year_column, agent_column) if c)]))
+    stats: dict[str, dict[str, Any]] = {
+        name: {"null_count": 0, "min": None, "max": None} for name in stat_columns
+    }
+    agents_by_year: dict[int, set[str]] = {}
+    if not columns:
+        return stats, agents_by_year
+
+    for batch in parquet_file.iter_batches(batch_size=SCAN_BATCH_SIZE, columns=columns, use_threads=True):
+        for name in stat_columns:
+            array = batch.column(name)
+            stats[name]["null_count"] += array.null_count
+            if pa.types.is_nested(array.type) or array.null_count == len(array):
+                continue
+            bounds = pc.min_max(array)
+            stats[name]["min"] = _merge_min(stats[name]["min"], bounds["min"].as_py())
+            stats[name]["max"] = _merge_max(stats[name]["max"], bounds["max"].as_py())
+
+        if year_column and agent_column:
+            pairs = pa.table(
+                {
+                    "ano": _year_array(batch.column(year_column)),
+                    "agente": pc.utf8_trim_whitespace(pc.cast(batch.column(agent_column), pa.string())),
+                }
+            )
+            distinct = pairs.group_by(["ano", "agente"]).aggregate([])
+            for ano, agente in zip(distinct.column("ano").to_pylist(), distinct.column("agente").to_pylist()):
+                if ano is not None and agente:
+                    agents_by_year.setdefault(int(ano), set()).add(agente)
+
+    return stats, agents_by_year
+
+
+def build_table_entry(path: Path) -> dict[str, Any]:
+    """Catalog entry for one Parquet file."""
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.metadata
+    columns, missing = footer_column_stats(parquet_file)
+
+    table_name = path.stem
+    year_column = YEAR_COLUMNS.get(table_name, "ano")
+    year_column = year_column if year_column in columns else None
+    agent_column = AGENT_COLUMN if AGENT_COLUMN in columns else None
+
+    scanned, agents_by_year = scan_table(
+        parquet_file,
+        missing,
+        year_column if agent_column else None,
+        agent_column if year_column else None,
+    )
+    for name, entry in scanned.items():
+        columns[name].update(entry)
+
+    ano_min = ano_max = None
+    if year_column:
+        year_stats = columns[year_column]
+        if agents_by_year:
+            ano_min, ano_max = min(agents_by_year), max(agents_by_year)
+        elif year_stats["min"] is not None:
+            bounds = _year_array(pa.array([year_stats["min"], year_stats["max"]])).to_pylist()
+            ano_min, ano_max = bounds
+
+    for entry in columns.values():
+        entry["min"] = _json_value(entry["min"])
+        entry["max"] = _json_value(entry["max"])
+
+    stat = path.stat()
+    return {
+        "path": str(path.relative_to(ROOT) if path.is_relative_to(ROOT) else path),
+        "size_bytes": stat.st_size,
+        "mtime": stat.st_mtime,
+        "num_rows": metadata.num_rows,
+        "num_row_groups": metadata.num_row_groups,
+        "year_column": year_column,
+        "ano_min": ano_min,
+        "ano_max": ano_max,
+        "agentes_por_ano": {str(ano): len(agents) for ano, agents in sorted(agents_by_year.items())},
+        "columns": columns,
+    }
+
+
+def load_catalog(path: Path = CATALOG_PATH) -> dict[str, Any]:
+    """Load catalog.json; empty catalog when missing or unreadable."""
+    try:
+        catalog = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {"version": CATALOG_VERSION, "tables": {}}
+    if catalog.get("version") != CATALOG_VERSION:
+        return {"version": CATALOG_VERSION, "tables": {}}
+    return catalog
+
+
+def build_catalog(
+    directories: list[Path] | None = None,
+    previous: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    """Catalog all Parquet files in the directories, reusing unchanged entries."""
+    directories = directories or [DIR_PROCESSED, DIR_ANALYSIS]
+    previous_tables = (previous or {}).get("tables", {})
+
+    tables: dict[str, Any] = {}
+    for directory in directories:
+        for path in sorted(directory.glob("*.parquet")):
+            stat = path.stat()
+            key = path.stem
+            old = previous_tables.get(key)
+            if old and old.get("size_bytes") == stat.st_size and old.get("mtime") == stat.st_mtime:
+                tables[key] = old
+            else:
+                tables[key] = build_table_entry(path)
+
+    return {
+        "version": CATALOG_VERSION,
+        "generated_at": dt.datetime.now().isoformat(timespec="seconds"),
+        "tables": tables,
+    }
+
+
+def write_catalog(catalog: dict[str, Any], path: Path = CATALOG_PATH) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(catalog, ensure_ascii=False, indent=2), encoding="utf-8")
+    return path
+
+
+def refresh_catalog(path: Path = CATALOG_PATH, rebuild: bool = False) -> dict[str, Any]:
+    """Rebuild stale entries and persist the catalog."""
+    previous = None if rebuild else load_catalog(path)
+    catalog = build_catalog(previous=previous)
+    write_catalog(catalog, path)
+    return catalog
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the Parquet metadata catalog")
+    parser.add_argument("--rebuild", action="store_true", help="ignore cached entries")
+    args = parser.parse_args()
+
+    catalog = refresh_catalog(rebuild=args.rebuild)
+    print(f"Catalog written: {CATALOG_PATH}")
+    for name, entry in catalog["tables"].items():
+        years = f"{entry['ano_min']}-{entry['ano_max']}" if entry["ano_min"] is not None else "-"
+        print(f"  - {name}: {entry['num_rows']:,} rows, anos {years}")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,7 @@ PAGINAÇÃO:
 ===============================================================================
 """
 
+import argparse
 import os
 import sys
 import zipfile
@@ -29,6 +30,7 @@ import requests
 from pathlib import Path
 from datetime import datetime
 
+from src.etl.instrumentation import configure_run, stage, write_run_report
 from src.etl.schema_contracts import validate_raw_contracts
 
 # ==============================================================================
@@ -194,19 +196,22 @@ def executar_extracao():
             caminho_arquivo = pasta_destino / recurso["nome"]
 
             # Baixa o arquivo
-            sucesso = baixar_arquivo(recurso["url"], caminho_arquivo)
+            with stage(f"baixar_arquivo:{recurso['nome']}"):
+                sucesso = baixar_arquivo(recurso["url"], caminho_arquivo)
 
             if sucesso:
                 total_sucesso += 1
 
                 # Se for ZIP, descompacta automaticamente na mesma pasta
                 if recurso["tipo"] == "zip":
-                    descompactar_zip(caminho_arquivo, pasta_destino)
+                    with stage(f"descompactar_zip:{recurso['nome']}"):
+                        descompactar_zip(caminho_arquivo, pasta_destino)
             else:
                 total_falha += 1
 
     if total_falha == 0:
-        erros_contrato = validate_raw_contracts(RAIZ_PROJETO / "data" / "raw")
+        with stage("validate_raw_contracts"):
+            erros_contrato = validate_raw_contracts(RAIZ_PROJETO / "data" / "raw")
         if erros_contrato:
             print("\n❌ Falha na validação de contratos dos dados brutos:")
             for erro in erros_contrato:
@@ -235,6 +240,20 @@ def executar_extracao():
 # PONTO DE ENTRADA
 # ==============================================================================
 
-if __name__ == "__main__":
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Baixa os dados abertos da ANEEL")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="salva estatísticas cProfile por etapa junto ao relatório de execução",
+    )
+    args = parser.parse_args()
+
+    configure_run("extract_aneel", profile=args.profile)
     sucesso = executar_extracao()
+    print(f"📈 Relatório de execução: {write_run_report()}")
     sys.exit(0 if sucesso else 1)
+
+
+if __name__ == "__main__":
+    main()
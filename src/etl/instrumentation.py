@@ -0,0 +1,226 @@
+"""Per-stage time, memory and I/O instrumentation for pipeline scripts.
+
+Each script calls `configure_run()` once, wraps its builders with
+`@instrumented()` (or blocks with `with stage(...)`) and calls
+`write_run_report()` at the end. The report is a JSON file in
+`data/processed/run_reports/` with one record per stage:
+
+    wall_s, cpu_s          wall-clock and process CPU time
+    peak_rss_mb            process RSS high-water mark at the end of the stage
+    rss_delta_mb           growth of the current RSS during the stage
+    rows_in, rows_out      rows of DataFrame arguments / return values
+    bytes_read, bytes_written   I/O syscalls volume (Linux /proc/self/io)
+
+With `profile=True` (the scripts' `--profile` flag) each outermost stage also
+dumps cProfile stats to `<report>_prof/<n>_<stage>.prof`.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import functools
+import json
+import os
+import platform
+import re
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+DIR_RUN_REPORTS = ROOT / "data" / "processed" / "run_reports"
+
+_RUN: dict[str, Any] = {
+    "name": None,
+    "profile": False,
+    "started_at": None,
+    "stages": [],
+}
+_STACK: list[dict[str, Any]] = []
+
+
+def configure_run(name: str, profile: bool = False) -> None:
+    """Start a new run report; previous stage records are discarded."""
+    _RUN["name"] = name
+    _RUN["profile"] = profile
+    _RUN["started_at"] = datetime.now()
+    _RUN["stages"] = []
+    _STACK.clear()
+
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux and bytes on macOS.
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return peak / divisor
+
+
+def _current_rss_mb() -> float | None:
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _io_counters() -> dict[str, int]:
+    counters: dict[str, int] = {}
+    try:
+        with open("/proc/self/io", encoding="ascii") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                counters[key.strip()] = int(value)
+    except (OSError, ValueError):
+        pass
+    return counters
+
+
+def count_rows(value: Any) -> int | None:
+    """Total rows of a DataFrame, or of the DataFrames inside a tuple/list/dict."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        counts = [count_rows(item) for item in value]
+        counts = [count for count in counts if count is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+def annotate_stage(**fields: Any) -> None:
+    """Set fields (e.g. rows_in, tabela) on the innermost active stage."""
+    if _STACK:
+        _STACK[-1].update(fields)
+
+
+def _delta(end: float | None, start: float | None) -> float | None:
+    if end is None or start is None:
+        return None
+    return round(end - start, 3)
+
+
+@contextmanager
+def stage(name: str, rows_in: int | None = None) -> Iterator[dict[str, Any]]:
+    """Measure a block; the yielded record accepts extra fields such as rows_out."""
+    record: dict[str, Any] = {
+        "stage": name,
+        "parent": _STACK[-1]["stage"] if _STACK else None,
+        "rows_in": rows_in,
+        "rows_out": None,
+    }
+    profiler = cProfile.Profile() if _RUN["profile"] and not _STACK else None
+
+    io_start = _io_counters()
+    rss_start = _current_rss_mb()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    record["started_at"] = datetime.now().isoformat(timespec="seconds")
+
+    _STACK.append(record)
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+        record["status"] = "ok"
+    except BaseException as exc:
+        record["status"] = f"error: {type(exc).__name__}"
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _STACK.pop()
+
+        io_end = _io_counters()
+        record["wall_s"] = round(time.perf_counter() - wall_start, 4)
+        record["cpu_s"] = round(time.process_time() - cpu_start, 4)
+        peak = _peak_rss_mb()
+        record["peak_rss_mb"] = round(peak, 1) if peak is not None else None
+        record["rss_delta_mb"] = _delta(_current_rss_mb(), rss_start)
+        record["bytes_read"] = (
+            io_end["rchar"] - io_start["rchar"] if "rchar" in io_start and "rchar" in io_end else None
+        )
+        record["bytes_written"] = (
+            io_end["wchar"] - io_start["wchar"] if "wchar" in io_start and "wchar" in io_end else None
+        )
+        if profiler is not None:
+            record["_profiler"] = profiler
+        _RUN["stages"].append(record)
+
+
+def instrumented(name: str | None = None) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator form of `stage`: rows_in from DataFrame args, rows_out from the result."""
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            rows_in = count_rows([*args, *kwargs.values()])
+            with stage(stage_name, rows_in=rows_in) as record:
+                result = func(*args, **kwargs)
+                if record.get("rows_out") is None:
+                    record["rows_out"] = count_rows(result)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def write_run_report(output_dir: Path | None = None) -> Path:
+    """Write the JSON run report (and cProfile dumps when enabled)."""
+    out_dir = output_dir or DIR_RUN_REPORTS
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    started = _RUN["started_at"] or datetime.now()
+    run_name = _RUN["name"] or Path(sys.argv[0]).stem
+    stem = f"{run_name}_{started.strftime('%Y%m%dT%H%M%S')}"
+    report_path = out_dir / f"{stem}.json"
+
+    stages: list[dict[str, Any]] = []
+    for index, record in enumerate(_RUN["stages"], start=1):
+        record = dict(record)
+        profiler = record.pop("_profiler", None)
+        if profiler is not None:
+            prof_dir = out_dir / f"{stem}_prof"
+            prof_dir.mkdir(parents=True, exist_ok=True)
+            safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", record["stage"])
+            prof_path = prof_dir / f"{index:03d}_{safe_name}.prof"
+            profiler.dump_stats(prof_path)
+            record["cprofile"] = str(prof_path.relative_to(ROOT) if prof_path.is_relative_to(ROOT) else prof_path)
+        stages.append(record)
+
+    top_level = [record for record in stages if record["parent"] is None]
+    peaks = [record["peak_rss_mb"] for record in stages if record["peak_rss_mb"] is not None]
+    payload = {
+        "run": run_name,
+        "started_at": started.isoformat(timespec="seconds"),
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "argv": sys.argv,
+        "python": platform.python_version(),
+        "pid": os.getpid(),
+        "profile": _RUN["profile"],
+        "totals": {
+            "stages": len(stages),
+            "wall_s": round(sum(record["wall_s"] for record in top_level), 4),
+            "cpu_s": round(sum(record["cpu_s"] for record in top_level), 4),
+            "peak_rss_mb": max(peaks) if peaks else None,
+        },
+        "stages": stages,
+    }
+    report_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    return report_path
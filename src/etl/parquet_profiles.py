@@ -0,0 +1,103 @@
+"""Configurable Parquet write profiles for processed and analysis artifacts.
+
+Every `to_parquet` in the pipeline goes through `write_parquet`, so the
+codec, row-group size, sort order and statistics can be tuned in one place.
+The active profile comes from the `ANEEL_PARQUET_PROFILE` environment
+variable (default: `DEFAULT_PROFILE`).
+
+Compare profiles with:
+    python scripts/benchmark_parquet_profiles.py
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+PROFILE_ENV_VAR = "ANEEL_PARQUET_PROFILE"
+
+# Keys:
+#   compression        codec passed to pyarrow (snappy, zstd, lz4, gzip, none)
+#   compression_level  codec level (zstd: 1-22); None keeps the codec default
+#   row_group_size     rows per row group; None keeps the pyarrow default
+#   sort_by            columns to sort by before writing (ignored if absent)
+#   write_statistics   min/max/null_count statistics in the footer
+PARQUET_WRITE_PROFILES: dict[str, dict[str, Any]] = {
+    # What pandas does out of the box.
+    "pandas_default": {
+        "compression": "snappy",
+        "compression_level": None,
+        "row_group_size": None,
+        "sort_by": (),
+        "write_statistics": True,
+    },
+    # Smaller files for versioned artifacts; read speed close to snappy.
+    "zstd_balanced": {
+        "compression": "zstd",
+        "compression_level": 3,
+        "row_group_size": 256_000,
+        "sort_by": (),
+        "write_statistics": True,
+    },
+    # Sorted by time then agent: tight min/max statistics per row group,
+    # so filtered reads on `ano`/`sigagente` can skip row groups.
+    "zstd_sorted": {
+        "compression": "zstd",
+        "compression_level": 3,
+        "row_group_size": 128_000,
+        "sort_by": ("ano", "mes", "sigagente"),
+        "write_statistics": True,
+    },
+    # Fastest writes for scratch runs.
+    "lz4_fast": {
+        "compression": "lz4",
+        "compression_level": None,
+        "row_group_size": None,
+        "sort_by": (),
+        "write_statistics": True,
+    },
+}
+
+DEFAULT_PROFILE = "zstd_balanced"
+
+
+def resolve_write_profile(profile: str | dict[str, Any] | None = None) -> dict[str, Any]:
+    """Return the profile settings for a name, a dict or the configured default."""
+    if isinstance(profile, dict):
+        return {**PARQUET_WRITE_PROFILES["pandas_default"], **profile}
+
+    name = profile or os.environ.get(PROFILE_ENV_VAR) or DEFAULT_PROFILE
+    if name not in PARQUET_WRITE_PROFILES:
+        available = ", ".join(sorted(PARQUET_WRITE_PROFILES))
+        raise ValueError(f"Unknown parquet write profile: {name} (available: {available})")
+    return PARQUET_WRITE_PROFILES[name]
+
+
+def write_parquet(
+    frame: pd.DataFrame,
+    path: Path,
+    profile: str | dict[str, Any] | None = None,
+) -> None:
+    """Write a DataFrame to Parquet using a write profile."""
+    config = resolve_write_profile(profile)
+
+    sort_cols = [col for col in config.get("sort_by") or () if col in frame.columns]
+    if sort_cols:
+        frame = frame.sort_values(sort_cols, kind="stable")
+
+    options: dict[str, Any] = {"write_statistics": config.get("write_statistics", True)}
+    if config.get("compression_level") is not None:
+        options["compression_level"] = config["compression_level"]
+    if config.get("row_group_size") is not None:
+        options["row_group_size"] = config["row_group_size"]
+
+    compression = config.get("compression")
+    frame.to_parquet(
+        path,
+        index=False,
+        compression=None if compression in (None, "none") else compression,
+        **options,
+    )
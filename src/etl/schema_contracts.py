@@ -2,9 +2,14 @@
 
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Any, Iterator
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
 from pyarrow import parquet as pq
 
 RAW_REQUIRED_COLUMNS: dict[str, set[str]] = {
@@ -58,6 +63,97 @@ PROCESSED_REQUIRED_COLUMNS: dict[str, set[str]] = {
 }
 
 
+# Plausible range for the year of any processed row.
+PROCESSED_YEAR_RANGE: tuple[int, int] = (2011, 2030)
+
+
+# Value-domain rules, evaluated by `validate_value_domains` in a streamed scan.
+# kinds:
+#   prefix_in_set  first `length` chars of `column` must be in `values`
+#   numeric        non-empty `column` must parse as a (Brazilian) number
+#   range          numeric `column` must fall inside [min, max]
+#   column_le      numeric `column` <= numeric `other` when both are present
+# severity "error" fails validation; "warning" is only reported.
+KNOWN_INDICATOR_FAMILIES: set[str] = {"QS", "QV", "PM", "CR"}
+
+VALUE_DOMAIN_RULES: list[dict[str, Any]] = [
+    {
+        "name": "familia_sigindicador_conhecida",
+        "dataset": "qualidade_comercial",
+        "kind": "prefix_in_set",
+        "column": "sigindicador",
+        "length": 2,
+        "values": KNOWN_INDICATOR_FAMILIES,
+        "severity": "warning",
+    },
+    {
+        "name": "vlrindiceenviado_numerico",
+        "dataset": "qualidade_comercial",
+        "kind": "numeric",
+        "column": "vlrindiceenviado",
+        "severity": "error",
+    },
+    {
+        "name": "anoindice_2011_2030",
+        "dataset": "qualidade_comercial",
+        "kind": "range",
+        "column": "anoindice",
+        "min": PROCESSED_YEAR_RANGE[0],
+        "max": PROCESSED_YEAR_RANGE[1],
+        "severity": "error",
+    },
+    {
+        "name": "qtdservrealizado_numerico",
+        "dataset": "indger_servicos_comerciais",
+        "kind": "numeric",
+        "column": "qtdservrealizado",
+        "severity": "error",
+    },
+    {
+        "name": "vlrpagocompensacao_numerico",
+        "dataset": "indger_servicos_comerciais",
+        "kind": "numeric",
+        "column": "vlrpagocompensacao",
+        "severity": "error",
+    },
+    {
+        "name": "fora_prazo_menor_igual_realizado",
+        "dataset": "indger_servicos_comerciais",
+        "kind": "column_le",
+        "column": "qtdservrealizdescprazo",
+        "other": "qtdservrealizado",
+        "severity": "error",
+    },
+    {
+        "name": "qtducativa_numerico",
+        "dataset": "indger_dados_comerciais",
+        "kind": "numeric",
+        "column": "qtducativa",
+        "severity": "error",
+    },
+]
+
+# Where each rule dataset lives in raw (file name or glob) and processed form.
+VALUE_DOMAIN_DATASETS: dict[str, dict[str, str]] = {
+    "qualidade_comercial": {
+        "raw": "qualidade-atendimento-comercial.csv",
+        "processed": "qualidade_comercial.parquet",
+    },
+    "indger_servicos_comerciais": {
+        "raw": "*servico*comercia*.csv",
+        "processed": "indger_servicos_comerciais.parquet",
+    },
+    "indger_dados_comerciais": {
+        "raw": "indger-dados-comerciais.csv",
+        "processed": "indger_dados_comerciais.parquet",
+    },
+}
+
+DOMAIN_BATCH_SIZE = 256_000
+DOMAIN_CSV_BLOCK_SIZE = 32 * 1024 * 1024
+DOMAIN_MAX_SAMPLES = 5
+
+
 def normalize_columns(columns: list[str] | pd.Index) -> set[str]:
     """Normalize columns for robust contract checks."""
     return {str(col).strip().lower() for col in columns}
@@ -69,13 +165,13 @@ def missing_required_columns(columns: list[str] | pd.Index, required: set[str])
     return sorted(required - present)
 
 
-def read_csv_header(path: Path, sep: str = ";") -> list[str]:
-    """Read only CSV header with encoding fallback."""
+def sniff_csv(path: Path, sep: str = ";") -> tuple[list[str], str, str]:
+    """Return (header columns, encoding, separator) with encoding fallback."""
     encodings = ("utf-16", "utf-8", "latin-1", "cp1252")
     for encoding in encodings:
         try:
             frame = pd.read_csv(path, sep=sep, encoding=encoding, nrows=0, low_memory=False)
-            return [str(col) for col in frame.columns]
+            return [str(col) for col in frame.columns], encoding, sep
         except UnicodeDecodeError:
             continue
         except Exception:
@@ -85,13 +181,18 @@ def read_csv_header(path: Path, sep: str = ";") -> list[str]:
     for encoding in encodings:
         try:
             frame = pd.read_csv(path, sep=",", encoding=encoding, nrows=0, low_memory=False)
-            return [str(col) for col in frame.columns]
+            return [str(col) for col in frame.columns], encoding, ","
         except Exception:
             continue
 
     raise RuntimeError(f"Could not read header: {path}")
 
 
+def read_csv_header(path: Path, sep: str = ";") -> list[str]:
+    """Read only CSV header with encoding fallback."""
+    return sniff_csv(path, sep=sep)[0]
+
+
 def read_parquet_columns(path: Path) -> list[str]:
     """Read parquet schema columns without loading full data."""
     return list(pq.read_schema(path).names)
@@ -165,3 +266,232 @@ def validate_processed_contracts(processed_dir: Path) -> list[str]:
             )
 
     return errors
+
+
+def validate_catalog_contracts(catalog: dict[str, Any]) -> list[str]:
+    """Validate processed datasets from catalog.json metadata, without reading data.
+
+    Beyond column presence: the table is not empty, required columns are not
+    entirely null and the year range stays inside PROCESSED_YEAR_RANGE.
+    """
+    errors: list[str] = []
+    tables = catalog.get("tables", {})
+    year_min, year_max = PROCESSED_YEAR_RANGE
+
+    for file_name, required in PROCESSED_REQUIRED_COLUMNS.items():
+        name = Path(file_name).stem
+        entry = tables.get(name)
+        if entry is None:
+            errors.append(f"catalog missing table: {name}")
+            continue
+
+        columns = entry.get("columns", {})
+        missing = missing_required_columns(list(columns), required)
+        if missing:
+            errors.append(f"catalog schema mismatch: {name} missing columns {', '.join(missing)}")
+
+        num_rows = entry.get("num_rows", 0)
+        if num_rows == 0:
+            errors.append(f"catalog empty table: {name}")
+            continue
+
+        all_null = sorted(
+            col for col in required if col in columns and columns[col].get("null_count") == num_rows
+        )
+        if all_null:
+            errors.append(f"catalog all-null columns: {name} ({', '.join(all_null)})")
+
+        ano_min, ano_max = entry.get("ano_min"), entry.get("ano_max")
+        if ano_min is not None and (ano_min < year_min or ano_max > year_max):
+            errors.append(
+                f"catalog year range out of bounds: {name} {ano_min}-{ano_max} "
+                f"(expected {year_min}-{year_max})"
+            )
+
+    return errors
+
+
+def _parse_number(array: pa.Array) -> pa.Array:
+    """Arrow equivalent of build_analysis_tables.parse_br_number (null if invalid)."""
+    if pa.types.is_integer(array.type) or pa.types.is_floating(array.type):
+        return pc.cast(array, pa.float64())
+    text = pc.utf8_trim_whitespace(pc.cast(array, pa.string()))
+    text = pc.replace_substring(text, ".", "")
+    text = pc.replace_substring(text, ",", ".")
+    text = pc.replace_substring_regex(text, r"[^0-9.\-]", "")
+    valid = pc.match_substring_regex(text, r"^-?\d+(\.\d+)?$")
+    return pc.cast(pc.if_else(valid, text, pa.scalar(None, pa.string())), pa.float64())
+
+
+def _is_blank(array: pa.Array) -> pa.Array:
+    if not (pa.types.is_string(array.type) or pa.types.is_large_string(array.type)):
+        return pc.is_null(array)
+    trimmed = pc.utf8_trim_whitespace(array)
+    return pc.or_kleene(pc.is_null(trimmed), pc.equal(trimmed, ""))
+
+
+def _rule_violations(rule: dict[str, Any], batch: pa.RecordBatch) -> pa.Array:
+    """Boolean mask of violating rows for one rule on one batch."""
+    column = batch.column(rule["column"])
+    kind = rule["kind"]
+
+    if kind == "prefix_in_set":
+        text = pc.utf8_trim_whitespace(pc.cast(column, pa.string()))
+        prefix = pc.utf8_slice_codeunits(text, 0, rule["length"])
+        known = pc.is_in(prefix, value_set=pa.array(sorted(rule["values"]), pa.string()))
+        return pc.and_(pc.invert(_is_blank(column)), pc.invert(known))
+
+    if kind == "numeric":
+        return pc.and_(pc.invert(_is_blank(column)), pc.is_null(_parse_number(column)))
+
+    if kind == "range":
+        value = _parse_number(column)
+        outside = pc.or_(pc.less(value, rule["min"]), pc.greater(value, rule["max"]))
+        return pc.fill_null(outside, False)
+
+    if kind == "column_le":
+        left = _parse_number(column)
+        right = _parse_number(batch.column(rule["other"]))
+        return pc.fill_null(pc.greater(left, right), False)
+
+    raise ValueError(f"Unknown value-domain rule kind: {kind}")
+
+
+def _rule_columns(rule: dict[str, Any]) -> list[str]:
+    return [rule["column"], *([rule["other"]] if "other" in rule else [])]
+
+
+def _iter_csv_batches(path: Path, columns: list[str]) -> Iterator[pa.RecordBatch]:
+    """Stream a raw CSV as string batches with normalized column names."""
+    header, encoding, sep = sniff_csv(path)
+    by_normalized = {str(col).strip().lower(): col for col in header}
+    include = [by_normalized[col] for col in columns if col in by_normalized]
+    reader = pa_csv.open_csv(
+        path,
+        read_options=pa_csv.ReadOptions(
+            encoding=encoding,
+            block_size=DOMAIN_CSV_BLOCK_SIZE,
+            use_threads=True,
+        ),
+        parse_options=pa_csv.ParseOptions(delimiter=sep, invalid_row_handler=lambda _row: "skip"),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=include,
+            column_types={col: pa.string() for col in include},
+        ),
+    )
+    for batch in reader:
+        yield batch.rename_columns([str(col).strip().lower() for col in batch.schema.names])
+
+
+def _iter_parquet_batches(path: Path, columns: list[str]) -> Iterator[pa.RecordBatch]:
+    present = set(pq.read_schema(path).names)
+    yield from pq.ParquetFile(path).iter_batches(
+        batch_size=DOMAIN_BATCH_SIZE,
+        columns=[col for col in columns if col in present],
+        use_threads=True,
+    )
+
+
+def evaluate_value_domains(
+    batches: Iterator[pa.RecordBatch],
+    rules: list[dict[str, Any]],
+    max_samples: int = DOMAIN_MAX_SAMPLES,
+) -> list[dict[str, Any]]:
+    """Evaluate rules over a stream of batches, keeping counts and a few samples.
+
+    Memory is bounded by one batch plus `max_samples` rows per rule.
+    """
+    results = [
+        {"rule": rule, "checked": 0, "violations": 0, "samples": [], "skipped": None}
+        for rule in rules
+    ]
+    for batch in batches:
+        for result in results:
+            rule = result["rule"]
+            missing = [col for col in _rule_columns(rule) if col not in batch.schema.names]
+            if missing:
+                result["skipped"] = f"missing columns {', '.join(missing)}"
+                continue
+            mask = _rule_violations(rule, batch)
+            count = pc.sum(mask).as_py() or 0
+            result["checked"] += batch.num_rows
+            result["violations"] += count
+            need = max_samples - len(result["samples"])
+            if count and need > 0:
+                sample = batch.select(_rule_columns(rule)).filter(mask).slice(0, need)
+                result["samples"].extend(sample.to_pylist())
+    return results
+
+
+def _domain_sources(raw_dir: Path | None, processed_dir: Path | None) -> list[tuple[str, str, Path]]:
+    sources: list[tuple[str, str, Path]] = []
+    for dataset, locations in VALUE_DOMAIN_DATASETS.items():
+        if raw_dir is not None:
+            paths = sorted(raw_dir.glob(locations["raw"])) or sorted(raw_dir.rglob(locations["raw"]))
+            sources.extend((dataset, "raw", path) for path in paths)
+        if processed_dir is not None:
+            path = processed_dir / locations["processed"]
+            if path.exists():
+                sources.append((dataset, "processed", path))
+    return sources
+
+
+def validate_value_domains(
+    raw_dir: Path | None = None,
+    processed_dir: Path | None = None,
+    max_samples: int = DOMAIN_MAX_SAMPLES,
+    max_workers: int = 4,
+) -> list[dict[str, Any]]:
+    """Run VALUE_DOMAIN_RULES over raw CSVs and/or processed Parquet files.
+
+    Files are scanned concurrently (Arrow releases the GIL while parsing and
+    computing). Returns one record per (file, rule) with `violations`,
+    `checked` rows, `severity` and up to `max_samples` violating rows.
+    """
+
+    def scan(source: tuple[str, str, Path]) -> list[dict[str, Any]]:
+        dataset, layer, path = source
+        rules = [rule for rule in VALUE_DOMAIN_RULES if rule["dataset"] == dataset]
+        columns = list(dict.fromkeys(col for rule in rules for col in _rule_columns(rule)))
+        iterator = _iter_csv_batches if layer == "raw" else _iter_parquet_batches
+        try:
+            evaluated = evaluate_value_domains(iterator(path, columns), rules, max_samples)
+        except Exception as exc:
+            evaluated = [
+                {"rule": rule, "checked": 0, "violations": 0, "samples": [], "skipped": f"unreadable ({exc})"}
+                for rule in rules
+            ]
+        return [
+            {
+                "dataset": dataset,
+                "layer": layer,
+                "path": str(path),
+                "rule": result["rule"]["name"],
+                "severity": result["rule"]["severity"],
+                "checked": result["checked"],
+                "violations": result["violations"],
+                "samples": result["samples"],
+                "skipped": result["skipped"],
+            }
+            for result in evaluated
+        ]
+
+    sources = _domain_sources(raw_dir, processed_dir)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return [record for records in pool.map(scan, sources) for record in records]
+
+
+def value_domain_errors(results: list[dict[str, Any]]) -> list[str]:
+    """Error messages for error-severity rules with violations or skipped checks."""
+    errors: list[str] = []
+    for result in results:
+        if result["severity"] != "error":
+            continue
+        if result["skipped"]:
+            errors.append(f"domain rule skipped: {result['rule']} on {result['path']} ({result['skipped']})")
+        elif result["violations"]:
+            errors.append(
+                f"domain violation: {result['rule']} on {result['path']} "
+                f"({result['violations']:,} of {result['checked']:,} rows; e.g. {result['samples'][:2]})"
+            )
+    return errors
@@ -11,7 +11,9 @@ SAÍDA:    data/processed/*.parquet  (eficiente)
           data/processed/*.csv     (legível)
 
 COMO RODAR:
-    python -m src.etl.transform_aneel
+    python -m src.etl.transform_aneel                # jobs em paralelo
+    python -m src.etl.transform_aneel --sequencial   # um job por vez
+    python -m src.etl.transform_aneel --job servicos # apenas um job
 
 VARIÁVEIS DE INTERESSE (para a análise do TCC):
     - Eficácia: serviços realizados dentro do prazo
@@ -22,11 +24,19 @@ VARIÁVEIS DE INTERESSE (para a análise do TCC):
 ===============================================================================
 """
 
+import argparse
+import os
+import subprocess
 import sys
+import threading
+import time
 from pathlib import Path
 
 import pandas as pd
 
+from src.etl.catalog import CATALOG_PATH, refresh_catalog
+from src.etl.instrumentation import annotate_stage, configure_run, instrumented, stage, write_run_report
+from src.etl.parquet_profiles import write_parquet
 from src.etl.schema_contracts import (
     RAW_REQUIRED_COLUMNS,
     RAW_SERVICOS_REQUIRED_COLUMNS,
@@ -40,6 +50,12 @@ RAIZ_PROJETO = Path(__file__).resolve().parent.parent.parent
 DIR_RAW = RAIZ_PROJETO / "data" / "raw"
 DIR_PROCESSED = RAIZ_PROJETO / "data" / "processed"
 
+# Pico de memória estimado de um job = tamanho dos CSVs de entrada x fator.
+# O pandas costuma ocupar de 2x a 4x o tamanho do CSV (colunas object).
+FATOR_MEMORIA_CSV = 3.0
+# Fração da memória disponível que os jobs simultâneos podem ocupar juntos.
+FRACAO_MEMORIA_DISPONIVEL = 0.8
+
 
 def validar_colunas_obrigatorias(
     df: pd.DataFrame,
@@ -59,6 +75,7 @@ def validar_colunas_obrigatorias(
 # 1. QUALIDADE DO ATENDIMENTO COMERCIAL
 # ==============================================================================
 
+@instrumented()
 def transformar_qualidade_comercial() -> pd.DataFrame | None:
     """
     Lê, limpa e salva o dataset de Qualidade do Atendimento Comercial.
@@ -96,6 +113,7 @@ def transformar_qualidade_comercial() -> pd.DataFrame | None:
             return None
 
     print(f"  Linhas brutas: {len(df):,}")
+    annotate_stage(rows_in=len(df))
     print(f"  Colunas: {list(df.columns)}")
 
     # ---- Limpeza básica ----
@@ -130,9 +148,9 @@ def transformar_qualidade_comercial() -> pd.DataFrame | None:
     # ---- Salvamento ----
     DIR_PROCESSED.mkdir(parents=True, exist_ok=True)
 
-    # Parquet (eficiente para análise com pandas)
+    # Parquet (eficiente para análise com pandas); perfil em ANEEL_PARQUET_PROFILE
     parquet_path = DIR_PROCESSED / "qualidade_comercial.parquet"
-    df.to_parquet(parquet_path, index=False)
+    write_parquet(df, parquet_path)
     print(f"\n  💾 Salvo: {parquet_path.name} ({parquet_path.stat().st_size / 1024:.0f} KB)")
 
     # CSV (legível para humanos)
@@ -147,13 +165,8 @@ def transformar_qualidade_comercial() -> pd.DataFrame | None:
 # 2. INDGER — SERVIÇOS COMERCIAIS
 # ==============================================================================
 
-def transformar_indger_servicos() -> pd.DataFrame | None:
-    """
-    Lê, limpa e salva os dados de Serviços Comerciais do INDGER.
-
-    O ZIP contém um ou mais CSVs com dados mensais de quantidades,
-    prazos, estoques e compensações por distribuidora.
-    """
+def localizar_csvs_servicos() -> list[Path]:
+    """Localiza os CSVs de serviços comerciais descompactados do ZIP do INDGER."""
     # O ZIP foi descompactado pelo extract_aneel.py
     # Procura qualquer CSV que contenha "servico" no nome
     csvs = list(DIR_RAW.glob("*servico*comercia*.csv")) + list(DIR_RAW.glob("*servicos*comercia*.csv"))
@@ -162,6 +175,20 @@ def transformar_indger_servicos() -> pd.DataFrame | None:
         # Tenta procurar em subpastas (caso o ZIP tenha estrutura interna)
         csvs = list(DIR_RAW.rglob("*servico*comercia*.csv")) + list(DIR_RAW.rglob("*servicos*comercia*.csv"))
 
+    # Os dois padrões se sobrepõem ("servicos" também casa com "servico")
+    return list(dict.fromkeys(csvs))
+
+
+@instrumented()
+def transformar_indger_servicos() -> pd.DataFrame | None:
+    """
+    Lê, limpa e salva os dados de Serviços Comerciais do INDGER.
+
+    O ZIP contém um ou mais CSVs com dados mensais de quantidades,
+    prazos, estoques e compensações por distribuidora.
+    """
+    csvs = localizar_csvs_servicos()
+
     if not csvs:
         print(f"\n⚠️  Nenhum CSV de serviços comerciais encontrado em {DIR_RAW}")
         print("   Verifique se o ZIP foi descompactado corretamente.")
@@ -188,6 +215,7 @@ def transformar_indger_servicos() -> pd.DataFrame | None:
         return None
 
     df = pd.concat(dfs, ignore_index=True)
+    annotate_stage(rows_in=len(df))
 
     # Limpeza
     df = df.drop_duplicates()
@@ -203,7 +231,7 @@ def transformar_indger_servicos() -> pd.DataFrame | None:
     DIR_PROCESSED.mkdir(parents=True, exist_ok=True)
 
     parquet_path = DIR_PROCESSED / "indger_servicos_comerciais.parquet"
-    df.to_parquet(parquet_path, index=False)
+    write_parquet(df, parquet_path)
     print(f"\n  💾 Salvo: {parquet_path.name}")
 
     csv_path = DIR_PROCESSED / "indger_servicos_comerciais.csv"
@@ -217,6 +245,7 @@ def transformar_indger_servicos() -> pd.DataFrame | None:
 # 3. INDGER — DADOS COMERCIAIS
 # ==============================================================================
 
+@instrumented()
 def transformar_indger_comercial() -> pd.DataFrame | None:
     """
     Lê, limpa e salva os Dados Comerciais do INDGER.
@@ -243,6 +272,7 @@ def transformar_indger_comercial() -> pd.DataFrame | None:
         return None
 
     # Limpeza
+    annotate_stage(rows_in=len(df))
     df = df.drop_duplicates()
     df = df.dropna(how="all")
     df.columns = df.columns.str.strip().str.lower()
@@ -260,7 +290,7 @@ def transformar_indger_comercial() -> pd.DataFrame | None:
     DIR_PROCESSED.mkdir(parents=True, exist_ok=True)
 
     parquet_path = DIR_PROCESSED / "indger_dados_comerciais.parquet"
-    df.to_parquet(parquet_path, index=False)
+    write_parquet(df, parquet_path)
     print(f"\n  💾 Salvo: {parquet_path.name}")
 
     csv_path = DIR_PROCESSED / "indger_dados_comerciais.csv"
@@ -270,11 +300,155 @@ def transformar_indger_comercial() -> pd.DataFrame | None:
     return df
 
 
+# ==============================================================================
+# EXECUÇÃO PARALELA
+# ==============================================================================
+# Os três jobs leem entradas disjuntas e gravam saídas disjuntas, então podem
+# rodar em processos separados. A ordem do dicionário é a ordem do resumo.
+
+JOBS_TRANSFORMACAO = {
+    "qualidade": {
+        "nome": "Qualidade Comercial",
+        "funcao": transformar_qualidade_comercial,
+        "entradas": lambda: [DIR_RAW / "qualidade-atendimento-comercial.csv"],
+    },
+    "servicos": {
+        "nome": "INDGER Serviços Comerciais",
+        "funcao": transformar_indger_servicos,
+        "entradas": localizar_csvs_servicos,
+    },
+    "comercial": {
+        "nome": "INDGER Dados Comerciais",
+        "funcao": transformar_indger_comercial,
+        "entradas": lambda: [DIR_RAW / "indger-dados-comerciais.csv"],
+    },
+}
+
+
+def memoria_disponivel_bytes() -> int | None:
+    """Memória disponível no sistema (MemAvailable no Linux), se conhecida."""
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for linha in f:
+                if linha.startswith("MemAvailable:"):
+                    return int(linha.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def estimar_memoria_job(chave: str) -> int:
+    """Estima o pico de memória de um job a partir do tamanho das entradas."""
+    entradas = JOBS_TRANSFORMACAO[chave]["entradas"]()
+    tamanho = sum(path.stat().st_size for path in entradas if path.exists())
+    return int(tamanho * FATOR_MEMORIA_CSV)
+
+
+def _repassar_saida(processo: subprocess.Popen, prefixo: str, trava: threading.Lock) -> None:
+    """Transmite a saída do processo filho linha a linha, com prefixo do job."""
+    for linha in processo.stdout:
+        with trava:
+            print(f"{prefixo} {linha.rstrip()}", flush=True)
+
+
+def _iniciar_job(
+    chave: str,
+    trava: threading.Lock,
+    perfil: bool = False,
+) -> tuple[subprocess.Popen, threading.Thread]:
+    env = {**os.environ, "PYTHONUNBUFFERED": "1", "PYTHONIOENCODING": "utf-8"}
+    comando = [sys.executable, "-m", "src.etl.transform_aneel", "--job", chave]
+    if perfil:
+        comando.append("--profile")
+    processo = subprocess.Popen(
+        comando,
+        cwd=RAIZ_PROJETO,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        bufsize=1,
+    )
+    leitor = threading.Thread(
+        target=_repassar_saida,
+        args=(processo, f"[{chave}]", trava),
+        daemon=True,
+    )
+    leitor.start()
+    return processo, leitor
+
+
+@instrumented()
+def executar_jobs_paralelos(
+    memoria_max_bytes: int | None = None,
+    perfil: bool = False,
+) -> dict[str, bool]:
+    """
+    Executa os jobs de transformação em processos separados.
+
+    Guarda de memória: um job só é iniciado se a soma das estimativas de pico
+    dos jobs em execução couber no orçamento. Em máquinas pequenas os dois
+    jobs grandes (Qualidade Comercial e Serviços) acabam rodando em sequência.
+    Um job que sozinho excede o orçamento ainda roda, mas isolado.
+
+    Cada processo filho grava o próprio relatório de execução
+    (transform_aneel_<job>_*.json); `perfil` repassa --profile aos filhos.
+
+    Retorna {chave_do_job: sucesso}.
+    """
+    if memoria_max_bytes is None:
+        disponivel = memoria_disponivel_bytes()
+        if disponivel is not None:
+            memoria_max_bytes = int(disponivel * FRACAO_MEMORIA_DISPONIVEL)
+
+    estimativas = {chave: estimar_memoria_job(chave) for chave in JOBS_TRANSFORMACAO}
+    # Maiores primeiro: os jobs pequenos preenchem a folga restante.
+    pendentes = sorted(JOBS_TRANSFORMACAO, key=lambda chave: estimativas[chave], reverse=True)
+
+    orcamento = "sem limite" if memoria_max_bytes is None else f"{memoria_max_bytes / 1024**3:.1f} GB"
+    print(f"\n⚙️  Execução paralela — orçamento de memória: {orcamento}")
+    for chave in JOBS_TRANSFORMACAO:
+        print(f"  [{chave}] pico estimado: {estimativas[chave] / 1024**3:.1f} GB")
+
+    trava = threading.Lock()
+    em_execucao: dict[str, tuple[subprocess.Popen, threading.Thread]] = {}
+    status: dict[str, bool] = {}
+
+    while pendentes or em_execucao:
+        em_uso = sum(estimativas[chave] for chave in em_execucao)
+        for chave in list(pendentes):
+            cabe = memoria_max_bytes is None or em_uso + estimativas[chave] <= memoria_max_bytes
+            if cabe or not em_execucao:
+                em_execucao[chave] = _iniciar_job(chave, trava, perfil)
+                pendentes.remove(chave)
+                em_uso += estimativas[chave]
+
+        time.sleep(0.2)
+        for chave, (processo, leitor) in list(em_execucao.items()):
+            if processo.poll() is None:
+                continue
+            leitor.join()
+            status[chave] = processo.returncode == 0
+            del em_execucao[chave]
+
+    return status
+
+
 # ==============================================================================
 # FUNÇÃO PRINCIPAL
 # ==============================================================================
 
-def executar_transformacao():
+def executar_transformacao(
+    paralelo: bool = True,
+    memoria_max_bytes: int | None = None,
+    perfil: bool = False,
+):
     """Executa a transformação de todos os datasets."""
     from datetime import datetime
 
@@ -283,26 +457,25 @@ def executar_transformacao():
     print(f"   Data: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
     print("=" * 70)
 
-    erros_raw = validate_raw_contracts(DIR_RAW)
+    with stage("validate_raw_contracts"):
+        erros_raw = validate_raw_contracts(DIR_RAW)
     if erros_raw:
         print("\n❌ Falha de contrato nos dados brutos. Corrija antes da transformação:")
         for erro in erros_raw:
             print(f"  - {erro}")
         return False
 
-    resultados = {}
-
-    # 1. Qualidade Comercial
-    df_qc = transformar_qualidade_comercial()
-    resultados["Qualidade Comercial"] = "✅" if df_qc is not None else "❌"
-
-    # 2. INDGER Serviços Comerciais
-    df_sc = transformar_indger_servicos()
-    resultados["INDGER Serviços Comerciais"] = "✅" if df_sc is not None else "❌"
+    if paralelo:
+        status_jobs = executar_jobs_paralelos(memoria_max_bytes, perfil)
+    else:
+        status_jobs = {
+            chave: job["funcao"]() is not None
+            for chave, job in JOBS_TRANSFORMACAO.items()
+        }
 
-    # 3. INDGER Dados Comerciais
-    df_dc = transformar_indger_comercial()
-    resultados["INDGER Dados Comerciais"] = "✅" if df_dc is not None else "❌"
+    resultados = {}
+    for chave, job in JOBS_TRANSFORMACAO.items():
+        resultados[job["nome"]] = "✅" if status_jobs.get(chave) else "❌"
 
     # Resumo
     print("\n" + "=" * 70)
@@ -316,18 +489,62 @@ def executar_transformacao():
         print("\n❌ Transformação interrompida: nem todos os datasets foram processados.")
         return False
 
-    erros_processed = validate_processed_contracts(DIR_PROCESSED)
+    with stage("validate_processed_contracts"):
+        erros_processed = validate_processed_contracts(DIR_PROCESSED)
     if erros_processed:
         print("\n❌ Falha de contrato nos dados processados:")
         for erro in erros_processed:
             print(f"  - {erro}")
         return False
 
+    with stage("refresh_catalog"):
+        refresh_catalog()
+    print(f"\n  🗂️  Catálogo de metadados: {CATALOG_PATH}")
+
     print(f"\n  📂 Arquivos processados em: {DIR_PROCESSED}")
     print("  Próximo passo: análise exploratória em src/analysis/")
     return True
 
 
-if __name__ == "__main__":
-    ok = executar_transformacao()
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Transforma os dados brutos da ANEEL")
+    parser.add_argument(
+        "--job",
+        choices=sorted(JOBS_TRANSFORMACAO),
+        help="executa apenas um job (usado pelos processos filhos da execução paralela)",
+    )
+    parser.add_argument(
+        "--sequencial",
+        action="store_true",
+        help="executa os jobs um após o outro no mesmo processo",
+    )
+    parser.add_argument(
+        "--memoria-max-gb",
+        type=float,
+        default=None,
+        help="orçamento de memória para jobs simultâneos (padrão: 80%% da memória disponível)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="salva estatísticas cProfile por etapa junto ao relatório de execução",
+    )
+    args = parser.parse_args()
+
+    if args.job:
+        configure_run(f"transform_aneel_{args.job}", profile=args.profile)
+        ok = JOBS_TRANSFORMACAO[args.job]["funcao"]() is not None
+    else:
+        configure_run("transform_aneel", profile=args.profile)
+        memoria_max = int(args.memoria_max_gb * 1024**3) if args.memoria_max_gb else None
+        ok = executar_transformacao(
+            paralelo=not args.sequencial,
+            memoria_max_bytes=memoria_max,
+            perfil=args.profile,
+        )
+    print(f"\n  📈 Relatório de execução: {write_run_report()}")
     sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()